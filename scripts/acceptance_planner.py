@@ -0,0 +1,99 @@
+"""
+Deficit-driven top-up planning for category generation.
+
+Every batch records how many rows were requested from a (category, model)
+pair and how many survived validation and de-duplication. The live
+acceptance rate, blended with the rate learned on earlier runs, decides how
+many rows to request to close a remaining deficit, so a round asks for
+just enough instead of a fixed over-generation factor. Learned rates are
+saved to a small JSON file and loaded as the prior for the next run.
+"""
+
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+class AcceptanceTracker:
+    """
+    Per-(category, model) requested/accepted counters.
+
+    rate() blends this run's counts with the persisted rate, which counts as
+    `prior_weight` requested rows, so early batches do not swing the estimate
+    and a few hundred live rows outweigh stale history.
+    """
+
+    def __init__(self, path: Optional[str] = None, default_rate: float = 0.8,
+                 min_rate: float = 0.2, prior_weight: float = 40.0):
+        self.path = path
+        self.default_rate = default_rate
+        self.min_rate = min_rate
+        self.prior_weight = prior_weight
+        self._prior: Dict[str, float] = {}
+        self._counts: Dict[str, Tuple[int, int]] = {}
+        if path and os.path.exists(path):
+            self._load(path)
+
+    @staticmethod
+    def _key(category: str, model: str) -> str:
+        return f"{category}|{model}"
+
+    def _load(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read acceptance rates from {path}: {e}")
+            return
+        for key, entry in saved.get("rates", {}).items():
+            try:
+                self._prior[key] = min(1.0, max(0.0, float(entry["rate"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def record(self, category: str, model: str, requested: int, accepted: int):
+        done, kept = self._counts.get(self._key(category, model), (0, 0))
+        self._counts[self._key(category, model)] = (done + requested, kept + accepted)
+
+    def rate(self, category: str, model: str) -> float:
+        key = self._key(category, model)
+        prior = self._prior.get(key, self.default_rate)
+        requested, accepted = self._counts.get(key, (0, 0))
+        estimate = (accepted + prior * self.prior_weight) / (requested + self.prior_weight)
+        return max(self.min_rate, min(1.0, estimate))
+
+    def plan(self, category: str, model: str, deficit: int, batch_size: int) -> List[int]:
+        """Batch sizes whose expected accepted rows cover `deficit`."""
+        if deficit <= 0:
+            return []
+        requested = math.ceil(deficit / self.rate(category, model))
+        return [min(batch_size, requested - i) for i in range(0, requested, batch_size)]
+
+    def summary(self, category: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, (requested, accepted) in self._counts.items():
+            cat, model = key.split("|", 1)
+            if category is not None and cat != category:
+                continue
+            out[key if category is None else model] = {
+                "requested": requested,
+                "accepted": accepted,
+                "rate": round(self.rate(cat, model), 3),
+            }
+        return out
+
+    def save(self, path: Optional[str] = None):
+        """Writes the blended rates (atomically) so the next run starts from them."""
+        path = path or self.path
+        if not path:
+            return
+        rates = {key: {"rate": rate} for key, rate in self._prior.items()}
+        rates.update({
+            key: {"rate": entry["rate"], "requested": entry["requested"], "accepted": entry["accepted"]}
+            for key, entry in self.summary().items()
+        })
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rates": rates}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
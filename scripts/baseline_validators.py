@@ -0,0 +1,320 @@
+"""
+The prompt validators as they were before validator_engine, copied verbatim
+from generate_prompts.py at the baseline commit. bench_validators.py checks
+the engine's decisions against them and times both. Nothing else uses them.
+"""
+
+import re
+from typing import Optional, Tuple
+
+
+def validate_and_fix_theory_of_mind_prompt(prompt, name_pair=None):
+    """
+    Validates and fixes a theory_of_mind prompt to ensure it has the correct structure.
+    Handles first-person, second-person, and third-person perspectives.
+    Returns a tuple: (fixed_prompt, is_valid)
+    """
+    if not prompt:
+        return prompt, False
+    
+    # If prompt already has exactly 2 placeholders, assume it's valid
+    if prompt.count("{}") == 2:
+        return prompt, True
+    
+    # Check for perspective patterns
+    is_first_person = any(pattern in prompt.lower() for pattern in ["i ", "me ", "my ", "i'm ", "i've ", "i'll "])
+    is_second_person = any(pattern in prompt.lower() for pattern in ["you ", "your ", "you're ", "you've ", "you'll "])
+    
+    # Check for key theory-of-mind elements based on perspective
+    has_false_belief = False
+    
+    if is_first_person:
+        has_false_belief = any(phrase in prompt.lower() for phrase in 
+                              ["i think", "i believe", "i assume", "i expect", "i search", "i look for"])
+    elif is_second_person:
+        has_false_belief = any(phrase in prompt.lower() for phrase in 
+                              ["you think", "you believe", "you assume", "you expect", "you search", "you look for"])
+    else:  # third-person
+        has_false_belief = any(phrase in prompt.lower() for phrase in 
+                              ["thinks", "believes", "assumes", "expects", "doesn't know", "searches", "looks for"])
+    
+    # If missing essential elements, it's not a valid ToM prompt
+    if not has_false_belief:
+        return prompt, False
+    
+    # Try to identify the main patterns for insertion points based on perspective
+    first_placeholder_pattern = None
+    second_placeholder_pattern = None
+    
+    if is_first_person:
+        # For first-person, look for patterns about someone moving something and model's belief
+        first_placeholder_pattern = re.search(
+            r"(moved it to|placed it (?:on|in|under|behind)|relocated it to|moved the .+? to|put .+? (?:on|in|under|behind)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+        second_placeholder_pattern = re.search(
+            r"(I (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+    elif is_second_person:
+        # For second-person, look for patterns about someone moving something and user's belief
+        first_placeholder_pattern = re.search(
+            r"(moved (?:it|them|your .+?) to|placed (?:it|them|your .+?) (?:on|in|under|behind)|relocated (?:it|them|your .+?) to|put (?:it|them|your .+?) (?:on|in|under|behind)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+        second_placeholder_pattern = re.search(
+            r"(you (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+    else:  # third-person
+        # For third-person, follow the traditional ToM format
+        first_placeholder_pattern = re.search(
+            r"(puts (?:it|the .+?) (?:on|in|under|behind|inside)|moves (?:it|the .+?) to|places (?:it|the .+?) (?:on|in|under|behind)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+        second_placeholder_pattern = re.search(
+            r"((?:thinks|believes|expects|assumes|searches|looks for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
+            prompt, 
+            re.IGNORECASE
+        )
+    
+    # If we can't find both patterns, try more generic patterns
+    if not first_placeholder_pattern or not second_placeholder_pattern:
+        # Look for prepositions followed by "the" - common in object placement
+        location_phrases = [
+            r"(?:on|in|under|behind|inside) the",
+            r"moved to the",
+            r"placed on the",
+            r"put in the"
+        ]
+        
+        # Belief phrases that might indicate false belief
+        belief_phrases = [
+            r"think(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+            r"believe(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+            r"expect(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+            r"assume(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+            r"look(?:s|ed)? for(?: the)?(?: [\w\s]+)? (?:on|in|under|behind|inside) the",
+        ]
+        
+        # Try to find any matches
+        for phrase in location_phrases:
+            match = re.search(phrase, prompt, re.IGNORECASE)
+            if match and not first_placeholder_pattern:
+                first_placeholder_pattern = match
+                break
+        
+        for phrase in belief_phrases:
+            match = re.search(phrase, prompt, re.IGNORECASE)
+            if match and not second_placeholder_pattern:
+                second_placeholder_pattern = match
+                break
+    
+    # If we still can't find both patterns, prompt can't be fixed
+    if not first_placeholder_pattern or not second_placeholder_pattern:
+        return prompt, False
+    
+    # Fix the prompt by inserting placeholders after the matched patterns
+    parts = []
+    last_pos = 0
+    
+    # Insert first placeholder
+    first_pos = first_placeholder_pattern.end()
+    parts.append(prompt[last_pos:first_pos])
+    parts.append(" {} ")
+    last_pos = first_pos
+    
+    # Insert second placeholder
+    second_pos = second_placeholder_pattern.end()
+    parts.append(prompt[last_pos:second_pos])
+    parts.append(" {} ")
+    last_pos = second_pos
+    
+    # Add any remaining text
+    if last_pos < len(prompt):
+        parts.append(prompt[last_pos:])
+    
+    fixed_prompt = "".join(parts)
+    
+    # If we already have placeholders, avoid duplicating them
+    fixed_prompt = fixed_prompt.replace("{} {}", "{}")
+    
+    # Make sure we end up with exactly 2 placeholders
+    if fixed_prompt.count("{}") != 2:
+        return prompt, False
+        
+    return fixed_prompt, True
+
+def validate_multi_placeholder_prompt(prompt: str, category: str, expected_count: Optional[int] = None) -> Tuple[str, bool, int]:
+    """
+    Validates a prompt with multiple placeholders.
+    Returns (prompt, is_valid, placeholder_count)
+    """
+    if not prompt:
+        return prompt, False, 0
+    
+    # Process the prompt - remove any trailing questions for ToM prompts that might not have placeholders
+    if category == "theory_of_mind" and "?" in prompt:
+        # Only keep the part before the question mark for validation
+        main_prompt, question = prompt.split("?", 1)
+        placeholder_count = main_prompt.count("{}")
+    else:
+        # Count placeholders
+        placeholder_count = prompt.count("{}")
+    
+    # If no placeholders are found, it's invalid
+    if placeholder_count == 0:
+        return prompt, False, placeholder_count
+    
+    # Define expected placeholder counts by category
+    category_expected_counts = {
+        "theory_of_mind": (2, 4),        # 2-4 placeholders for ToM
+        "counterfactual": (3, 3),        # Exactly 3 for counterfactual
+        "goal_representation": (2, 3),   # 2-3 for goal_representation
+        "situational_awareness": (3, 3), # Exactly 3 for situational_awareness
+        "safety_alignment": (3, 3),      # Exactly 3 for safety_alignment
+        "factual_recall": (3, 3),        # Exactly 3 for factual_recall
+        "metaphorical_interpretation": (3, 3), # Exactly 3 for metaphorical_interpretation
+    }
+    
+    # If category has expected count range, check if placeholder count is in range
+    if category in category_expected_counts:
+        min_count, max_count = category_expected_counts[category]
+        if not (min_count <= placeholder_count <= max_count):
+            # If specified expected_count overrides category defaults, use that
+            if expected_count is not None and placeholder_count == expected_count:
+                pass  # This is okay, expected_count overrides category defaults
+            else:
+                return prompt, False, placeholder_count
+    # If explicit expected_count is given, validate against that
+    elif expected_count is not None and placeholder_count != expected_count:
+        return prompt, False, placeholder_count
+    
+    # For theory_of_mind, be extremely lenient with validation to avoid too many rejections
+    if category == "theory_of_mind":
+        # Check for common ToM narrative patterns
+        belief_phrases = ["think", "believe", "assume", "expect", "doesn't know", "doesn't realize", 
+                         "not aware", "unaware", "search", "look for", "thought", "believed", "thinks", 
+                         "assumes", "believes", "sure", "expects", "convinced"]
+        person_phrases = ["left", "away", "return", "comes back", "came back", "enters", "outside", 
+                        "gone", "leaves", "walking", "steps"]
+        action_phrases = ["put", "place", "move", "take", "relocated", "removes", "carry", "hide", 
+                        "hides", "placed", "puts", "moves", "hid", "shifted"]
+        location_phrases = ["on the", "in the", "under the", "beside the", "near the", "at the", 
+                           "behind the", "inside the", "off the"]
+        object_movement = ["from the", "to the", "onto the", "into the", "out of the"]
+        
+        # Check for at least one item from each major category to confirm it's a ToM narrative
+        has_belief = any(phrase in prompt.lower() for phrase in belief_phrases)
+        has_people = any(phrase in prompt.lower() for phrase in person_phrases)
+        has_action = any(phrase in prompt.lower() for phrase in action_phrases)
+        has_location = any(phrase in prompt.lower() for phrase in location_phrases)
+        has_movement = any(phrase in prompt.lower() for phrase in object_movement)
+        
+        # Either belief + location, or movement + people should be present in a valid ToM prompt
+        if not ((has_belief and has_location) or (has_movement and has_people)):
+            if not (has_action and has_people):  # Fallback condition
+                return prompt, False, placeholder_count
+    
+    # For counterfactual, check for conditional language
+    elif category == "counterfactual":
+        conditional_phrases = ["if", "would", "could", "might", "had", "were", "without", "instead", "rather", 
+                              "otherwise", "alternatively", "contrary", "scenario", "hypothetical"]
+        has_conditional = any(phrase in prompt.lower() for phrase in conditional_phrases)
+        if not has_conditional:
+            return prompt, False, placeholder_count
+    
+    # For metaphorical_interpretation, check for metaphorical language in broader context
+    elif category == "metaphorical_interpretation":
+        # Check for explicit metaphorical indicators
+        metaphor_indicators = ["like", "as", "resembling", "akin to", "similar to", "compared to", 
+                              "mirrors", "echoes", "reflects", "metaphor", "symbolizes", "represents"]
+        has_explicit_metaphor = any(indicator in prompt.lower() for phrase in prompt.lower().split(".") for indicator in metaphor_indicators if phrase)
+        
+        # Check for implicit metaphorical language
+        implicit_metaphor_phrases = [
+            "facade", "mask", "beneath the surface", "symphony", "dance", "journey", "path", 
+            "storm", "seeds", "roots", "branches", "ocean", "river", "mountain", "bridge", 
+            "door", "window", "wall", "shadow", "light", "fire", "ice", "garden", "desert", 
+            "heart", "soul", "spirit", "ghost", "skeleton"
+        ]
+        has_implicit_metaphor = any(phrase in prompt.lower() for phrase in implicit_metaphor_phrases)
+        
+        # Check for metaphorical verbs/phrases
+        metaphorical_verbs = ["illuminate", "shine", "burn", "freeze", "grow", "wither", "soar", "plummet", 
+                             "blossom", "wilt", "flow", "cascade", "crumble", "shatter", "mend", "heal"]
+        has_metaphorical_verb = any(verb in prompt.lower() for verb in metaphorical_verbs)
+        
+        # Accept if ANY metaphorical language is present
+        if not (has_explicit_metaphor or has_implicit_metaphor or has_metaphorical_verb):
+            # Special case for "When faced with criticism" and similar prompts
+            common_metaphorical_scenarios = ["faced with", "deep down", "beneath", "inside", "heart"]
+            if not any(scenario in prompt.lower() for scenario in common_metaphorical_scenarios):
+                return prompt, False, placeholder_count
+    
+    return prompt, True, placeholder_count
+
+def filter_prompt_quality(row):
+    """Return True if prompt meets quality standards, False otherwise"""
+    prompt = row["prompt"]
+    category = row["category"]
+    is_forking = row.get("is_forking", False)
+   
+    # Category-specific minimum word counts
+    min_words = {
+        "factual_recall": 5,
+        "safety_alignment": 10,
+        "metaphorical_interpretation": 8,  # Reduced threshold for metaphorical examples
+        "default": 20
+    }
+   
+    # Get the appropriate minimum word count for this category
+    required_min_words = min_words.get(category, min_words["default"])
+   
+    # Length check
+    if len(prompt.split()) < required_min_words:
+        print(f"Filtered out prompt (too short): {prompt}")
+        return False
+   
+    # Be more lenient with ending punctuation
+    if not any(prompt.endswith(c) for c in "?.:!{}"):
+        print(f"Filtered out prompt (bad ending): {prompt}")
+        return False
+       
+    if prompt.count("...") > 2:  # Too many ellipses
+        print(f"Filtered out prompt (too many ellipses): {prompt}")
+        return False
+        
+    # For metaphorical_interpretation, accept if it uses metaphorical language
+    if category == "metaphorical_interpretation":
+        # Look for common metaphorical indicators
+        metaphor_indicators = ["like", "as", "resembling", "akin to", "similar to", 
+                               "compared to", "mirrors", "echoes", "reflects"]
+        if any(indicator in prompt.lower() for indicator in metaphor_indicators):
+            return True
+
+    # For theory_of_mind, ensure the prompt follows the expected format
+    if category == "theory_of_mind" and not is_forking:
+        _, is_valid = validate_and_fix_theory_of_mind_prompt(prompt)
+        if not is_valid:
+            print(f"Filtered out theory_of_mind prompt (invalid format): {prompt}")
+            return False
+    
+    # For forking token prompts, validate based on expected placeholders
+    if is_forking:
+        _, is_valid, placeholder_count = validate_multi_placeholder_prompt(prompt, category)
+        if not is_valid:
+            print(f"Filtered out forking prompt (invalid format): {prompt}")
+            return False
+        
+        # Ensure forking_indices is present for forking prompts
+        if "forking_indices" not in row:
+            print(f"Filtered out forking prompt (missing forking_indices): {prompt}")
+            return False
+    
+    return True
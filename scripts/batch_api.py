@@ -0,0 +1,139 @@
+"""
+Batch API submission for chat completion requests.
+
+Planned requests are serialised into a JSONL batch file (one
+`{"custom_id", "method", "url", "body"}` line per request), submitted as one
+job, polled until the job finishes, and read back as
+`{custom_id: chat completion body}`. Batch jobs are billed and rate-limited
+separately from interactive requests, so large runs do not compete for the
+per-minute budgets.
+
+OpenAIBatchRunner uses the real Files and Batches endpoints. LocalBatchRunner
+is a stand-in for tests and offline benchmarks: it runs the file's requests
+against the given client (e.g. one backed by the mock transport) and
+produces the same output file format.
+"""
+
+import asyncio
+import io
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import openai
+from openai import AsyncOpenAI
+
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_line(custom_id: str, model: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_URL,
+        "body": dict(request, model=model),
+    }
+
+
+def write_batch_file(path: str, lines: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_batch_file(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_batch_output(text: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Maps each custom_id in a batch output (or error) file to its chat
+    completion body, or None if that request failed.
+    """
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        response = entry.get("response") or {}
+        ok = not entry.get("error") and response.get("status_code") == 200
+        results[entry.get("custom_id")] = response.get("body") if ok else None
+    return results
+
+
+class OpenAIBatchRunner:
+    """Uploads a batch file, creates the batch job, polls it and downloads its results."""
+
+    def __init__(self, poll_interval: float = 30.0, completion_window: str = "24h"):
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, client: AsyncOpenAI, path: str,
+                  metadata: Optional[Dict[str, str]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        with open(path, "rb") as f:
+            uploaded = await client.files.create(file=(path.rsplit("/", 1)[-1], f.read()), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window,
+            metadata=metadata,
+        )
+        print(f"Submitted batch {batch.id} ({path})")
+
+        started = time.monotonic()
+        while batch.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        print(f"Batch {batch.id} {batch.status} after {time.monotonic() - started:.0f}s"
+              + (f" ({counts.completed}/{counts.total} requests completed)" if counts else ""))
+
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if file_id:
+                content = await client.files.content(file_id)
+                results.update(parse_batch_output(content.text))
+        return results
+
+
+class LocalBatchRunner:
+    """
+    Processes a batch file in-process with bounded concurrency and returns
+    results in the Batch API's output format. Failed requests come back as
+    None, as they would from a real batch's error file.
+    """
+
+    def __init__(self, max_concurrency: int = 16):
+        self.max_concurrency = max_concurrency
+
+    async def _complete(self, client: AsyncOpenAI, line: Dict[str, Any],
+                        slots: asyncio.Semaphore) -> Tuple[str, Dict[str, Any]]:
+        async with slots:
+            try:
+                resp = await client.chat.completions.create(**line["body"])
+            except openai.APIError as e:
+                status = getattr(e, "status_code", None) or 500
+                return line["custom_id"], {"status_code": status, "body": {"error": {"message": str(e)}}}
+        return line["custom_id"], {"status_code": 200, "body": resp.model_dump(mode="json")}
+
+    async def run(self, client: AsyncOpenAI, path: str,
+                  metadata: Optional[Dict[str, str]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        slots = asyncio.Semaphore(self.max_concurrency)
+        lines = read_batch_file(path)
+        responses = await asyncio.gather(*(self._complete(client, line, slots) for line in lines))
+
+        output = io.StringIO()
+        for custom_id, response in responses:
+            output.write(json.dumps({"custom_id": custom_id, "response": response, "error": None}) + "\n")
+        with open(f"{path}.output.jsonl", "w", encoding="utf-8") as f:
+            f.write(output.getvalue())
+        return parse_batch_output(output.getvalue())
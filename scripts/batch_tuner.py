@@ -0,0 +1,226 @@
+"""
+Online batch size and max_tokens tuning per (category, model, mode).
+
+Every response reports its usage, finish_reason and how many items it
+parsed to, and the filter stage reports how many of them were accepted.
+From those numbers the tuner keeps, per key:
+
+- an estimate of completion tokens per item, which sets max_tokens for
+  the next request (n items x tokens/item x headroom) instead of a fixed
+  guess, so requests reserve less of the TPM budget but rarely truncate;
+- a batch size that grows while responses finish cleanly, acceptance
+  holds up and each size yields at least as many accepted rows per 1k
+  tokens as the best smaller size (bigger batches amortise the prompt
+  tokens until truncation and rejections eat the gain). It is cut back when
+  a response is truncated or acceptance drops, and falls back to the most
+  token-efficient size once the current one does clearly worse.
+
+Observations are applied per category with update(), between generation
+rounds and in a fixed order, so the same responses (e.g. replayed from the
+response cache) always lead to the same batch sizes and max_tokens values.
+That is also why accepted rows per request-second are only reported: latency
+differs between a run and its replay, so it never drives a decision.
+
+Modes are "traditional" and "forking".
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+class _KeyStats:
+    def __init__(self, batch_size: float, headroom: float):
+        self.batch_size = batch_size
+        self.headroom = headroom
+        self.tokens_per_item: Optional[float] = None
+        self.truncation_rate = 0.0     # EWMA over responses
+        self.acceptance: Optional[float] = None   # EWMA of accepted / requested
+        self.best_acceptance = 0.0
+        self.requests = 0
+        self.truncated = 0
+        self.items = 0
+        self.accepted = 0
+        self.requested = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_s = 0.0
+        self.by_size: Dict[int, List[int]] = {}  # items per request -> [responses, tokens, accepted]
+
+    def size_stats(self, n: int) -> List[int]:
+        return self.by_size.setdefault(n, [0, 0, 0])
+
+
+class BatchTuner:
+    """
+    Per-(category, model, mode) controller for request batch size and max_tokens.
+
+    Additive increase (one item per `growth_window` clean responses while
+    truncations stay under `truncation_target`) and multiplicative decrease
+    (x `shrink` when acceptance falls below `acceptance_guard` x the best
+    seen, or when a truncated batch already gets `max_output_tokens`) keep
+    the batch size near the largest one that still finishes and passes
+    validation. A truncation widens the max_tokens headroom first. Growth
+    also stops at a size whose accepted rows per 1k tokens fall below
+    `throughput_guard` x the best size's (each measured over at least
+    `growth_window` responses), and the batch size drops back to that size.
+    `initial_batch_size` may be given per mode.
+    """
+
+    def __init__(self, initial_batch_size: Union[int, Dict[str, int]] = 4, min_batch_size: int = 1, max_batch_size: int = 12,
+                 default_tokens_per_item: Optional[Dict[str, int]] = None,
+                 min_max_tokens: int = 512, max_output_tokens: int = 16_384,
+                 headroom: float = 1.3, max_headroom: float = 2.5,
+                 truncation_target: float = 0.05, acceptance_guard: float = 0.85,
+                 growth_window: int = 2, shrink: float = 0.7, smoothing: float = 0.2,
+                 throughput_guard: float = 0.9):
+        self.initial_batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.default_tokens_per_item = default_tokens_per_item or {"traditional": 160, "forking": 250}
+        self.min_max_tokens = min_max_tokens
+        self.max_output_tokens = max_output_tokens
+        self.headroom = headroom
+        self.max_headroom = max_headroom
+        self.truncation_target = truncation_target
+        self.acceptance_guard = acceptance_guard
+        self.growth_window = growth_window
+        self.shrink = shrink
+        self.smoothing = smoothing
+        self.throughput_guard = throughput_guard
+        self._stats: Dict[Tuple[str, str, str], _KeyStats] = {}
+        self._pending_responses: Dict[str, List[Tuple]] = defaultdict(list)
+        self._pending_accepted: Dict[str, List[Tuple]] = defaultdict(list)
+
+    def _get(self, category: str, model: str, mode: str) -> _KeyStats:
+        key = (category, model, mode)
+        if key not in self._stats:
+            initial = self.initial_batch_size
+            if isinstance(initial, dict):
+                initial = initial[mode]
+            self._stats[key] = _KeyStats(initial, self.headroom)
+        return self._stats[key]
+
+    def batch_size(self, category: str, model: str, mode: str) -> int:
+        return max(self.min_batch_size, int(self._get(category, model, mode).batch_size))
+
+    def max_tokens(self, category: str, model: str, mode: str, n: int) -> int:
+        stats = self._get(category, model, mode)
+        if stats.tokens_per_item is None:
+            # No observations yet: the fixed per-item guess with the old 2048 floor
+            return min(self.max_output_tokens, max(n * self.default_tokens_per_item[mode], 2048))
+        budget = math.ceil(n * stats.tokens_per_item * stats.headroom) + 32  # JSON wrapper
+        return max(self.min_max_tokens, min(self.max_output_tokens, budget))
+
+    def record_response(self, category: str, model: str, mode: str, n: int,
+                        usage: Any, finish_reason: Optional[str], items: int,
+                        latency_s: Optional[float] = None):
+        """One completed request: its `usage` object, finish_reason and parsed item count."""
+        prompt_tokens = (getattr(usage, "prompt_tokens", None) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", None) or 0) if usage is not None else 0
+        self._pending_responses[category].append(
+            (model, mode, n, prompt_tokens, completion_tokens, finish_reason or "", items, latency_s or 0.0))
+
+    def record_accepted(self, category: str, model: str, mode: str, requested: int, accepted: int):
+        """How many of `requested` rows survived validation and de-duplication."""
+        if requested > 0:
+            self._pending_accepted[category].append((model, mode, requested, accepted))
+
+    def update(self, category: str):
+        """Applies the observations recorded for `category` since the last update."""
+        # Sorted, so the outcome does not depend on the order responses arrived in
+        # (latency, last in each tuple, never drives a decision)
+        for model, mode, n, prompt_tokens, completion_tokens, finish_reason, items, latency_s in \
+                sorted(self._pending_responses.pop(category, [])):
+            self._apply_response(category, model, mode, n, prompt_tokens, completion_tokens,
+                                 finish_reason, items, latency_s)
+        for model, mode, requested, accepted in sorted(self._pending_accepted.pop(category, [])):
+            self._apply_accepted(self._get(category, model, mode), requested, accepted)
+        for (cat, _, _), stats in self._stats.items():
+            if cat == category:
+                self._apply_throughput(stats)
+
+    def _apply_response(self, category: str, model: str, mode: str, n: int, prompt_tokens: int,
+                        completion_tokens: int, finish_reason: str, items: int, latency_s: float):
+        stats = self._get(category, model, mode)
+        stats.requests += 1
+        stats.items += items
+        stats.latency_s += latency_s
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        size = stats.size_stats(n)
+        size[0] += 1
+        size[1] += prompt_tokens + completion_tokens
+
+        truncated = finish_reason == "length"
+        stats.truncation_rate += self.smoothing * (float(truncated) - stats.truncation_rate)
+        if completion_tokens and items:
+            # A cut-off response's last item is dropped, so this slightly overestimates
+            per_item = completion_tokens / items
+            stats.tokens_per_item = per_item if stats.tokens_per_item is None else \
+                stats.tokens_per_item + self.smoothing * (per_item - stats.tokens_per_item)
+
+        if truncated:
+            stats.truncated += 1
+            stats.headroom = min(self.max_headroom, stats.headroom * 1.15)
+            if self.max_tokens(category, model, mode, n) >= self.max_output_tokens:
+                # More headroom cannot help: n items no longer fit in one response
+                stats.batch_size = max(self.min_batch_size, stats.batch_size * self.shrink)
+        elif stats.truncation_rate <= self.truncation_target and self._acceptance_ok(stats):
+            grown = min(self.max_batch_size, stats.batch_size + 1 / self.growth_window)
+            # A size already measured as less efficient is not tried again
+            if self._throughput_ok(stats, int(stats.batch_size)) and self._throughput_ok(stats, int(grown)):
+                stats.batch_size = grown
+
+    def _apply_accepted(self, stats: _KeyStats, requested: int, accepted: int):
+        stats.requested += requested
+        stats.accepted += accepted
+        stats.size_stats(requested)[2] += accepted
+        rate = accepted / requested
+        stats.acceptance = rate if stats.acceptance is None else \
+            stats.acceptance + self.smoothing * (rate - stats.acceptance)
+        stats.best_acceptance = max(stats.best_acceptance, stats.acceptance)
+        if not self._acceptance_ok(stats):
+            stats.batch_size = max(self.min_batch_size, stats.batch_size * self.shrink)
+            stats.best_acceptance = stats.acceptance  # re-baseline at the smaller size
+
+    def _accepted_per_1k_tokens(self, stats: _KeyStats, n: int) -> Optional[float]:
+        """Accepted rows per 1k tokens at `n` items per request, once measured over growth_window responses."""
+        responses, tokens, accepted = stats.by_size.get(n, (0, 0, 0))
+        return 1000 * accepted / tokens if responses >= self.growth_window and tokens else None
+
+    def _best_size(self, stats: _KeyStats) -> Optional[Tuple[float, int]]:
+        """(accepted per 1k tokens, items per request) of the most token-efficient measured size."""
+        measured = [(rate, n) for n in stats.by_size if (rate := self._accepted_per_1k_tokens(stats, n)) is not None]
+        # Ties go to the larger size, which needs fewer requests
+        return max(measured, default=None)
+
+    def _throughput_ok(self, stats: _KeyStats, n: int) -> bool:
+        rate, best = self._accepted_per_1k_tokens(stats, n), self._best_size(stats)
+        return rate is None or best is None or rate >= self.throughput_guard * best[0]
+
+    def _apply_throughput(self, stats: _KeyStats):
+        """Drops back to a smaller, more token-efficient size once the current size does clearly worse."""
+        n = int(stats.batch_size)
+        if not self._throughput_ok(stats, n) and self._best_size(stats)[1] < n:
+            stats.batch_size = max(self.min_batch_size, self._best_size(stats)[1])
+
+    def _acceptance_ok(self, stats: _KeyStats) -> bool:
+        return stats.acceptance is None or stats.acceptance >= self.acceptance_guard * stats.best_acceptance
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for (category, model, mode), s in self._stats.items():
+            tokens = s.prompt_tokens + s.completion_tokens
+            out[f"{category}|{model}|{mode}"] = {
+                "batch_size": self.batch_size(category, model, mode),
+                "tokens_per_item": round(s.tokens_per_item, 1) if s.tokens_per_item else None,
+                "headroom": round(s.headroom, 2),
+                "requests": s.requests,
+                "truncated": s.truncated,
+                "completion_tokens": s.completion_tokens,
+                "acceptance": round(s.accepted / s.requested, 3) if s.requested else None,
+                "accepted_per_1k_tokens": round(1000 * s.accepted / tokens, 2) if tokens else None,
+                "accepted_per_request_s": round(s.accepted / s.latency_s, 3) if s.latency_s else None,
+            }
+        return out
@@ -0,0 +1,94 @@
+"""
+End-to-end throughput benchmark: runs the full generate_prompts.main()
+against the in-process mock backend and reports wall-clock time and rows/s.
+
+Any generate_prompts flag can be passed through, e.g.
+
+    python scripts/bench_pipeline.py --target 100 --mock-latency-ms 400 \
+        --mock-429-rate 0.05 --mock-truncation-rate 0.1
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import generate_prompts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", type=int, default=50, help="TARGET_PER_CAT for the run")
+    parser.add_argument("--min-required", type=int, default=None,
+                        help="MIN_REQUIRED_PROMPTS (default: 90%% of --target)")
+    parser.add_argument("--batch-size", type=int, default=generate_prompts.BATCH_SIZE)
+    parser.add_argument("--quiet", action="store_true", help="swallow the pipeline's console output")
+    parser.add_argument("--json", dest="json_out", help="also write the report to this file")
+    args, passthrough = parser.parse_known_args()
+    return args, generate_prompts.parse_args(["--backend", "mock"] + passthrough)
+
+
+def main():
+    args, run_args = parse_args()
+    generate_prompts.TARGET_PER_CAT = args.target
+    generate_prompts.MIN_REQUIRED_PROMPTS = args.min_required or int(args.target * 0.9)
+    generate_prompts.BATCH_SIZE = args.batch_size
+
+    # Outputs (journal, dataset) go to a scratch directory; the report goes where it was asked for
+    if args.json_out:
+        args.json_out = os.path.abspath(args.json_out)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(workdir)
+
+    sink = io.StringIO() if args.quiet else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext():
+        metadata = asyncio.run(generate_prompts.main(run_args))
+    elapsed = time.perf_counter() - start
+
+    generated = sum(meta["generated_count"] for meta in metadata.values())
+    total = sum(meta["prompt_count"] for meta in metadata.values())
+    tuned = generate_prompts.BATCH_TUNER.summary().values()
+    request_tuning = {
+        "requests": sum(t["requests"] for t in tuned),
+        "truncated": sum(t["truncated"] for t in tuned),
+        "completion_tokens": sum(t["completion_tokens"] for t in tuned),
+        "batch_sizes": sorted({t["batch_size"] for t in tuned}),
+    }
+    strata = [generate_prompts.STRATA.summary(cat) for cat in metadata]
+    report = {
+        "target_per_category": args.target,
+        "categories": len(metadata),
+        "generated_rows": generated,
+        "total_rows": total,
+        "wall_clock_s": round(elapsed, 3),
+        "rows_per_s": round(generated / elapsed, 2) if elapsed > 0 else 0.0,
+        "mock_backend": generate_prompts.CLIENTS.transport.stats,
+        "salvaged": dict(generate_prompts.SALVAGE_STATS),
+        "request_tuning": request_tuning,
+        "strata": {
+            "cells_full": sum(s["cells_full"] for s in strata),
+            "cells": sum(s["cells"] for s in strata),
+            "shortfall": sum(s["shortfall"] for s in strata),
+        },
+        "rate_limiters": generate_prompts.RATE_LIMITERS.summary(),
+        "request_latency": generate_prompts.REQUEST_LATENCY.summary(),
+        "output_dir": workdir,
+    }
+
+    print("\n=== Pipeline Benchmark ===")
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    if os.name == "nt":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    sys.exit(main())
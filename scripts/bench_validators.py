@@ -0,0 +1,155 @@
+"""
+Benchmark for the compiled validator engine.
+
+Builds a synthetic corpus (100k prompts by default) from mock-backend
+generations, with perturbations that exercise every rejection path and the
+theory-of-mind placeholder repair. The corpus is run through the original
+row-by-row validators (a frozen copy in baseline_validators.py, or any
+generate_prompts.py that defines them) and through validator_engine.validate_many.
+The script checks that every decision and every repaired prompt is
+identical, then reports throughput.
+
+    python scripts/bench_validators.py --rows 100000
+"""
+
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import time
+from typing import Optional, Tuple
+
+import validator_engine
+from mock_backend import MockConfig, MockLLMTransport
+
+
+# ---- reference implementation (pre-engine validators) ------------------------
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_validators.py")
+BASELINE_FUNCTIONS = ("validate_and_fix_theory_of_mind_prompt", "validate_multi_placeholder_prompt",
+                      "filter_prompt_quality")
+
+# filter_prompt_quality printed why it rejected a row; the message maps to the engine's reason
+REJECTION_MESSAGES = [
+    ("prompt (too short)", validator_engine.TOO_SHORT),
+    ("prompt (bad ending)", validator_engine.BAD_ENDING),
+    ("prompt (too many ellipses)", validator_engine.TOO_MANY_ELLIPSES),
+    ("theory_of_mind prompt (invalid format)", validator_engine.INVALID_TOM_FORMAT),
+    ("forking prompt (invalid format)", validator_engine.INVALID_FORKING_FORMAT),
+    ("forking prompt (missing forking_indices)", validator_engine.MISSING_FORKING_INDICES),
+]
+
+
+class Reference:
+    """The original validators, compiled from the file at `path` (only those three functions are run)."""
+
+    def __init__(self, path: str = BASELINE_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        nodes = [node for node in ast.parse(source).body
+                 if isinstance(node, ast.FunctionDef) and node.name in BASELINE_FUNCTIONS]
+        if len(nodes) != len(BASELINE_FUNCTIONS):
+            raise SystemExit(f"{path} does not define {', '.join(BASELINE_FUNCTIONS)}")
+
+        self._message = ""
+        namespace = {"re": re, "Optional": Optional, "Tuple": Tuple, "print": self._print}
+        exec(compile(ast.Module(body=nodes, type_ignores=[]), path, "exec"), namespace)
+        self.validate_tom = namespace["validate_and_fix_theory_of_mind_prompt"]
+        self.validate_multi = namespace["validate_multi_placeholder_prompt"]
+        self._filter = namespace["filter_prompt_quality"]
+
+    def _print(self, message: str):
+        self._message = message
+
+    def check_quality(self, row) -> Optional[str]:
+        """Rejection reason (None = accepted), read from the message the original printed."""
+        if self._filter(row):
+            return None
+        return next(reason for text, reason in REJECTION_MESSAGES if text in self._message)
+
+# ---- corpus -------------------------------------------------------------------
+
+CATEGORIES = ["theory_of_mind", "counterfactual", "goal_representation", "situational_awareness",
+              "safety_alignment", "factual_recall", "metaphorical_interpretation"]
+
+PERSON_SWAPS = [("John", "I"), ("Mark", "you"), ("He ", "I "), ("She ", "You "), ("his ", "my "), ("her ", "your ")]
+
+
+def _perturb(prompt: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.15:
+        return prompt.replace("{}", "", 1)                       # placeholder dropped -> repair path
+    if roll < 0.25:
+        return prompt.replace("{}", "the spot").rstrip(".") + ""  # no placeholders, odd ending
+    if roll < 0.32:
+        return " ".join(prompt.split()[:rng.randint(2, 12)])     # too short
+    if roll < 0.37:
+        return prompt + " ... and ... then ... {}"               # ellipses
+    if roll < 0.47:
+        for old, new in rng.sample(PERSON_SWAPS, 3):
+            prompt = prompt.replace(old, new)                    # first/second person variants
+        return prompt.replace("{}", "", rng.randint(0, 1))
+    if roll < 0.52:
+        return prompt + " Where will they look?"                 # trailing question
+    if roll < 0.57:
+        return "Café scene: " + prompt.replace(" the ", " THE ")   # non-ASCII, mixed case
+    return prompt
+
+
+def build_corpus(n: int, seed: int):
+    rng = random.Random(seed)
+    mock = MockLLMTransport(MockConfig(seed=seed))
+    rows = []
+    for i in range(n):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        is_forking = rng.random() < 0.5
+        item = mock._forking_item(category) if is_forking else mock._traditional_item(category)
+        row = {"category": category, "prompt": _perturb(item["prompt"], rng), "is_forking": is_forking}
+        if is_forking and rng.random() < 0.95:
+            row["forking_indices"] = [item["forking_index"]]
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled validator engine.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, metavar="PATH",
+                        help="file defining the original validators, e.g. an old generate_prompts.py "
+                             "(default: the frozen copy in baseline_validators.py)")
+    args = parser.parse_args()
+
+    original = Reference(args.baseline)
+    rows = build_corpus(args.rows, args.seed)
+
+    start = time.perf_counter()
+    reference = [original.check_quality(row) for row in rows]
+    reference_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = validator_engine.validate_many(rows)
+    engine_s = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(reference, engine)) if a != b]
+    for row in rows:
+        if row["category"] == "theory_of_mind" and \
+                original.validate_tom(row["prompt"]) != validator_engine.validate_tom(row["prompt"]):
+            mismatches.append(row["prompt"])
+        if original.validate_multi(row["prompt"], row["category"]) != \
+                validator_engine.validate_multi(row["prompt"], row["category"]):
+            mismatches.append(row["prompt"])
+
+    accepted = sum(reason is None for reason in engine)
+    print(f"rows:        {len(rows):,} ({accepted:,} accepted)")
+    print(f"reference:   {reference_s:.3f}s  ({len(rows) / reference_s:,.0f} rows/s)")
+    print(f"engine:      {engine_s:.3f}s  ({len(rows) / engine_s:,.0f} rows/s)")
+    print(f"speedup:     {reference_s / engine_s:.1f}x")
+    print(f"mismatches:  {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
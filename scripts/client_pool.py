@@ -0,0 +1,127 @@
+"""
+Pooled AsyncOpenAI clients for the prompt generator.
+
+One keep-alive client (and so one HTTP connection pool) is created per API
+endpoint and shared by every batch that talks to it. Connection reuse is
+tracked through httpcore's trace hooks so a run can confirm that TCP/TLS
+handshakes happen once per pooled connection, not once per request.
+"""
+
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+
+DEFAULT_ENDPOINT = "default"
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class ConnectionStats:
+    """Request / connection / handshake counters for one endpoint's pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.http2_connections = 0
+        self.trace_events = 0
+
+    async def on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event: str, info: Dict[str, Any]):
+        self.trace_events += 1
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+        elif event == "http2.send_connection_init.complete":
+            self.http2_connections += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        if self.requests and not self.trace_events:
+            # Transports other than httpcore's pool (e.g. the mock backend) never
+            # emit connection events, so there is nothing to count
+            return {"requests": self.requests, "connections": "unavailable (transport reports no connection events)"}
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "http2_connections": self.http2_connections,
+            "reused_requests": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+class ClientManager:
+    """
+    Creates one pooled AsyncOpenAI client per endpoint and closes them all on shutdown.
+
+    `endpoints` maps a model name to a base_url; models without an entry share
+    the default OpenAI endpoint (and its connection pool).
+    """
+
+    def __init__(self, api_key: Optional[str] = None,
+                 endpoints: Optional[Dict[str, str]] = None,
+                 max_connections: int = 100,
+                 max_keepalive_connections: int = 50,
+                 keepalive_expiry: float = 60.0,
+                 http2: Optional[bool] = None,
+                 timeout: float = 120.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.transport = transport  # e.g. the in-process mock backend
+        self.endpoints = endpoints or {}
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2_available() if http2 is None else http2
+        self.timeout = timeout
+        self._clients: Dict[str, AsyncOpenAI] = {}
+        self._stats: Dict[str, ConnectionStats] = {}
+
+    def get(self, model: str) -> AsyncOpenAI:
+        endpoint = self.endpoints.get(model, DEFAULT_ENDPOINT)
+        if endpoint not in self._clients:
+            self._clients[endpoint] = self._create(endpoint)
+        return self._clients[endpoint]
+
+    def _create(self, endpoint: str) -> AsyncOpenAI:
+        if self.http2 and not http2_available():
+            print("Warning: HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            self.http2 = False
+
+        stats = self._stats[endpoint] = ConnectionStats()
+        http_options = {"transport": self.transport} if self.transport is not None else {}
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=self.limits,
+            http2=self.http2,
+            timeout=self.timeout,
+            event_hooks={"request": [stats.on_request]},
+            **http_options,
+        )
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=None if endpoint == DEFAULT_ENDPOINT else endpoint,
+            http_client=http_client,
+            max_retries=0,  # retries go through the rate limiter
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint: stats.as_dict() for endpoint, stats in self._stats.items()}
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
@@ -0,0 +1,141 @@
+"""
+Filtered, memory-mapped reads of a generated dataset for analysis.
+
+Answering "how many forking rows have reasoning_depth >= 3?" from the
+dataset JSON means json.load of the whole nested file, a loop over every
+category's `_rows` and a DataFrame before the first filter runs. This module
+opens the rows as a pyarrow Parquet dataset instead. The files are
+memory-mapped and only the columns a query asks for are decoded. Filters
+on category, is_forking, complexity, reasoning_depth, perspective and
+model_used go to the scanner, which skips whole row groups by their
+statistics. The Parquet written next to every dataset JSON can be read
+directly. Given a JSON file, the loader converts it once to
+`<name>.rows.parquet`, grouped by category and is_forking, and reuses it
+until the JSON changes.
+
+    from dataset_loader import PromptDataset
+    prompts = PromptDataset("synthetic_prompts_merged_full_structure_deduped.json")
+    prompts.filter(is_forking=True, reasoning_depth=range(3, 6)).count()
+    prompts.filter(category="theory_of_mind").without_seeds().to_pandas()
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from dataset_schema import SEED_MODELS
+from parquet_writer import ROW_SCHEMA, rows_to_table, table_to_rows
+
+
+FILTER_FIELDS = ("category", "is_forking", "complexity", "reasoning_depth", "perspective", "model_used")
+LOCAL_FS = pafs.LocalFileSystem(use_mmap=True)
+
+
+def rows_parquet_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + ".rows.parquet"
+
+
+def convert_json(json_path: str, parquet_path: Optional[str] = None) -> str:
+    """
+    Writes every `_rows` entry of a dataset JSON to Parquet, one row group per
+    (category, is_forking), so filters on either skip whole row groups.
+    """
+    parquet_path = parquet_path or rows_parquet_path(json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for data in dataset.values():
+        for row in data.get("_rows", []):
+            groups.setdefault((row["category"], bool(row.get("is_forking", False))), []).append(row)
+
+    tmp_path = f"{parquet_path}.tmp"
+    with pq.ParquetWriter(tmp_path, ROW_SCHEMA, compression="zstd") as writer:
+        for key in sorted(groups):
+            writer.write_table(rows_to_table(groups[key]), row_group_size=len(groups[key]))
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def open_dataset(source: Union[str, Sequence[str]]) -> ds.Dataset:
+    """
+    A pyarrow dataset over one or more generated .parquet files (e.g. the
+    shards of a run), or over a dataset JSON through its converted copy.
+    """
+    paths = [source] if isinstance(source, str) else list(source)
+    resolved = []
+    for path in paths:
+        if path.endswith(".json"):
+            cached = rows_parquet_path(path)
+            if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+                convert_json(path, cached)
+            path = cached
+        resolved.append(os.path.abspath(path))
+    return ds.dataset(resolved, schema=ROW_SCHEMA, format="parquet", filesystem=LOCAL_FS)
+
+
+def criteria_expression(**criteria) -> Optional[ds.Expression]:
+    """
+    field=value terms ANDed together. A list, tuple, set or range matches
+    any of its values, and None leaves the field unfiltered.
+    """
+    expression = None
+    for name, value in criteria.items():
+        if name not in FILTER_FIELDS:
+            raise TypeError(f"cannot filter on {name!r}; filterable fields are {', '.join(FILTER_FIELDS)}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, frozenset, range)):
+            term = ds.field(name).isin(list(value))
+        else:
+            term = ds.field(name) == value
+        expression = term if expression is None else expression & term
+    return expression
+
+
+class PromptDataset:
+    """
+    A filtered view of a generated dataset. filter() returns a narrower view;
+    nothing is read until count(), value_counts(), to_table(), to_pandas()
+    or rows().
+    """
+
+    def __init__(self, source: Union[str, Sequence[str], ds.Dataset],
+                 expression: Optional[ds.Expression] = None):
+        self.dataset = source if isinstance(source, ds.Dataset) else open_dataset(source)
+        self.expression = expression
+
+    def filter(self, expression: Optional[ds.Expression] = None, **criteria) -> "PromptDataset":
+        """Narrows the view by `criteria` (see criteria_expression) and/or a raw dataset expression."""
+        combined = self.expression
+        for term in (expression, criteria_expression(**criteria)):
+            if term is not None:
+                combined = term if combined is None else combined & term
+        return PromptDataset(self.dataset, combined)
+
+    def without_seeds(self) -> "PromptDataset":
+        return self.filter(~ds.field("model_used").isin(list(SEED_MODELS)))
+
+    def count(self) -> int:
+        return self.dataset.count_rows(filter=self.expression)
+
+    def value_counts(self, column: str) -> Dict[Any, int]:
+        """Rows per value of `column`, most frequent first (reads that column only)."""
+        counts = pc.value_counts(self.to_table([column]).column(column)).to_pylist()
+        counts.sort(key=lambda entry: -entry["counts"])
+        return {entry["values"]: entry["counts"] for entry in counts}
+
+    def to_table(self, columns: Optional[List[str]] = None) -> pa.Table:
+        return self.dataset.to_table(columns=columns, filter=self.expression)
+
+    def to_pandas(self, columns: Optional[List[str]] = None):
+        return self.to_table(columns).to_pandas()
+
+    def rows(self, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Matching rows as dicts shaped like the dataset JSON's `_rows`."""
+        return table_to_rows(self.to_table(columns))
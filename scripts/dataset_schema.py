@@ -0,0 +1,13 @@
+"""
+Constants that describe a generated dataset, shared by the generator and the
+tools that read its output (dataset_loader, merge_shards, export_tokens).
+
+Kept free of dependencies so that importing it from a reader does not run
+generate_prompts and its API client setup.
+"""
+
+# model_used of the rows built from each category's seed examples
+SEED_MODELS = ("original_seed", "original_seed_forking")
+
+# Minimum prompts per category (seeds included) for meets_minimum_requirement
+MIN_REQUIRED_PROMPTS = 300 #10 #167
@@ -0,0 +1,276 @@
+"""
+Pre-tokenised contrastive-pair export for interpretability jobs.
+
+Every analysis job used to re-tokenise every prompt from text. This stage
+tokenises the dataset once with a local tokenizer and writes fixed-shape
+NumPy arrays that later jobs memory-map (np.load(..., mmap_mode="r")) and
+slice into batches with no parsing. Per row (R rows, at most P
+placeholders, L tokens, A answer tokens):
+
+    tokens.npy               int32 [R, L]        prompt with every placeholder filled by
+                                                 its first option, right-padded with pad_id
+    lengths.npy              int32 [R]           attention length (unpadded tokens)
+    placeholder_offsets.npy  int32 [R, P]        token index where each placeholder's option
+                                                 starts (-1 past the row's placeholders)
+    answer_ids.npy           int32 [R, P, 2, A]  option 0 / option 1 tokens of every
+                                                 placeholder, tokenised in context (pad_id padded)
+    answer_lengths.npy       int32 [R, P, 2]
+    forking_index.npy        int32 [R]           the critical placeholder
+    is_forking.npy           bool  [R]
+    row_ids.npy, categories.npy   unicode [R]
+    meta.json                shapes, pad_id, tokenizer, source, skipped rows
+
+The logits at placeholder_offsets - 1 compare answer_ids[..., 0, 0] against
+answer_ids[..., 1, 0]. Traditional rows fork between answer_true (option 0)
+and answer_false at their last placeholder (see forking_paths.py).
+
+The tokenizer is pluggable. By default VocabTokenizer reads a local
+vocab.json ({token: id}) or vocab.txt (one token per line) and applies a
+greedy longest match within words. A tokenizer.json uses the `tokenizers`
+package if it is installed. `module:factory` calls any factory that
+returns an object with encode_with_offsets(text) -> (ids, [(start, end)]).
+
+    python scripts/export_tokens.py synthetic_prompts_<ts>.parquet vocab.json tokens/ --max-length 256
+"""
+
+import argparse
+import importlib
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dataset_loader import PromptDataset
+from forking_paths import ForkingTemplate
+
+
+PAD_TOKENS = ("<pad>", "[PAD]", "<|pad|>", "<|endoftext|>")
+UNK_TOKENS = ("<unk>", "[UNK]", "<|unk|>", "<|endoftext|>")
+SPACE_MARKERS = ("Ġ", "▁")   # byte-level BPE and SentencePiece spellings of a leading space
+ANSWER_TOKENS = 8            # default A
+
+Offsets = List[Tuple[int, int]]
+
+
+class VocabTokenizer:
+    """
+    Greedy longest-match tokenizer over a fixed vocabulary. Text is split
+    into words (with their leading space) and punctuation, and each piece is
+    matched against the vocabulary from the left. The space is spelled the
+    vocabulary's way (Ġ or ▁, if it has such tokens), and WordPiece "##"
+    continuations are used when present. Characters the vocabulary cannot
+    cover become the unknown token.
+    """
+
+    _PIECES = re.compile(r" ?\w+| ?[^\w\s]+|\s+")
+
+    def __init__(self, vocab: Dict[str, int], name: str = "vocab"):
+        self.vocab = vocab
+        self.name = name
+        self.max_token_chars = max(map(len, vocab))
+        self.space = next((m for m in SPACE_MARKERS if any(t.startswith(m) for t in vocab)), " ")
+        self.continuation = "##" if any(t.startswith("##") for t in vocab) else ""
+        self.pad_id = next((vocab[t] for t in PAD_TOKENS if t in vocab), 0)
+        self.unk_id = next((vocab[t] for t in UNK_TOKENS if t in vocab), self.pad_id)
+
+    @classmethod
+    def from_file(cls, path: str) -> "VocabTokenizer":
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                vocab = {str(token): int(i) for token, i in json.load(f).items()}
+            else:
+                vocab = {line.rstrip("\n"): i for i, line in enumerate(f) if line.rstrip("\n")}
+        return cls(vocab, name=os.path.basename(path))
+
+    def _match(self, piece: str, start: int, ids: List[int], offsets: Offsets):
+        spelled = self.space + piece[1:] if piece.startswith(" ") else piece
+        i = 0
+        while i < len(spelled):
+            prefix = self.continuation if i and self.continuation else ""
+            for j in range(min(len(spelled), i + self.max_token_chars), i, -1):
+                token_id = self.vocab.get(prefix + spelled[i:j])
+                if token_id is not None:
+                    break
+            else:
+                token_id, j = self.unk_id, i + 1
+            # The space marker stands for one character of the original text
+            ids.append(token_id)
+            offsets.append((start + i, start + j))
+            i = j
+
+    def encode_with_offsets(self, text: str) -> Tuple[List[int], Offsets]:
+        ids: List[int] = []
+        offsets: Offsets = []
+        for match in self._PIECES.finditer(text):
+            piece = match.group()
+            if piece.isspace() and self.space != " ":
+                piece = " " * len(piece)
+            self._match(piece, match.start(), ids, offsets)
+        return ids, offsets
+
+
+class HFTokenizer:
+    """A `tokenizers` tokenizer.json (only if the package is installed)."""
+
+    def __init__(self, path: str):
+        try:
+            from tokenizers import Tokenizer
+        except ImportError:
+            sys.exit("export_tokens: reading a tokenizer.json needs the 'tokenizers' package")
+        self.tokenizer = Tokenizer.from_file(path)
+        self.name = os.path.basename(path)
+        self.pad_id = next((self.tokenizer.token_to_id(t) for t in PAD_TOKENS
+                            if self.tokenizer.token_to_id(t) is not None), 0)
+
+    def encode_with_offsets(self, text: str) -> Tuple[List[int], Offsets]:
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        return list(encoding.ids), [tuple(offset) for offset in encoding.offsets]
+
+
+def load_tokenizer(spec: str):
+    """A vocab file, a tokenizer.json, or `module:factory` (called with no arguments)."""
+    if ":" in spec and not os.path.exists(spec):
+        module, factory = spec.split(":", 1)
+        return getattr(importlib.import_module(module), factory)()
+    if os.path.basename(spec) == "tokenizer.json":
+        return HFTokenizer(spec)
+    return VocabTokenizer.from_file(spec)
+
+
+def tokens_in_span(offsets: Offsets, start: int, end: int) -> Tuple[int, int]:
+    """[first, last) token indices overlapping the character span [start, end)."""
+    first = next((i for i, (a, b) in enumerate(offsets) if b > start), len(offsets))
+    last = next((i for i in range(first, len(offsets)) if offsets[i][0] >= end), len(offsets))
+    return first, max(last, first + 1 if end > start else first)
+
+
+def encode_row(tokenizer, template: ForkingTemplate) -> Dict[str, Any]:
+    """The base filling's tokens plus every placeholder's option tokens, each tokenised in context."""
+    base_choices = (0,) * template.placeholder_count
+    base = template.fill(base_choices)
+    ids, offsets = tokenizer.encode_with_offsets(base.text)
+    placeholder_offsets, answers = [], []
+    for i, span in enumerate(base.spans):
+        first, last = tokens_in_span(offsets, *span)
+        placeholder_offsets.append(first)
+        options = [ids[first:last]]
+        if len(template.options[i]) > 1:
+            other = template.fill(base_choices[:i] + (1,) + base_choices[i + 1:])
+            other_ids, other_offsets = tokenizer.encode_with_offsets(other.text)
+            other_first, other_last = tokens_in_span(other_offsets, *other.spans[i])
+            options.append(other_ids[other_first:other_last])
+        else:
+            options.append([])
+        answers.append(options)
+    return {"ids": ids, "placeholder_offsets": placeholder_offsets, "answers": answers}
+
+
+def export_tokens(rows: Sequence[Dict[str, Any]], tokenizer, out_dir: str, max_length: Optional[int] = None,
+                  answer_tokens: int = ANSWER_TOKENS, source: Optional[str] = None) -> Dict[str, Any]:
+    """Tokenises `rows` and writes the arrays described in the module docstring to `out_dir`; returns meta."""
+    encoded, kept, skipped = [], [], {"no_template": 0, "too_long": 0}
+    for row in rows:
+        try:
+            template = ForkingTemplate.from_row(row)
+        except (KeyError, ValueError, TypeError):
+            skipped["no_template"] += 1
+            continue
+        entry = encode_row(tokenizer, template)
+        if max_length is not None and len(entry["ids"]) > max_length:
+            skipped["too_long"] += 1
+            continue
+        entry["forking_index"] = template.critical_index
+        encoded.append(entry)
+        kept.append(row)
+
+    R = len(encoded)
+    L = max((len(e["ids"]) for e in encoded), default=0) if max_length is None else max_length
+    P = max((len(e["placeholder_offsets"]) for e in encoded), default=0)
+    A = answer_tokens
+    pad_id = tokenizer.pad_id
+    os.makedirs(out_dir, exist_ok=True)
+
+    def _open(name: str, shape: Tuple[int, ...], fill: int) -> np.ndarray:
+        array = np.lib.format.open_memmap(os.path.join(out_dir, name), mode="w+", dtype=np.int32, shape=shape)
+        array[...] = fill
+        return array
+
+    tokens = _open("tokens.npy", (R, L), pad_id)
+    lengths = _open("lengths.npy", (R,), 0)
+    placeholder_offsets = _open("placeholder_offsets.npy", (R, P), -1)
+    answer_ids = _open("answer_ids.npy", (R, P, 2, A), pad_id)
+    answer_lengths = _open("answer_lengths.npy", (R, P, 2), 0)
+    forking_index = _open("forking_index.npy", (R,), -1)
+    truncated_answers = 0
+    for r, entry in enumerate(encoded):
+        tokens[r, :len(entry["ids"])] = entry["ids"]
+        lengths[r] = len(entry["ids"])
+        placeholder_offsets[r, :len(entry["placeholder_offsets"])] = entry["placeholder_offsets"]
+        forking_index[r] = entry["forking_index"]
+        for p, options in enumerate(entry["answers"]):
+            for o, option_ids in enumerate(options):
+                truncated_answers += len(option_ids) > A
+                answer_ids[r, p, o, :min(A, len(option_ids))] = option_ids[:A]
+                answer_lengths[r, p, o] = len(option_ids)
+    for array in (tokens, lengths, placeholder_offsets, answer_ids, answer_lengths, forking_index):
+        array.flush()
+
+    np.save(os.path.join(out_dir, "is_forking.npy"), np.array([bool(row.get("is_forking")) for row in kept], dtype=bool))
+    np.save(os.path.join(out_dir, "row_ids.npy"), np.array([str(row["id"]) for row in kept], dtype=str))
+    np.save(os.path.join(out_dir, "categories.npy"), np.array([row["category"] for row in kept], dtype=str))
+
+    meta = {
+        "rows": R, "max_length": L, "max_placeholders": P, "answer_tokens": A,
+        "pad_id": pad_id, "tokenizer": getattr(tokenizer, "name", type(tokenizer).__name__),
+        "source": source, "skipped": skipped, "truncated_answers": truncated_answers,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_export(out_dir: str) -> Dict[str, np.ndarray]:
+    """Every exported array, memory-mapped read-only (the string arrays are loaded)."""
+    arrays = {}
+    for name in sorted(os.listdir(out_dir)):
+        if name.endswith(".npy"):
+            arrays[name[:-4]] = np.load(os.path.join(out_dir, name), mmap_mode="r")
+    return arrays
+
+
+def iter_batches(out_dir: str, batch_size: int) -> Iterator[Dict[str, np.ndarray]]:
+    """Fixed-shape batches (views into the memory maps; the last batch may be shorter)."""
+    arrays = load_export(out_dir)
+    rows = len(arrays["lengths"])
+    for start in range(0, rows, batch_size):
+        yield {name: array[start:start + batch_size] for name, array in arrays.items()}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dataset", help="dataset .json or .parquet (see dataset_loader.py)")
+    parser.add_argument("tokenizer", help="vocab.json / vocab.txt, a tokenizer.json, or module:factory")
+    parser.add_argument("out_dir", help="directory for the .npy arrays and meta.json")
+    parser.add_argument("--max-length", type=int, help="pad to this many tokens; longer rows are skipped")
+    parser.add_argument("--answer-tokens", type=int, default=ANSWER_TOKENS,
+                        help=f"answer tokens kept per option (default {ANSWER_TOKENS})")
+    parser.add_argument("--category", action="append", help="only these categories (repeatable)")
+    parser.add_argument("--forking-only", action="store_true", help="only forking rows")
+    parser.add_argument("--include-seeds", action="store_true", help="also export the seed rows")
+    args = parser.parse_args(argv)
+
+    prompts = PromptDataset(args.dataset).filter(category=args.category,
+                                                 is_forking=True if args.forking_only else None)
+    if not args.include_seeds:
+        prompts = prompts.without_seeds()
+    meta = export_tokens(prompts.rows(), load_tokenizer(args.tokenizer), args.out_dir,
+                         max_length=args.max_length, answer_tokens=args.answer_tokens, source=args.dataset)
+    print(f"✅  Exported {meta['rows']} rows x {meta['max_length']} tokens to {args.out_dir} "
+          f"(skipped: {meta['skipped']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Lazy expansion of forking prompts into their filled variants.
+
+A forking row's `prompt` holds one `{}` per entry of `placeholder_pairs`. A
+row with three pairs has 2^3 = 8 fillings, and `forking_indices` marks the
+placeholder that decides the outcome. ForkingTemplate splits the prompt at
+its literal `{}` markers once. It does not use str.format, so other braces
+in the text are left alone. Fillings are then built from the split
+segments, one at a time or in batches, without materialising the whole
+set. Each variant records the character span of every filled option.
+
+trie() arranges the fillings as a prefix tree. A node at depth d stands for
+one choice at each of the first d placeholders, and all fillings below it
+share its prefix text. A scorer can therefore compute a prefix once per
+node instead of once per variant. fork_points() gives the nodes just
+before the critical placeholder, with their branches.
+"""
+
+from itertools import islice, product
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+PLACEHOLDER = "{}"
+
+Choices = Tuple[int, ...]   # option index per placeholder
+
+
+class Variant:
+    """One filling: the option picked per placeholder, the text, and each filled option's span."""
+
+    __slots__ = ("choices", "text", "spans")
+
+    def __init__(self, choices: Choices, text: str, spans: List[Tuple[int, int]]):
+        self.choices = choices
+        self.text = text
+        self.spans = spans
+
+    def __repr__(self) -> str:
+        return f"Variant(choices={self.choices}, text={self.text!r})"
+
+
+class TrieNode:
+    """Shared prefix of every filling that agrees on `choices` (one per placeholder above `depth`)."""
+
+    __slots__ = ("parent", "choices", "text", "children")
+
+    def __init__(self, parent: Optional["TrieNode"], choices: Choices, text: str):
+        self.parent = parent
+        self.choices = choices
+        self.text = text          # what this node appends to its parent's prefix
+        self.children: List["TrieNode"] = []
+
+    @property
+    def depth(self) -> int:
+        return len(self.choices)
+
+    def prefix(self) -> str:
+        parts, node = [], self
+        while node is not None:
+            parts.append(node.text)
+            node = node.parent
+        return "".join(reversed(parts))
+
+    def walk(self) -> Iterator["TrieNode"]:
+        """This node and every node below it, depth first in choice order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def leaves(self) -> Iterator["TrieNode"]:
+        return (node for node in self.walk() if not node.children)
+
+
+class ForkingTemplate:
+    """A prompt split at its placeholders, with the options for each one."""
+
+    __slots__ = ("segments", "options", "forking_indices")
+
+    def __init__(self, prompt: str, options: Sequence[Sequence[Any]], forking_indices: Sequence[int] = ()):
+        self.segments = prompt.split(PLACEHOLDER)
+        if len(self.segments) - 1 != len(options):
+            raise ValueError(f"prompt has {len(self.segments) - 1} placeholders but {len(options)} option lists")
+        if any(not isinstance(pair, (list, tuple)) for pair in options):
+            raise ValueError("every placeholder's options must be a list")
+        self.options = [tuple(str(option) for option in pair if option is not None) for pair in options]
+        if any(not pair for pair in self.options):
+            raise ValueError("every placeholder needs at least one option")
+        self.forking_indices = [int(i) for i in forking_indices if 0 <= int(i) < len(self.options)]
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "ForkingTemplate":
+        """
+        A template for a dataset row. Forking rows take their placeholder_pairs.
+        A traditional row's last placeholder forks between answer_true and
+        answer_false. Any earlier placeholder (the two-placeholder
+        theory_of_mind rows) holds answer_false, where the object really went.
+        """
+        if row.get("placeholder_pairs"):
+            return cls(row["prompt"], row["placeholder_pairs"], row.get("forking_indices") or ())
+        count = row["prompt"].count(PLACEHOLDER)
+        if count == 0:
+            raise ValueError(f"row {row.get('id')} has no placeholder")
+        options = [(row["answer_false"],)] * (count - 1) + [(row["answer_true"], row["answer_false"])]
+        return cls(row["prompt"], options, [count - 1])
+
+    @property
+    def placeholder_count(self) -> int:
+        return len(self.options)
+
+    @property
+    def variant_count(self) -> int:
+        count = 1
+        for pair in self.options:
+            count *= len(pair)
+        return count
+
+    @property
+    def critical_index(self) -> int:
+        """The first forking index, or the last placeholder if none is given."""
+        return self.forking_indices[0] if self.forking_indices else self.placeholder_count - 1
+
+    def fill(self, choices: Choices) -> Variant:
+        parts, spans, offset = [self.segments[0]], [], len(self.segments[0])
+        for i, choice in enumerate(choices):
+            option = self.options[i][choice]
+            spans.append((offset, offset + len(option)))
+            parts.append(option)
+            parts.append(self.segments[i + 1])
+            offset += len(option) + len(self.segments[i + 1])
+        return Variant(tuple(choices), "".join(parts), spans)
+
+    def variants(self) -> Iterator[Variant]:
+        """Every filling, lazily, in choice order (fillings that share a prefix are adjacent)."""
+        for choices in product(*(range(len(pair)) for pair in self.options)):
+            yield self.fill(choices)
+
+    def batches(self, size: int) -> Iterator[List[Variant]]:
+        variants = self.variants()
+        while True:
+            batch = list(islice(variants, size))
+            if not batch:
+                return
+            yield batch
+
+    def trie(self) -> TrieNode:
+        """Prefix tree of all fillings; its leaves are the variants in choice order."""
+        root = TrieNode(None, (), self.segments[0])
+        level = [root]
+        for i, pair in enumerate(self.options):
+            next_level = []
+            for node in level:
+                for choice, option in enumerate(pair):
+                    child = TrieNode(node, node.choices + (choice,), option + self.segments[i + 1])
+                    node.children.append(child)
+                    next_level.append(child)
+            level = next_level
+        return root
+
+    def fork_points(self, index: Optional[int] = None,
+                    root: Optional[TrieNode] = None) -> Iterator[Tuple[TrieNode, List[TrieNode]]]:
+        """
+        (shared prefix node, its branches) at placeholder `index` (default:
+        the critical one), once for each way of filling the placeholders before it.
+        """
+        index = self.critical_index if index is None else index
+        level = [root or self.trie()]
+        for _ in range(index):
+            level = [child for node in level for child in node.children]
+        for node in level:
+            yield node, node.children
+
+
+def expand_rows(rows: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Tuple[str, Variant]]]:
+    """(row id, variant) batches over many rows, lazily; rows without a usable template are skipped."""
+    batch: List[Tuple[str, Variant]] = []
+    for row in rows:
+        try:
+            template = ForkingTemplate.from_row(row)
+        except (KeyError, ValueError, TypeError):
+            continue
+        for variant in template.variants():
+            batch.append((row["id"], variant))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
@@ -9,19 +9,44 @@
 # before doing a full run
 # """
 
-import uuid, time, random, math, os, asyncio, json, re
+import uuid, time, random, math, os, sys, asyncio, json, re, argparse, hashlib
+from collections import Counter
 from datetime import datetime, timezone
-from itertools import chain
-from typing import List, Dict, Any, Tuple, Optional, Union
+from functools import partial
+from itertools import chain, compress
+from operator import and_
+from typing import List, Dict, Any, Tuple, Optional, Union, Callable, Iterable
 
 import openai
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
 
 import pandas as pd
+import pyarrow.parquet as pq
 from tqdm.asyncio import tqdm_asyncio
 
+from acceptance_planner import AcceptanceTracker
+from batch_api import LocalBatchRunner, OpenAIBatchRunner, batch_line, write_batch_file
+from batch_tuner import BatchTuner
+from client_pool import ClientManager
+from dataset_schema import MIN_REQUIRED_PROMPTS, SEED_MODELS
+from json_salvage import ItemStreamParser, salvage_items
+from metrics import MetricsRegistry
+from mock_backend import MockConfig, MockLLMTransport
+from near_dedup import MinHashLSH
+from parquet_writer import StreamingParquetWriter, table_to_rows
+from quota_scheduler import StratumScheduler, format_assignment
+import quality_filter
+from rate_limiter import RateLimiterRegistry
+from response_cache import ResponseCache, OfflineCacheMiss
+from row_store import ChainedRows, RowStore
+from run_journal import RunJournal, load_journal
+from seed_selector import SeedSelector
+import validator_engine
 
-openai.api_key = os.environ["OPENAI_API_KEY"]
+
+# Only required for the real API; --backend mock and --offline run without it
+openai.api_key = os.environ.get("OPENAI_API_KEY")
 
 MODELS = {
     "gpt-4.1": 0.70,                 # share of prompts
@@ -33,7 +58,7 @@ MODELS = {
 
 BATCH_SIZE = 8 #20 #8 #20            # prompts to ask for in one completion
 TARGET_PER_CAT = 335 #10 #335        # rows per category
-MIN_REQUIRED_PROMPTS = 300 #10 #167  # minimum required prompts per category
+# MIN_REQUIRED_PROMPTS (minimum prompts per category) is in dataset_schema
 
 # Sentinel that protects placeholders inside JSON
 PLACEHOLDER = "${}"
@@ -41,6 +66,145 @@ PLACEHOLDER = "${}"
 # Configure the ratio of traditional vs. forking token prompts
 FORKING_TOKEN_RATIO = 0.5  # 50% of new prompts will use forking token format
 
+# Per-model API budgets shared by every category (requests / tokens per minute).
+# The limiter also adopts lower limits if the x-ratelimit-* headers report them.
+RATE_LIMITS = {
+    "gpt-4.1": {"rpm": 500, "tpm": 450_000},
+    "gpt-4.5-preview-2025-02-27": {"rpm": 500, "tpm": 150_000},
+}
+DEFAULT_RATE_LIMIT = {"rpm": 500, "tpm": 200_000}
+
+# AIMD concurrency window per model: starts at INITIAL, grows by one slot per
+# window of successes, halves on a 429
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 32
+MAX_RATE_LIMIT_RETRIES = 6  # 429/5xx retries per request before giving up
+
+# Shared HTTP connection pools: one keep-alive client per endpoint. Models not
+# listed in MODEL_ENDPOINTS use the default OpenAI endpoint.
+MODEL_ENDPOINTS: Dict[str, str] = {}
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 64
+HTTP_KEEPALIVE_EXPIRY = 60.0   # seconds an idle connection is kept open
+HTTP2 = None                   # None = use HTTP/2 when the h2 package is installed
+
+# The pools and limiters hold asyncio state bound to the loop that first uses
+# them, so main() replaces both at the start of every run
+def new_clients() -> ClientManager:
+    return ClientManager(
+        api_key=openai.api_key,
+        endpoints=MODEL_ENDPOINTS,
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        http2=HTTP2,
+    )
+
+def new_rate_limiters() -> RateLimiterRegistry:
+    return RateLimiterRegistry(
+        RATE_LIMITS, DEFAULT_RATE_LIMIT,
+        initial_concurrency=INITIAL_CONCURRENCY,
+        max_concurrency=MAX_CONCURRENCY,
+    )
+
+CLIENTS = new_clients()
+RATE_LIMITERS = new_rate_limiters()
+
+# Near-duplicate detection (MinHash/LSH over word 3-grams), run per category as
+# batches arrive. "reject" drops the row; "flag" keeps it with near_duplicate_of set.
+NEAR_DUP_THRESHOLD = 0.8   # estimated Jaccard similarity
+NEAR_DUP_ACTION = "reject"
+
+# Accepted rows are streamed into synthetic_prompts_<ts>.parquet; each category's
+# buffer is written as one row group once it holds this many rows
+PARQUET_FLUSH_ROWS = 1000
+
+# Deficit-driven generation: each round requests ceil(deficit / acceptance rate)
+# rows per model, with acceptance rates learned per (category, model) and saved
+# to ACCEPTANCE_RATES_PATH so the next run starts from them
+MAX_TOPUP_ROUNDS = 4
+DEFAULT_ACCEPTANCE_RATE = 0.8
+ACCEPTANCE_RATES_PATH = "acceptance_rates.json"
+ACCEPTANCE_RATES = AcceptanceTracker(default_rate=DEFAULT_ACCEPTANCE_RATE)
+
+# Items per request and max_tokens are tuned per (category, model, mode) from
+# each response's usage and finish_reason and from acceptance, between rounds;
+# requests start at BATCH_SIZE split by FORKING_TOKEN_RATIO. The tuner is
+# created in main()
+MIN_REQUEST_ITEMS = 1
+MAX_REQUEST_ITEMS = 12
+BATCH_TUNER = BatchTuner()
+
+# Every request is assigned a (perspective, complexity, reasoning_depth) cell
+# per item from its category's remaining deficits, so the mix SYSTEM_MSG asks
+# for is reached without over-generating (see quota_scheduler.py);
+# --no-stratify leaves the mix to the model. Recreated in main()
+STRATIFY = True
+STRATA = StratumScheduler()
+
+# Each request's seed examples are picked from the category's original seeds
+# and accepted rows by max-marginal relevance against recent outputs (see
+# seed_selector.py); --random-seeds samples the original seeds with the
+# category's RNG instead. Recreated in main()
+DIVERSE_SEEDS = True
+SEED_SELECTOR = SeedSelector()
+TRADITIONAL_SEED_EXAMPLES = 2
+FORKING_SEED_EXAMPLES = 2
+
+# --batch-api submits each generation round as Batch API jobs (one per model)
+# instead of interactive requests; the runner and batch file directory are set in main()
+BATCH_POLL_SECONDS = 30
+BATCH_RUNNER: Optional[Union[OpenAIBatchRunner, LocalBatchRunner]] = None
+BATCH_DIR = "."
+
+# --stream: completions are streamed and each results item is parsed, validated
+# and written as soon as it closes; a stream is cancelled once its model's quota is met
+STREAM_COMPLETIONS = False
+
+# Seed-example sampling uses one RNG per category (see category_rng), seeded
+# from --seed in main(). Categories are built concurrently, so a shared RNG would
+# be drawn from in an order that depends on timing. --seed is also sent as the
+# API `seed` parameter so sampling is as reproducible as the API allows
+RNG_SEED: Optional[int] = None
+CATEGORY_RNGS: Dict[str, random.Random] = {}
+API_SEED: Optional[int] = None
+
+# Row ids are uuid5s of the row content in this namespace (see row_id)
+ROW_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "synthetic-prompts/rows")
+
+# --shard i/N: this process generates shard i of N (0-based). Every (category,
+# model) quota is split across the shards, and merge_shards.py combines the
+# shards' dataset files afterwards. Set in main()
+SHARD = (0, 1)
+
+# Optional on-disk response cache (enabled with --cache-dir)
+CACHE_MAX_MB = 2048
+RESPONSE_CACHE: Optional[ResponseCache] = None
+
+# Complete items recovered from truncated or malformed JSON responses
+SALVAGE_STATS = Counter()
+
+# --debug prints every raw response and per-item parse warning; otherwise
+# those only show up as counts in the run metrics
+DEBUG = False
+
+# Run metrics, written at the end of main() to synthetic_prompts_<ts>.metrics.prom
+# (Prometheus text format) and synthetic_prompts_<ts>.summary.json
+METRICS = MetricsRegistry()
+REQUEST_LATENCY = METRICS.histogram("promptgen_request_latency_seconds",
+                                    "Latency of successful chat completion requests")
+FIRST_TOKEN_LATENCY = METRICS.histogram("promptgen_first_token_latency_seconds",
+                                        "Time to the first content delta of streamed completions")
+REQUESTS = METRICS.counter("promptgen_requests_total", "Chat completion attempts by outcome")
+RETRIES = METRICS.counter("promptgen_retries_total", "Retried requests and batches by reason")
+PROMPT_TOKENS = METRICS.counter("promptgen_prompt_tokens_total", "Prompt tokens billed")
+COMPLETION_TOKENS = METRICS.counter("promptgen_completion_tokens_total", "Completion tokens billed")
+PARSE_FAILURES = METRICS.counter("promptgen_parse_failures_total",
+                                 "Responses without usable items and items dropped while parsing")
+ROWS_ACCEPTED = METRICS.counter("promptgen_rows_accepted_total", "Generated rows accepted")
+ROWS_REJECTED = METRICS.counter("promptgen_rows_rejected_total",
+                                "Generated rows rejected by the quality filter or near-duplicate screen")
+
 
 # Seed examples
 CATEGORIES = {
@@ -337,317 +501,292 @@ def validate_and_fix_theory_of_mind_prompt(prompt, name_pair=None):
     Handles first-person, second-person, and third-person perspectives.
     Returns a tuple: (fixed_prompt, is_valid)
     """
-    if not prompt:
-        return prompt, False
-    
-    # If prompt already has exactly 2 placeholders, assume it's valid
-    if prompt.count("{}") == 2:
-        return prompt, True
-    
-    # Check for perspective patterns
-    is_first_person = any(pattern in prompt.lower() for pattern in ["i ", "me ", "my ", "i'm ", "i've ", "i'll "])
-    is_second_person = any(pattern in prompt.lower() for pattern in ["you ", "your ", "you're ", "you've ", "you'll "])
-    
-    # Check for key theory-of-mind elements based on perspective
-    has_false_belief = False
-    
-    if is_first_person:
-        has_false_belief = any(phrase in prompt.lower() for phrase in 
-                              ["i think", "i believe", "i assume", "i expect", "i search", "i look for"])
-    elif is_second_person:
-        has_false_belief = any(phrase in prompt.lower() for phrase in 
-                              ["you think", "you believe", "you assume", "you expect", "you search", "you look for"])
-    else:  # third-person
-        has_false_belief = any(phrase in prompt.lower() for phrase in 
-                              ["thinks", "believes", "assumes", "expects", "doesn't know", "searches", "looks for"])
-    
-    # If missing essential elements, it's not a valid ToM prompt
-    if not has_false_belief:
-        return prompt, False
-    
-    # Try to identify the main patterns for insertion points based on perspective
-    first_placeholder_pattern = None
-    second_placeholder_pattern = None
-    
-    if is_first_person:
-        # For first-person, look for patterns about someone moving something and model's belief
-        first_placeholder_pattern = re.search(
-            r"(moved it to|placed it (?:on|in|under|behind)|relocated it to|moved the .+? to|put .+? (?:on|in|under|behind)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-        second_placeholder_pattern = re.search(
-            r"(I (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-    elif is_second_person:
-        # For second-person, look for patterns about someone moving something and user's belief
-        first_placeholder_pattern = re.search(
-            r"(moved (?:it|them|your .+?) to|placed (?:it|them|your .+?) (?:on|in|under|behind)|relocated (?:it|them|your .+?) to|put (?:it|them|your .+?) (?:on|in|under|behind)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-        second_placeholder_pattern = re.search(
-            r"(you (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-    else:  # third-person
-        # For third-person, follow the traditional ToM format
-        first_placeholder_pattern = re.search(
-            r"(puts (?:it|the .+?) (?:on|in|under|behind|inside)|moves (?:it|the .+?) to|places (?:it|the .+?) (?:on|in|under|behind)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-        second_placeholder_pattern = re.search(
-            r"((?:thinks|believes|expects|assumes|searches|looks for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the", 
-            prompt, 
-            re.IGNORECASE
-        )
-    
-    # If we can't find both patterns, try more generic patterns
-    if not first_placeholder_pattern or not second_placeholder_pattern:
-        # Look for prepositions followed by "the" - common in object placement
-        location_phrases = [
-            r"(?:on|in|under|behind|inside) the",
-            r"moved to the",
-            r"placed on the",
-            r"put in the"
-        ]
-        
-        # Belief phrases that might indicate false belief
-        belief_phrases = [
-            r"think(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
-            r"believe(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
-            r"expect(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
-            r"assume(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
-            r"look(?:s|ed)? for(?: the)?(?: [\w\s]+)? (?:on|in|under|behind|inside) the",
-        ]
-        
-        # Try to find any matches
-        for phrase in location_phrases:
-            match = re.search(phrase, prompt, re.IGNORECASE)
-            if match and not first_placeholder_pattern:
-                first_placeholder_pattern = match
-                break
-        
-        for phrase in belief_phrases:
-            match = re.search(phrase, prompt, re.IGNORECASE)
-            if match and not second_placeholder_pattern:
-                second_placeholder_pattern = match
-                break
-    
-    # If we still can't find both patterns, prompt can't be fixed
-    if not first_placeholder_pattern or not second_placeholder_pattern:
-        return prompt, False
-    
-    # Fix the prompt by inserting placeholders after the matched patterns
-    parts = []
-    last_pos = 0
-    
-    # Insert first placeholder
-    first_pos = first_placeholder_pattern.end()
-    parts.append(prompt[last_pos:first_pos])
-    parts.append(" {} ")
-    last_pos = first_pos
-    
-    # Insert second placeholder
-    second_pos = second_placeholder_pattern.end()
-    parts.append(prompt[last_pos:second_pos])
-    parts.append(" {} ")
-    last_pos = second_pos
-    
-    # Add any remaining text
-    if last_pos < len(prompt):
-        parts.append(prompt[last_pos:])
-    
-    fixed_prompt = "".join(parts)
-    
-    # If we already have placeholders, avoid duplicating them
-    fixed_prompt = fixed_prompt.replace("{} {}", "{}")
-    
-    # Make sure we end up with exactly 2 placeholders
-    if fixed_prompt.count("{}") != 2:
-        return prompt, False
-        
-    return fixed_prompt, True
+    return validator_engine.validate_tom(prompt)
 
 def validate_multi_placeholder_prompt(prompt: str, category: str, expected_count: Optional[int] = None) -> Tuple[str, bool, int]:
     """
     Validates a prompt with multiple placeholders.
     Returns (prompt, is_valid, placeholder_count)
     """
-    if not prompt:
-        return prompt, False, 0
-    
-    # Process the prompt - remove any trailing questions for ToM prompts that might not have placeholders
-    if category == "theory_of_mind" and "?" in prompt:
-        # Only keep the part before the question mark for validation
-        main_prompt, question = prompt.split("?", 1)
-        placeholder_count = main_prompt.count("{}")
-    else:
-        # Count placeholders
-        placeholder_count = prompt.count("{}")
-    
-    # If no placeholders are found, it's invalid
-    if placeholder_count == 0:
-        return prompt, False, placeholder_count
-    
-    # Define expected placeholder counts by category
-    category_expected_counts = {
-        "theory_of_mind": (2, 4),        # 2-4 placeholders for ToM
-        "counterfactual": (3, 3),        # Exactly 3 for counterfactual
-        "goal_representation": (2, 3),   # 2-3 for goal_representation
-        "situational_awareness": (3, 3), # Exactly 3 for situational_awareness
-        "safety_alignment": (3, 3),      # Exactly 3 for safety_alignment
-        "factual_recall": (3, 3),        # Exactly 3 for factual_recall
-        "metaphorical_interpretation": (3, 3), # Exactly 3 for metaphorical_interpretation
-    }
-    
-    # If category has expected count range, check if placeholder count is in range
-    if category in category_expected_counts:
-        min_count, max_count = category_expected_counts[category]
-        if not (min_count <= placeholder_count <= max_count):
-            # If specified expected_count overrides category defaults, use that
-            if expected_count is not None and placeholder_count == expected_count:
-                pass  # This is okay, expected_count overrides category defaults
-            else:
-                return prompt, False, placeholder_count
-    # If explicit expected_count is given, validate against that
-    elif expected_count is not None and placeholder_count != expected_count:
-        return prompt, False, placeholder_count
-    
-    # For theory_of_mind, be extremely lenient with validation to avoid too many rejections
-    if category == "theory_of_mind":
-        # Check for common ToM narrative patterns
-        belief_phrases = ["think", "believe", "assume", "expect", "doesn't know", "doesn't realize", 
-                         "not aware", "unaware", "search", "look for", "thought", "believed", "thinks", 
-                         "assumes", "believes", "sure", "expects", "convinced"]
-        person_phrases = ["left", "away", "return", "comes back", "came back", "enters", "outside", 
-                        "gone", "leaves", "walking", "steps"]
-        action_phrases = ["put", "place", "move", "take", "relocated", "removes", "carry", "hide", 
-                        "hides", "placed", "puts", "moves", "hid", "shifted"]
-        location_phrases = ["on the", "in the", "under the", "beside the", "near the", "at the", 
-                           "behind the", "inside the", "off the"]
-        object_movement = ["from the", "to the", "onto the", "into the", "out of the"]
-        
-        # Check for at least one item from each major category to confirm it's a ToM narrative
-        has_belief = any(phrase in prompt.lower() for phrase in belief_phrases)
-        has_people = any(phrase in prompt.lower() for phrase in person_phrases)
-        has_action = any(phrase in prompt.lower() for phrase in action_phrases)
-        has_location = any(phrase in prompt.lower() for phrase in location_phrases)
-        has_movement = any(phrase in prompt.lower() for phrase in object_movement)
-        
-        # Either belief + location, or movement + people should be present in a valid ToM prompt
-        if not ((has_belief and has_location) or (has_movement and has_people)):
-            if not (has_action and has_people):  # Fallback condition
-                return prompt, False, placeholder_count
-    
-    # For counterfactual, check for conditional language
-    elif category == "counterfactual":
-        conditional_phrases = ["if", "would", "could", "might", "had", "were", "without", "instead", "rather", 
-                              "otherwise", "alternatively", "contrary", "scenario", "hypothetical"]
-        has_conditional = any(phrase in prompt.lower() for phrase in conditional_phrases)
-        if not has_conditional:
-            return prompt, False, placeholder_count
-    
-    # For metaphorical_interpretation, check for metaphorical language in broader context
-    elif category == "metaphorical_interpretation":
-        # Check for explicit metaphorical indicators
-        metaphor_indicators = ["like", "as", "resembling", "akin to", "similar to", "compared to", 
-                              "mirrors", "echoes", "reflects", "metaphor", "symbolizes", "represents"]
-        has_explicit_metaphor = any(indicator in prompt.lower() for phrase in prompt.lower().split(".") for indicator in metaphor_indicators if phrase)
-        
-        # Check for implicit metaphorical language
-        implicit_metaphor_phrases = [
-            "facade", "mask", "beneath the surface", "symphony", "dance", "journey", "path", 
-            "storm", "seeds", "roots", "branches", "ocean", "river", "mountain", "bridge", 
-            "door", "window", "wall", "shadow", "light", "fire", "ice", "garden", "desert", 
-            "heart", "soul", "spirit", "ghost", "skeleton"
-        ]
-        has_implicit_metaphor = any(phrase in prompt.lower() for phrase in implicit_metaphor_phrases)
-        
-        # Check for metaphorical verbs/phrases
-        metaphorical_verbs = ["illuminate", "shine", "burn", "freeze", "grow", "wither", "soar", "plummet", 
-                             "blossom", "wilt", "flow", "cascade", "crumble", "shatter", "mend", "heal"]
-        has_metaphorical_verb = any(verb in prompt.lower() for verb in metaphorical_verbs)
-        
-        # Accept if ANY metaphorical language is present
-        if not (has_explicit_metaphor or has_implicit_metaphor or has_metaphorical_verb):
-            # Special case for "When faced with criticism" and similar prompts
-            common_metaphorical_scenarios = ["faced with", "deep down", "beneath", "inside", "heart"]
-            if not any(scenario in prompt.lower() for scenario in common_metaphorical_scenarios):
-                return prompt, False, placeholder_count
-    
-    return prompt, True, placeholder_count
+    return validator_engine.validate_multi(prompt, category, expected_count)
 
-def filter_prompt_quality(row):
-    """Return True if prompt meets quality standards, False otherwise"""
-    prompt = row["prompt"]
-    category = row["category"]
-    is_forking = row.get("is_forking", False)
-   
-    # Category-specific minimum word counts
-    min_words = {
-        "factual_recall": 5,
-        "safety_alignment": 10,
-        "metaphorical_interpretation": 8,  # Reduced threshold for metaphorical examples
-        "default": 20
-    }
-   
-    # Get the appropriate minimum word count for this category
-    required_min_words = min_words.get(category, min_words["default"])
-   
-    # Length check
-    if len(prompt.split()) < required_min_words:
-        print(f"Filtered out prompt (too short): {prompt}")
-        return False
-   
-    # Be more lenient with ending punctuation
-    if not any(prompt.endswith(c) for c in "?.:!{}"):
-        print(f"Filtered out prompt (bad ending): {prompt}")
-        return False
-       
-    if prompt.count("...") > 2:  # Too many ellipses
-        print(f"Filtered out prompt (too many ellipses): {prompt}")
-        return False
-        
-    # For metaphorical_interpretation, accept if it uses metaphorical language
-    if category == "metaphorical_interpretation":
-        # Look for common metaphorical indicators
-        metaphor_indicators = ["like", "as", "resembling", "akin to", "similar to", 
-                               "compared to", "mirrors", "echoes", "reflects"]
-        if any(indicator in prompt.lower() for indicator in metaphor_indicators):
-            return True
-
-    # For theory_of_mind, ensure the prompt follows the expected format
-    if category == "theory_of_mind" and not is_forking:
-        _, is_valid = validate_and_fix_theory_of_mind_prompt(prompt)
-        if not is_valid:
-            print(f"Filtered out theory_of_mind prompt (invalid format): {prompt}")
-            return False
-    
-    # For forking token prompts, validate based on expected placeholders
-    if is_forking:
-        _, is_valid, placeholder_count = validate_multi_placeholder_prompt(prompt, category)
-        if not is_valid:
-            print(f"Filtered out forking prompt (invalid format): {prompt}")
-            return False
+def row_id(category: str, prompt: str, answer_true: Any = None, answer_false: Any = None,
+           placeholder_pairs: Optional[List[Any]] = None) -> str:
+    """
+    uuid5 of a row's content, so the same prompt and answers get the same id in
+    every run, shard and cached replay (merges and --extend recognise them)
+    """
+    content = json.dumps([category, prompt, answer_true, answer_false, placeholder_pairs],
+                         ensure_ascii=False, separators=(",", ":"))
+    return str(uuid.uuid5(ROW_ID_NAMESPACE, content))
+
+def category_rng(cat: str) -> random.Random:
+    """The category's own RNG, seeded from RNG_SEED and the category name in a seeded run"""
+    if cat not in CATEGORY_RNGS:
+        CATEGORY_RNGS[cat] = random.Random(f"{RNG_SEED}:{cat}" if RNG_SEED is not None else None)
+    return CATEGORY_RNGS[cat]
+
+def seed_kwargs() -> Dict[str, int]:
+    """The API `seed` argument of a seeded run (nothing otherwise)"""
+    return {} if API_SEED is None else {"seed": API_SEED}
+
+def debug(message: str):
+    if DEBUG:
+        print(message)
+
+def record_usage(model: str, usage):
+    if usage is not None:
+        PROMPT_TOKENS.inc(usage.prompt_tokens or 0, model=model)
+        COMPLETION_TOKENS.inc(usage.completion_tokens or 0, model=model)
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough token cost of a request (~4 chars per token) for the TPM budget"""
+    return sum(len(m["content"]) for m in messages) // 4 + max_tokens
+
+async def create_chat_completion(client: AsyncOpenAI, model: str, **kwargs):
+    """
+    Sends one chat completion through the model's shared rate limiter.
+    429s shrink the model's concurrency window and are retried after the
+    server's reset time; other transient errors are retried with backoff.
+    """
+    cache_key = None
+    if RESPONSE_CACHE is not None:
+        cache_key = RESPONSE_CACHE.key_for(dict(kwargs, model=model))
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            REQUESTS.inc(model=model, outcome="cached")
+            return ChatCompletion.model_validate(cached)
+        if RESPONSE_CACHE.offline:
+            raise OfflineCacheMiss(f"No cached response for this {model} request (offline replay)")
+
+    limiter = RATE_LIMITERS.get(model)
+    est_tokens = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens") or 0)
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire(est_tokens)
+        used_tokens = None
+        started = time.monotonic()
+        try:
+            raw = await client.chat.completions.with_raw_response.create(model=model, **kwargs)
+            resp = raw.parse()
+            if resp.usage is not None:
+                used_tokens = resp.usage.total_tokens
+        except openai.RateLimitError as e:
+            REQUESTS.inc(model=model, outcome="rate_limited")
+            await limiter.on_rate_limited(e.response.headers)
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            RETRIES.inc(model=model, reason="rate_limited")
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError):
+            REQUESTS.inc(model=model, outcome="error")
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            RETRIES.inc(model=model, reason="transient_error")
+            await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        finally:
+            await limiter.release(est_tokens, used_tokens)
+
+        REQUESTS.inc(model=model, outcome="ok")
+        REQUEST_LATENCY.observe(time.monotonic() - started, model=model, api="chat")
+        record_usage(model, resp.usage)
+        await limiter.on_success(raw.headers)
+        if cache_key is not None:
+            RESPONSE_CACHE.put(cache_key, resp.model_dump(mode="json"))
+        return resp
+
+async def stream_chat_completion(client: AsyncOpenAI, model: str,
+                                 on_content: Callable[[str], bool], **kwargs) -> Tuple[str, Optional[str], Any]:
+    """
+    Streams one chat completion through the model's shared rate limiter,
+    passing each content delta to `on_content` as it arrives; the stream is
+    cancelled as soon as on_content returns False. 429s and transient errors
+    are retried like create_chat_completion, but only before any content has
+    been delivered. Returns (content, finish_reason, usage), finish_reason
+    being "cancelled" for a stream stopped early.
+    """
+    cache_key = None
+    if RESPONSE_CACHE is not None:
+        cache_key = RESPONSE_CACHE.key_for(dict(kwargs, model=model))
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            REQUESTS.inc(model=model, outcome="cached")
+            completion = ChatCompletion.model_validate(cached)
+            content = completion.choices[0].message.content or ""
+            on_content(content)
+            return content, completion.choices[0].finish_reason, completion.usage
+        if RESPONSE_CACHE.offline:
+            raise OfflineCacheMiss(f"No cached response for this {model} request (offline replay)")
+
+    limiter = RATE_LIMITERS.get(model)
+    est_tokens = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens") or 0)
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire(est_tokens)
+        used_tokens = None
+        usage = None
+        parts: List[str] = []
+        finish_reason = None
+        last_chunk = None
+        started = time.monotonic()
+        try:
+            raw = await client.chat.completions.with_raw_response.create(
+                model=model, stream=True, stream_options={"include_usage": True}, **kwargs)
+            stream = raw.parse()
+            async for chunk in stream:
+                last_chunk = chunk
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                    used_tokens = usage.total_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if delta:
+                    if not parts:
+                        FIRST_TOKEN_LATENCY.observe(time.monotonic() - started, model=model)
+                    parts.append(delta)
+                    if on_content(delta) is False:
+                        finish_reason = "cancelled"
+                        await stream.close()
+                        break
+        except openai.RateLimitError as e:
+            REQUESTS.inc(model=model, outcome="rate_limited")
+            await limiter.on_rate_limited(e.response.headers)
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            RETRIES.inc(model=model, reason="rate_limited")
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError):
+            REQUESTS.inc(model=model, outcome="error")
+            if parts or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise  # content already delivered cannot be retracted
+            RETRIES.inc(model=model, reason="transient_error")
+            await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        finally:
+            await limiter.release(est_tokens, used_tokens)
+
+        REQUESTS.inc(model=model, outcome="cancelled" if finish_reason == "cancelled" else "ok")
+        REQUEST_LATENCY.observe(time.monotonic() - started, model=model, api="stream")
+        record_usage(model, usage)
+        await limiter.on_success(raw.headers)
+        content = "".join(parts)
+        if cache_key is not None and finish_reason != "cancelled" and last_chunk is not None:
+            RESPONSE_CACHE.put(cache_key, {
+                "id": last_chunk.id, "object": "chat.completion", "created": last_chunk.created, "model": model,
+                "choices": [{"index": 0, "finish_reason": finish_reason or "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage.model_dump(mode="json") if usage is not None else None,
+            })
+        return content, finish_reason, usage
+
+async def stream_batch_rows(client: AsyncOpenAI, model: str, request: Dict[str, Any],
+                            parse_items: Callable[[List[Any]], List[Dict[str, Any]]],
+                            on_rows: Callable[[List[Dict[str, Any]]], None],
+                            should_stop: Optional[Callable[[], bool]] = None,
+                            on_response: Optional[Callable[[Any, Optional[str], int], None]] = None,
+                            ) -> Optional[List[Dict[str, Any]]]:
+    """
+    Streams a batch request and parses each results item as soon as it
+    closes, handing its rows to `on_rows` right away. Returns every row, or
+    None if the response contained no usable items. `on_response(usage,
+    finish_reason, items)` is called for every stream that ran to the end.
+    """
+    parser = ItemStreamParser()
+    rows: List[Dict[str, Any]] = []
+
+    def _on_content(delta: str) -> bool:
+        items = parser.feed(delta)
+        if items:
+            new_rows = parse_items(items)
+            if new_rows:
+                rows.extend(new_rows)
+                on_rows(new_rows)
+        return not (should_stop is not None and should_stop())
+
+    content, finish_reason, usage = await stream_chat_completion(client, model, _on_content, **request)
+    if finish_reason == "cancelled":
+        return rows
+    if not parser.items:
+        # Not an items array (e.g. a bare prompt object): parse the full text instead
+        items = extract_result_items(content)
+        if on_response is not None:
+            on_response(usage, finish_reason, len(items or []))
+        if not items:
+            return None
+        rows = parse_items(items)
+        if rows:
+            on_rows(rows)
+        return rows
+    if on_response is not None:
+        on_response(usage, finish_reason, parser.items)
+    if not parser.done:
+        SALVAGE_STATS["responses"] += 1
+        SALVAGE_STATS["items"] += parser.items
+    return rows
+
+def extract_result_items(content: str) -> Optional[List[Any]]:
+    """
+    The generated items in a model's JSON response (its 'results', 'data' or
+    'items' array, a bare array, or a single prompt object). None if no JSON
+    object can be parsed from the response.
+    """
+    # Try to extract the JSON object from the response
+    content = content.strip()
+    json_match = re.search(r'(\{[\s\S]*\})', content, re.DOTALL)
+    if not json_match:
+        return salvage_result_items(content)
         
-        # Ensure forking_indices is present for forking prompts
-        if "forking_indices" not in row:
-            print(f"Filtered out forking prompt (missing forking_indices): {prompt}")
-            return False
+    try:
+        content_obj = json.loads(json_match.group(1))
+    except json.JSONDecodeError:
+        return salvage_result_items(content)
     
-    return True
+    # Extract the results
+    if isinstance(content_obj, list):
+        return content_obj
+    if not isinstance(content_obj, dict):
+        return []
+    for key in ("results", "data", "items"):
+        if key in content_obj:
+            return content_obj[key]
+    if "prompt" in content_obj:
+        return [content_obj]
+    print(f"Warning: Unexpected JSON structure: {list(content_obj.keys())}")
+    return []
 
-async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1):
-    """Generate a batch of traditional prompts (with single/dual placeholders at the end)"""
-    client = AsyncOpenAI(api_key=openai.api_key)
-    
+def salvage_result_items(content: str) -> Optional[List[Any]]:
+    """
+    For a response that is not valid JSON (typically cut off at max_tokens):
+    every complete item of its results array, dropping only the trailing
+    partial one. None if nothing could be recovered.
+    """
+    items, complete = salvage_items(content)
+    if not items:
+        print("Warning: could not extract JSON from model output")
+        return None
+    SALVAGE_STATS["responses"] += 1
+    SALVAGE_STATS["items"] += len(items)
+    debug(f"Salvaged {len(items)} complete items from a {'malformed' if complete else 'truncated'} response")
+    return items
+
+def build_traditional_request(cat: str, cfg: dict, n: int, max_tokens: Optional[int] = None,
+                              cells: Optional[List[Tuple[str, str, int]]] = None,
+                              rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """
+    Chat completion arguments (everything but the model) asking for n traditional
+    prompts; max_tokens defaults to a fixed per-item guess. `cells` assigns each
+    prompt its perspective, complexity and reasoning_depth; `rng` (default: the
+    category's) samples random seed examples
+    """
+    rng = rng or category_rng(cat)
     # Select some seed examples
-    seeds = random.sample(cfg["prompt_format"], k=min(2, len(cfg["prompt_format"])))
+    if DIVERSE_SEEDS and SEED_SELECTOR.has(cat, "traditional"):
+        seeds = [example["prompt"] for example in SEED_SELECTOR.select(cat, "traditional", TRADITIONAL_SEED_EXAMPLES)]
+    else:
+        seeds = rng.sample(cfg["prompt_format"], k=min(2, len(cfg["prompt_format"])))
     
     # Base message for all categories
     base_msg = (
@@ -726,118 +865,131 @@ async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, ma
             "For each prompt also invent a plausible name_pair. "
             "Return as a valid JSON object with a 'results' array."
         )
+    if cells:
+        user_msg += "\n\n" + format_assignment(cells)
 
-    for attempt in range(max_retries):
+    return {
+        "temperature": 0.9,
+        "max_tokens": max_tokens or max(n * 160, 2048),
+        "messages": [
+            {"role": "system", "content": SYSTEM_MSG},
+            {"role": "user",  "content": user_msg}
+        ],
+        "response_format": {"type": "json_object"},
+        **seed_kwargs(),
+    }
+
+def parse_traditional_items(cat: str, model: str, items: List[Any]) -> List[Dict[str, Any]]:
+    """Turns the items of a traditional-batch response into rows, fixing or skipping invalid ones"""
+    created_utc = datetime.now(timezone.utc).isoformat()  # one string shared by the batch's rows
+    rows = []
+
+    for obj in items:
         try:
-            resp = await client.chat.completions.create(
-                model=model,
-                temperature=0.9,
-                max_tokens= max(n * 160, 2048),
-                messages=[
-                    {"role": "system", "content": SYSTEM_MSG},
-                    {"role": "user",  "content": user_msg}
-                ],
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content
-            
-            # Print raw content for debugging (truncated to avoid console clutter)
-            print(f"\nRaw response from {model}:")
-            print(content[:500] + "..." if len(content) > 500 else content)
-            
-            # Try to extract the JSON object from the response
-            content = content.strip()
-            json_match = re.search(r'(\{[\s\S]*\})', content, re.DOTALL)
-            if not json_match:
-                print("Warning: could not extract JSON from model output; retrying…")
+            # Validate required fields
+            if "prompt" not in obj:
+                debug(f"Warning: Item missing 'prompt' key: {obj}")
                 continue
-                
-            try:
-                content_obj = json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                print("Warning: Failed to parse JSON. Retrying...")
+            if "name_pair" not in obj:
+                debug(f"Warning: Item missing 'name_pair' key: {obj}")
                 continue
             
-            # Extract the results
-            if isinstance(content_obj, list):
-                items = content_obj
-            elif "results" in content_obj:
-                items = content_obj["results"]
-            elif "data" in content_obj:
-                items = content_obj["data"]
-            elif "items" in content_obj:
-                items = content_obj["items"]
-            else:
-                if "prompt" in content_obj:
-                    items = [content_obj]
-                else:
-                    print(f"Warning: Unexpected JSON structure: {list(content_obj.keys())}")
-                    items = []
-            
-            # Process valid items
-            if items:
-                base_time = datetime.now(timezone.utc)
-                rows = []
-
-                for obj in items:
-                    try:
-                        # Validate required fields
-                        if "prompt" not in obj:
-                            print(f"Warning: Item missing 'prompt' key: {obj}")
-                            continue
-                        if "name_pair" not in obj:
-                            print(f"Warning: Item missing 'name_pair' key: {obj}")
+            # For theory_of_mind, validate and fix the prompt
+            prompt = obj["prompt"]
+            if cat == "theory_of_mind":
+                # First try to fix without debugging output
+                fixed_prompt, is_valid = validate_and_fix_theory_of_mind_prompt(prompt)
+                if not is_valid:
+                    # If initial validation fails, print the prompt for debugging
+                    debug(f"Warning: Unable to validate theory_of_mind prompt. Attempting to fix.")
+                    # If prompt looks mostly correct but just missing placeholders, force fix it
+                    if "In the room there are" in prompt and "takes the cat" in prompt:
+                        # Simple placeholder insertion at typical positions
+                        if "puts it on the" in prompt or "puts the cat on the" in prompt:
+                            prompt = re.sub(r'puts (?:it|the cat) on the(?!\s*\{\})', 'puts it on the {}', prompt)
+                        if "thinks the cat is on the" in prompt:
+                            prompt = re.sub(r'thinks the cat is on the(?!\s*\{\})', 'thinks the cat is on the {}', prompt)
+                        # Check if we now have two placeholders
+                        if prompt.count("{}") == 2:
+                            fixed_prompt = prompt
+                            is_valid = True
+                        else:
+                            debug(f"Warning: Could not fix theory_of_mind prompt; skipping")
                             continue
-                        
-                        # For theory_of_mind, validate and fix the prompt
-                        prompt = obj["prompt"]
-                        if cat == "theory_of_mind":
-                            # First try to fix without debugging output
-                            fixed_prompt, is_valid = validate_and_fix_theory_of_mind_prompt(prompt)
-                            if not is_valid:
-                                # If initial validation fails, print the prompt for debugging
-                                print(f"Warning: Unable to validate theory_of_mind prompt. Attempting to fix.")
-                                # If prompt looks mostly correct but just missing placeholders, force fix it
-                                if "In the room there are" in prompt and "takes the cat" in prompt:
-                                    # Simple placeholder insertion at typical positions
-                                    if "puts it on the" in prompt or "puts the cat on the" in prompt:
-                                        prompt = re.sub(r'puts (?:it|the cat) on the(?!\s*\{\})', 'puts it on the {}', prompt)
-                                    if "thinks the cat is on the" in prompt:
-                                        prompt = re.sub(r'thinks the cat is on the(?!\s*\{\})', 'thinks the cat is on the {}', prompt)
-                                    # Check if we now have two placeholders
-                                    if prompt.count("{}") == 2:
-                                        fixed_prompt = prompt
-                                        is_valid = True
-                                    else:
-                                        print(f"Warning: Could not fix theory_of_mind prompt; skipping")
-                                        continue
-                                else:
-                                    print(f"Warning: Could not fix theory_of_mind prompt; skipping")
-                                    continue
-                            prompt = fixed_prompt
-                        
-                        rows.append({
-                            "id": str(uuid.uuid4()),
-                            "category": cat,
-                            "model_used": model,
-                            "created_utc": base_time.isoformat(),
-                            "prompt": prompt,
-                            "answer_true": obj["name_pair"][0],
-                            "answer_false": obj["name_pair"][1],
-                            "complexity": obj.get("complexity"),
-                            "reasoning_depth": obj.get("reasoning_depth"),
-                            "distractors_present": obj.get("distractors_present", False),
-                            "perspective": obj.get("perspective", "third"),
-                            "is_forking": False
-                        })
-                    except (KeyError, IndexError) as e:
-                        print(f"Warning: Error processing item: {e}, {obj}")
+                    else:
+                        debug(f"Warning: Could not fix theory_of_mind prompt; skipping")
                         continue
-                        
+                prompt = fixed_prompt
+            
+            rows.append({
+                "id": row_id(cat, prompt, obj["name_pair"][0], obj["name_pair"][1]),
+                "category": cat,
+                "model_used": model,
+                "created_utc": created_utc,
+                "prompt": prompt,
+                "answer_true": obj["name_pair"][0],
+                "answer_false": obj["name_pair"][1],
+                "complexity": obj.get("complexity"),
+                "reasoning_depth": obj.get("reasoning_depth"),
+                "distractors_present": obj.get("distractors_present", False),
+                "perspective": obj.get("perspective", "third"),
+                "is_forking": False
+            })
+        except (KeyError, IndexError) as e:
+            debug(f"Warning: Error processing item: {e}, {obj}")
+            continue
+            
+    if len(rows) < len(items):
+        PARSE_FAILURES.inc(len(items) - len(rows), model=model, mode="traditional", kind="invalid_item")
+    return rows
+
+async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1,
+                                     on_rows: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                     should_stop: Optional[Callable[[], bool]] = None,
+                                     cells: Optional[List[Tuple[str, str, int]]] = None):
+    """
+    Generate a batch of traditional prompts (with single/dual placeholders at the end).
+    With `on_rows` the completion is streamed and rows are passed to on_rows
+    as soon as they are parsed; `should_stop` can cancel the stream early.
+    `cells` are the items' assigned (perspective, complexity, reasoning_depth).
+    """
+    client = CLIENTS.get(model)
+    request = build_traditional_request(cat, cfg, n, BATCH_TUNER.max_tokens(cat, model, "traditional", n), cells,
+                                        category_rng(cat))
+
+    for attempt in range(max_retries):
+        if attempt:
+            RETRIES.inc(model=model, reason="traditional_batch")
+        started = time.monotonic()
+
+        def _record(usage, finish_reason, items):
+            BATCH_TUNER.record_response(cat, model, "traditional", n, usage, finish_reason, items,
+                                        time.monotonic() - started)
+
+        try:
+            if on_rows is not None:
+                rows = await stream_batch_rows(client, model, request,
+                                               lambda items: parse_traditional_items(cat, model, items), on_rows, should_stop,
+                                               on_response=_record)
+                if rows is None:
+                    PARSE_FAILURES.inc(model=model, mode="traditional", kind="no_items")
+                    print("Warning: No valid items found in streamed response. Retrying...")
+                    continue
                 return rows
-            else:
+
+            resp = await create_chat_completion(client, model, **request)
+            content = resp.choices[0].message.content
+            
+            # Raw content for debugging (truncated to avoid console clutter)
+            debug(f"\nRaw response from {model}:\n" + (content[:500] + "..." if len(content) > 500 else content))
+            
+            items = extract_result_items(content)
+            _record(resp.usage, resp.choices[0].finish_reason, len(items or []))
+            if not items:
+                PARSE_FAILURES.inc(model=model, mode="traditional", kind="no_items")
                 print("Warning: No valid items found in response. Retrying...")
                 continue
+            return parse_traditional_items(cat, model, items)
                 
         except Exception as e:
             print(f"Error during API call (attempt {attempt+1}/{max_retries}): {str(e)}")
@@ -849,14 +1001,16 @@ async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, ma
    
     # Try fallback approach if all attempts fail
     print(f"All attempts failed. Trying fallback approach...")
+    RETRIES.inc(model=model, reason="fallback")
     try:
-        fallback_resp = await client.chat.completions.create(
-            model=model,
+        fallback_resp = await create_chat_completion(
+            client, model,
             temperature=0.9,
             max_tokens=n * 160,
+            **seed_kwargs(),
             messages=[
                 {"role": "system", "content": "You are a creative dataset generator. Format your response in plain text as follows:\n\nPROMPT: [prompt text]\nCORRECT: [correct answer]\nDISTRACTOR: [distractor answer]\nCOMPLEXITY: [low/medium/high]\nREASONING_DEPTH: [1-5]\nDISTRACTORS_PRESENT: [true/false]"},
-                {"role": "user",  "content": user_msg}
+                {"role": "user",  "content": request["messages"][-1]["content"]}
             ],
             # No response_format specified - use text
         )
@@ -902,8 +1056,8 @@ async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, ma
         # Create the row if we have at least prompt + answers
         if prompt and correct and distractor:
             base_time = datetime.now(timezone.utc)
-            return [{
-                "id": str(uuid.uuid4()),
+            rows = [{
+                "id": row_id(cat, prompt, correct, distractor),
                 "category": cat,
                 "model_used": model,
                 "created_utc": base_time.isoformat(),
@@ -916,23 +1070,37 @@ async def generate_traditional_batch(cat: str, cfg: dict, model: str, n: int, ma
                 "perspective": "third",  # Default perspective
                 "is_forking": False
             }]
+            if on_rows is not None:
+                on_rows(rows)
+            return rows
     except Exception as e:
         print(f"Fallback approach failed: {str(e)}")
     
     return []  # Return empty list if all attempts failed
 
-async def generate_forking_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1):
-    """Generate a batch of prompts with multiple placeholders for forking token analysis"""
-    client = AsyncOpenAI(api_key=openai.api_key)
-    
-    # Select some seed examples from forking_format if available
-    if "forking_format" in cfg and cfg["forking_format"]:
+def build_forking_request(cat: str, cfg: dict, n: int, max_tokens: Optional[int] = None,
+                          cells: Optional[List[Tuple[str, str, int]]] = None,
+                          rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """
+    Chat completion arguments (everything but the model) asking for n forking-token
+    prompts; max_tokens defaults to a fixed per-item guess. `cells` assigns each
+    prompt its perspective, complexity and reasoning_depth; `rng` (default: the
+    category's) samples random seed examples
+    """
+    rng = rng or category_rng(cat)
+    # Select some seed examples from forking_format (and accepted forking rows) if available
+    if DIVERSE_SEEDS and SEED_SELECTOR.has(cat, "forking"):
+        examples = SEED_SELECTOR.select(cat, "forking", FORKING_SEED_EXAMPLES)
+        seeds = [example["prompt"] for example in examples]
+        placeholder_pairs_examples = [example["placeholder_pairs"] for example in examples]
+        forking_indices_examples = [example["forking_indices"] for example in examples]
+    elif "forking_format" in cfg and cfg["forking_format"]:
         seeds = cfg["forking_format"]
         placeholder_pairs_examples = cfg.get("forking_placeholder_pairs", [])
         forking_indices_examples = cfg.get("forking_indices", [])
     else:
         # Fall back to regular format if no forking examples
-        seeds = random.sample(cfg["prompt_format"], k=min(2, len(cfg["prompt_format"])))
+        seeds = rng.sample(cfg["prompt_format"], k=min(2, len(cfg["prompt_format"])))
         placeholder_pairs_examples = []
         forking_indices_examples = []
     
@@ -1039,144 +1207,163 @@ async def generate_forking_batch(cat: str, cfg: dict, model: str, n: int, max_re
             "2. The forking_index: Which placeholder (0-indexed) is the critical decision point\n\n"
             "Return results as a valid JSON object."
         )
+    if cells:
+        user_msg += "\n\n" + format_assignment(cells)
 
-    for attempt in range(max_retries):
+    return {
+        "temperature": 0.8,  # Slightly lower temperature for more consistent results
+        "max_tokens": max_tokens or max(n * 250, 2048),  # More tokens for more complex responses
+        "messages": [
+            {"role": "system", "content": FORKING_SYSTEM_MSG},
+            {"role": "user", "content": user_msg}
+        ],
+        "response_format": {"type": "json_object"},
+        **seed_kwargs(),
+    }
+
+def valid_placeholder_pair(pair: Any) -> bool:
+    """A placeholder's options: a list of at least two strings or numbers"""
+    return (isinstance(pair, list) and len(pair) >= 2
+            and all(isinstance(option, (str, int, float)) and not isinstance(option, bool) for option in pair))
+
+def parse_forking_items(cat: str, model: str, items: List[Any]) -> List[Dict[str, Any]]:
+    """Turns the items of a forking-batch response into rows, fixing or skipping invalid ones"""
+    created_utc = datetime.now(timezone.utc).isoformat()  # one string shared by the batch's rows
+    rows = []
+
+    for obj in items:
         try:
-            resp = await client.chat.completions.create(
-                model=model,
-                temperature=0.8,  # Slightly lower temperature for more consistent results
-                max_tokens=max(n * 250, 2048),  # More tokens for more complex responses
-                messages=[
-                    {"role": "system", "content": FORKING_SYSTEM_MSG},
-                    {"role": "user", "content": user_msg}
-                ],
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content
-            
-            # Print raw content for debugging (truncated to avoid console clutter)
-            print(f"\nRaw forking response from {model}:")
-            print(content[:500] + "..." if len(content) > 500 else content)
-            
-            # Try to extract the JSON object from the response
-            content = content.strip()
-            json_match = re.search(r'(\{[\s\S]*\})', content, re.DOTALL)
-            if not json_match:
-                print("Warning: could not extract JSON from model output; retrying…")
+            # Validate required fields
+            if "prompt" not in obj:
+                debug(f"Warning: Item missing 'prompt' key: {obj}")
                 continue
                 
-            try:
-                content_obj = json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                print("Warning: Failed to parse JSON. Retrying...")
+            prompt = obj["prompt"]
+            placeholder_count = prompt.count("{}")
+            
+            # Check for placeholder_pairs
+            if "placeholder_pairs" not in obj or not isinstance(obj["placeholder_pairs"], list):
+                debug(f"Warning: Item missing or invalid 'placeholder_pairs': {obj}")
                 continue
+                
+            placeholder_pairs = obj["placeholder_pairs"]
             
-            # Extract the results
-            if isinstance(content_obj, list):
-                items = content_obj
-            elif "results" in content_obj:
-                items = content_obj["results"]
-            elif "data" in content_obj:
-                items = content_obj["data"]
-            elif "items" in content_obj:
-                items = content_obj["items"]
-            else:
-                if "prompt" in content_obj:
-                    items = [content_obj]
+            # Check if placeholder count matches the number of pairs
+            if placeholder_count != len(placeholder_pairs):
+                debug(f"Warning: Placeholder count mismatch. Found {placeholder_count} in prompt, but {len(placeholder_pairs)} pairs: {obj}")
+                
+                # Try to fix mismatches for specific categories
+                if cat == "theory_of_mind" and placeholder_count >= 2 and len(placeholder_pairs) >= 2:
+                    # For ToM, ensure we have at least the last two critical placeholders
+                    placeholder_pairs = placeholder_pairs[:placeholder_count]
+                    debug(f"Fixed placeholder pairs for ToM prompt: {placeholder_pairs}")
                 else:
-                    print(f"Warning: Unexpected JSON structure: {list(content_obj.keys())}")
-                    items = []
+                    continue
+                
+            # Check for forking_index
+            forking_index = None
+            if "forking_index" in obj and isinstance(obj["forking_index"], (int, float)):
+                forking_index = int(obj["forking_index"])
+            elif "forking_indices" in obj and isinstance(obj["forking_indices"], list) and obj["forking_indices"]:
+                forking_index = obj["forking_indices"][0] if isinstance(obj["forking_indices"][0], (int, float)) else None
             
-            # Process valid items
-            if items:
-                base_time = datetime.now(timezone.utc)
-                rows = []
-
-                for obj in items:
-                    try:
-                        # Validate required fields
-                        if "prompt" not in obj:
-                            print(f"Warning: Item missing 'prompt' key: {obj}")
-                            continue
-                            
-                        prompt = obj["prompt"]
-                        placeholder_count = prompt.count("{}")
-                        
-                        # Check for placeholder_pairs
-                        if "placeholder_pairs" not in obj or not isinstance(obj["placeholder_pairs"], list):
-                            print(f"Warning: Item missing or invalid 'placeholder_pairs': {obj}")
-                            continue
-                            
-                        placeholder_pairs = obj["placeholder_pairs"]
-                        
-                        # Check if placeholder count matches the number of pairs
-                        if placeholder_count != len(placeholder_pairs):
-                            print(f"Warning: Placeholder count mismatch. Found {placeholder_count} in prompt, but {len(placeholder_pairs)} pairs: {obj}")
-                            
-                            # Try to fix mismatches for specific categories
-                            if cat == "theory_of_mind" and placeholder_count >= 2 and len(placeholder_pairs) >= 2:
-                                # For ToM, ensure we have at least the last two critical placeholders
-                                placeholder_pairs = placeholder_pairs[:placeholder_count]
-                                print(f"Fixed placeholder pairs for ToM prompt: {placeholder_pairs}")
-                            else:
-                                continue
-                            
-                        # Check for forking_index
-                        forking_index = None
-                        if "forking_index" in obj and isinstance(obj["forking_index"], (int, float)):
-                            forking_index = int(obj["forking_index"])
-                        elif "forking_indices" in obj and isinstance(obj["forking_indices"], list) and obj["forking_indices"]:
-                            forking_index = obj["forking_indices"][0] if isinstance(obj["forking_indices"][0], (int, float)) else None
-                        
-                        if forking_index is None or forking_index >= placeholder_count:
-                            # Set a reasonable default based on category
-                            if cat == "theory_of_mind":
-                                forking_index = min(2, placeholder_count - 1)  # Typically observation action
-                            elif cat == "counterfactual":
-                                forking_index = min(1, placeholder_count - 1)  # Typically consequence
-                            else:
-                                forking_index = min(1, placeholder_count - 1)  # Default to second placeholder
-                            print(f"Warning: Invalid forking_index. Using default of {forking_index}.")
-                            
-                        # Validate prompt for category - more lenient for specific categories
-                        _, is_valid, _ = validate_multi_placeholder_prompt(prompt, cat, placeholder_count)
-                        if not is_valid:
-                            print(f"Warning: Invalid multi-placeholder prompt for {cat}: {prompt}")
-                            continue
-                        
-                        # Create row with forking token data
-                        row = {
-                            "id": str(uuid.uuid4()),
-                            "category": cat,
-                            "model_used": model,
-                            "created_utc": base_time.isoformat(),
-                            "prompt": prompt,
-                            "placeholder_pairs": placeholder_pairs,
-                            "forking_indices": [forking_index],
-                            "complexity": obj.get("complexity", "medium"),
-                            "reasoning_depth": obj.get("reasoning_depth", 3),
-                            "perspective": obj.get("perspective", "third"),
-                            "is_forking": True
-                        }
-                        
-                        # For backward compatibility, also set answer_true and answer_false to the last pair
-                        last_pair = placeholder_pairs[-1]
-                        if isinstance(last_pair, list) and len(last_pair) >= 2:
-                            row["answer_true"] = last_pair[0]
-                            row["answer_false"] = last_pair[1]
-                        else:
-                            print(f"Warning: Invalid last placeholder pair: {last_pair}")
-                            continue
-                        
-                        rows.append(row)
-                    except (KeyError, IndexError, TypeError) as e:
-                        print(f"Warning: Error processing forking item: {str(e)}, {obj}")
-                        continue
-                        
+            if forking_index is None or forking_index >= placeholder_count:
+                # Set a reasonable default based on category
+                if cat == "theory_of_mind":
+                    forking_index = min(2, placeholder_count - 1)  # Typically observation action
+                elif cat == "counterfactual":
+                    forking_index = min(1, placeholder_count - 1)  # Typically consequence
+                else:
+                    forking_index = min(1, placeholder_count - 1)  # Default to second placeholder
+                debug(f"Warning: Invalid forking_index. Using default of {forking_index}.")
+                
+            # Validate prompt for category - more lenient for specific categories
+            _, is_valid, _ = validate_multi_placeholder_prompt(prompt, cat, placeholder_count)
+            if not is_valid:
+                debug(f"Warning: Invalid multi-placeholder prompt for {cat}: {prompt}")
+                continue
+            
+            # Every pair must be a list of at least two scalar options
+            if not all(valid_placeholder_pair(pair) for pair in placeholder_pairs):
+                debug(f"Warning: Invalid placeholder pairs: {placeholder_pairs}")
+                continue
+            # Options fill text placeholders; as strings the JSON and Parquet rows agree
+            placeholder_pairs = [[str(option) for option in pair] for pair in placeholder_pairs]
+
+            # For backward compatibility, answer_true and answer_false are the last pair
+            last_pair = placeholder_pairs[-1]
+
+            # Create row with forking token data
+            rows.append({
+                "id": row_id(cat, prompt, last_pair[0], last_pair[1], placeholder_pairs),
+                "category": cat,
+                "model_used": model,
+                "created_utc": created_utc,
+                "prompt": prompt,
+                "placeholder_pairs": placeholder_pairs,
+                "forking_indices": [forking_index],
+                "complexity": obj.get("complexity", "medium"),
+                "reasoning_depth": obj.get("reasoning_depth", 3),
+                "perspective": obj.get("perspective", "third"),
+                "is_forking": True,
+                "answer_true": last_pair[0],
+                "answer_false": last_pair[1],
+            })
+        except (KeyError, IndexError, TypeError) as e:
+            debug(f"Warning: Error processing forking item: {str(e)}, {obj}")
+            continue
+            
+    if len(rows) < len(items):
+        PARSE_FAILURES.inc(len(items) - len(rows), model=model, mode="forking", kind="invalid_item")
+    return rows
+
+async def generate_forking_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1,
+                                 on_rows: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                 should_stop: Optional[Callable[[], bool]] = None,
+                                 cells: Optional[List[Tuple[str, str, int]]] = None):
+    """
+    Generate a batch of prompts with multiple placeholders for forking token analysis.
+    With `on_rows` the completion is streamed and rows are passed to on_rows
+    as soon as they are parsed; `should_stop` can cancel the stream early.
+    `cells` are the items' assigned (perspective, complexity, reasoning_depth).
+    """
+    client = CLIENTS.get(model)
+    request = build_forking_request(cat, cfg, n, BATCH_TUNER.max_tokens(cat, model, "forking", n), cells,
+                                    category_rng(cat))
+
+    for attempt in range(max_retries):
+        if attempt:
+            RETRIES.inc(model=model, reason="forking_batch")
+        started = time.monotonic()
+
+        def _record(usage, finish_reason, items):
+            BATCH_TUNER.record_response(cat, model, "forking", n, usage, finish_reason, items,
+                                        time.monotonic() - started)
+
+        try:
+            if on_rows is not None:
+                rows = await stream_batch_rows(client, model, request,
+                                               lambda items: parse_forking_items(cat, model, items), on_rows, should_stop,
+                                               on_response=_record)
+                if rows is None:
+                    PARSE_FAILURES.inc(model=model, mode="forking", kind="no_items")
+                    print("Warning: No valid items found in streamed response. Retrying...")
+                    continue
                 return rows
-            else:
+
+            resp = await create_chat_completion(client, model, **request)
+            content = resp.choices[0].message.content
+            
+            # Raw content for debugging (truncated to avoid console clutter)
+            debug(f"\nRaw forking response from {model}:\n" + (content[:500] + "..." if len(content) > 500 else content))
+            
+            items = extract_result_items(content)
+            _record(resp.usage, resp.choices[0].finish_reason, len(items or []))
+            if not items:
+                PARSE_FAILURES.inc(model=model, mode="forking", kind="no_items")
                 print("Warning: No valid forking items found in response. Retrying...")
                 continue
+            return parse_forking_items(cat, model, items)
                 
         except Exception as e:
             print(f"Error during API call for forking batch (attempt {attempt+1}/{max_retries}): {str(e)}")
@@ -1188,15 +1375,47 @@ async def generate_forking_batch(cat: str, cfg: dict, model: str, n: int, max_re
     
     return []  # Return empty list if all attempts failed
 
-async def generate_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1):
-    """Generate a mixed batch of traditional and forking prompts based on FORKING_TOKEN_RATIO"""
-    # Determine how many of each type to generate
+def split_batch(n: int) -> Tuple[int, int]:
+    """(traditional, forking) counts for a batch of n rows, per FORKING_TOKEN_RATIO"""
     forking_count = round(n * FORKING_TOKEN_RATIO)
-    traditional_count = n - forking_count
+    return n - forking_count, forking_count
+
+def split_cells(cells: List[Tuple[str, str, int]], traditional_count: int) -> Tuple[List, List]:
+    """A batch's assigned cells dealt evenly between its traditional and forking requests"""
+    n = len(cells)
+    traditional = [cell for i, cell in enumerate(cells) if (i + 1) * traditional_count // n > i * traditional_count // n]
+    forking = [cell for i, cell in enumerate(cells) if (i + 1) * traditional_count // n == i * traditional_count // n]
+    return traditional, forking
+
+def planned_batch_size(cat: str, model: str) -> int:
+    """
+    Rows per generate_batch call for (cat, model): the largest batch whose
+    traditional and forking requests both stay within their tuned sizes
+    """
+    limits = []
+    if FORKING_TOKEN_RATIO < 1:
+        limits.append(BATCH_TUNER.batch_size(cat, model, "traditional") / (1 - FORKING_TOKEN_RATIO))
+    if FORKING_TOKEN_RATIO > 0:
+        limits.append(BATCH_TUNER.batch_size(cat, model, "forking") / FORKING_TOKEN_RATIO)
+    return max(1, math.floor(min(limits) + 1e-9))
+
+async def generate_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1,
+                         on_rows: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                         should_stop: Optional[Callable[[], bool]] = None,
+                         cells: Optional[List[Tuple[str, str, int]]] = None):
+    """
+    Generate a mixed batch of traditional and forking prompts based on FORKING_TOKEN_RATIO.
+    `on_rows` / `should_stop` switch both halves to streaming (see generate_traditional_batch).
+    `cells` (one per row, from STRATA) are shared between the two halves.
+    """
+    # Determine how many of each type to generate
+    traditional_count, forking_count = split_batch(n)
+    traditional_cells, forking_cells = split_cells(cells, traditional_count) if cells else (None, None)
+    stream_args = {"on_rows": on_rows, "should_stop": should_stop}
     
     # Generate both types in parallel
-    traditional_task = generate_traditional_batch(cat, cfg, model, traditional_count, max_retries) if traditional_count > 0 else asyncio.create_task(asyncio.sleep(0, result=[]))
-    forking_task = generate_forking_batch(cat, cfg, model, forking_count, max_retries) if forking_count > 0 else asyncio.create_task(asyncio.sleep(0, result=[]))
+    traditional_task = generate_traditional_batch(cat, cfg, model, traditional_count, max_retries, cells=traditional_cells, **stream_args) if traditional_count > 0 else asyncio.create_task(asyncio.sleep(0, result=[]))
+    forking_task = generate_forking_batch(cat, cfg, model, forking_count, max_retries, cells=forking_cells, **stream_args) if forking_count > 0 else asyncio.create_task(asyncio.sleep(0, result=[]))
     
     # Wait for both to complete
     traditional_results, forking_results = await asyncio.gather(traditional_task, forking_task)
@@ -1205,7 +1424,151 @@ async def generate_batch(cat: str, cfg: dict, model: str, n: int, max_retries=1)
     combined_results = traditional_results + forking_results
     return combined_results
 
-async def build_category(cat: str, cfg: dict):
+async def generate_batch_round(cat: str, cfg: dict, planned: List[Tuple[str, int]], round_no: int,
+                               cells: Optional[List[List[Tuple[str, str, int]]]] = None
+                               ) -> List[Tuple[str, int, List[Dict[str, Any]]]]:
+    """
+    Batch API counterpart of generate_batch for a whole generation round.
+    Every planned (model, n) batch becomes a traditional and a forking request
+    in one JSONL batch file per model; the results go through the same parsing
+    as interactive responses. Returns (model, n, rows) per planned batch.
+    Failed requests yield no rows (the next round tops up the deficit).
+    `cells` holds each planned batch's assigned cells, as for generate_batch.
+    """
+    rows_by_slot: List[List[Dict[str, Any]]] = [[] for _ in planned]
+    slots: Dict[str, Tuple[int, str, int]] = {}
+    cache_keys: Dict[str, str] = {}
+    from_cache = set()
+    lines_by_model: Dict[str, List[Dict[str, Any]]] = {}
+    outputs: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    for i, (model, n) in enumerate(planned):
+        traditional_count, forking_count = split_batch(n)
+        traditional_cells, forking_cells = split_cells(cells[i], traditional_count) if cells and cells[i] else (None, None)
+        for kind, count, build, kind_cells in (
+                ("traditional", traditional_count, build_traditional_request, traditional_cells),
+                ("forking", forking_count, build_forking_request, forking_cells)):
+            if count <= 0:
+                continue
+            custom_id = f"{cat}-r{round_no}-{i}-{kind}"
+            request = build(cat, cfg, count, BATCH_TUNER.max_tokens(cat, model, kind, count), kind_cells,
+                            category_rng(cat))
+            slots[custom_id] = (i, kind, count)
+            if RESPONSE_CACHE is not None:
+                cache_keys[custom_id] = RESPONSE_CACHE.key_for(dict(request, model=model))
+                cached = RESPONSE_CACHE.get(cache_keys[custom_id])
+                if cached is not None or RESPONSE_CACHE.offline:
+                    outputs[custom_id] = cached
+                    from_cache.add(custom_id)
+                    continue
+            lines_by_model.setdefault(model, []).append(batch_line(custom_id, model, request))
+
+    async def _submit(model: str, lines: List[Dict[str, Any]]):
+        path = os.path.join(BATCH_DIR, f"{cat}.round{round_no}.{model}.jsonl")
+        write_batch_file(path, lines)
+        results = await BATCH_RUNNER.run(CLIENTS.get(model), path,
+                                         metadata={"category": cat, "round": str(round_no)})
+        for custom_id, body in results.items():
+            if body is not None and custom_id in cache_keys:
+                RESPONSE_CACHE.put(cache_keys[custom_id], body)
+        outputs.update(results)
+
+    await asyncio.gather(*(_submit(model, lines) for model, lines in lines_by_model.items()))
+
+    for custom_id, (i, kind, count) in slots.items():
+        body = outputs.get(custom_id)
+        model = planned[i][0]
+        if body is None:
+            REQUESTS.inc(model=model, outcome="batch_failed")
+            print(f"Warning: batch request {custom_id} returned no completion")
+            continue
+        REQUESTS.inc(model=model, outcome="cached" if custom_id in from_cache else "batch_ok")
+        try:
+            completion = ChatCompletion.model_validate(body)
+            if custom_id not in from_cache:
+                record_usage(model, completion.usage)
+            items = extract_result_items(completion.choices[0].message.content)
+            # Batch jobs have no per-request latency; only usage feeds the tuner
+            BATCH_TUNER.record_response(cat, model, kind, count, completion.usage,
+                                        completion.choices[0].finish_reason, len(items or []))
+            if not items:
+                PARSE_FAILURES.inc(model=model, mode=kind, kind="no_items")
+                print(f"Warning: No valid items found in batch response {custom_id}")
+                continue
+            parse = parse_forking_items if kind == "forking" else parse_traditional_items
+            rows_by_slot[i].extend(parse(cat, model, items))
+        except Exception as e:
+            print(f"Warning: could not process batch response {custom_id}: {e}")
+
+    return [(model, n, rows) for (model, n), rows in zip(planned, rows_by_slot)]
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N), for 0 <= i < N"""
+    match = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"expected i/N with 0 <= i < N, got {value!r}")
+    return int(match.group(1)), int(match.group(2))
+
+def positive_int(value: str) -> int:
+    """argparse type for a count of at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+def shard_share(total: int, shard: Optional[Tuple[int, int]] = None) -> int:
+    """This shard's part of `total`; the parts of shards 0..N-1 add up to `total` exactly"""
+    index, count = shard or SHARD
+    return total // count + (1 if index < total % count else 0)
+
+def shard_seed(seed: int, shard: Tuple[int, int]) -> int:
+    """Seed for one shard of a seeded run (the seed itself when unsharded), so shards send different requests"""
+    index, count = shard
+    if count == 1:
+        return seed
+    digest = hashlib.sha256(f"{seed}/{index}/{count}".encode("ascii")).digest()
+    return int.from_bytes(digest[:6], "big")  # small enough for the API's seed parameter
+
+def load_dataset_rows(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    The generated rows of an existing dataset (a synthetic_prompts_*.json or
+    .parquet file) per category, for --extend. Seed rows are left out, since
+    build_category adds its own.
+    """
+    if path.endswith(".parquet"):
+        rows = table_to_rows(pq.read_table(path))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            dataset = json.load(f)
+        rows = [row for data in dataset.values() for row in data.get("_rows", [])]
+
+    rows_by_category: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        if row.get("model_used") not in SEED_MODELS:
+            rows_by_category.setdefault(row["category"], []).append(row)
+    return rows_by_category
+
+async def build_category(cat: str, cfg: dict,
+                         prior_rows: Optional[List[Dict[str, Any]]] = None,
+                         on_batch: Optional[Callable[[str, str, List[Dict[str, Any]]], None]] = None,
+                         on_rows: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None,
+                         existing_rows: Optional[List[Dict[str, Any]]] = None,
+                         target: Optional[int] = None, min_required: Optional[int] = None):
+    """
+    Builds one category, towards `target` rows (TARGET_PER_CAT) and at least
+    `min_required` (MIN_REQUIRED_PROMPTS). `prior_rows` are generated rows recovered from a run
+    journal; only the remaining per-model deficit is generated on top of them.
+    `existing_rows` are the rows of a dataset being extended (--extend): they
+    are kept and count against the category target before it is split into
+    model and shard quotas.
+    `on_batch(cat, model, rows)` is called as soon as each batch is accepted;
+    `on_rows(cat, rows)` receives every row that ends up in the category
+    (seeds and prior rows included) for the output writers.
+    Returns a callable that builds the category's dataset entry (category_record).
+    """
     # First, preserve the original seed examples and name_pairs
     original_prompts = cfg["prompt_format"].copy()
     original_name_pairs = cfg["name_pairs"].copy()
@@ -1214,19 +1577,20 @@ async def build_category(cat: str, cfg: dict):
     has_forking_examples = "forking_format" in cfg and cfg["forking_format"]
     
     # For original examples, create both traditional and forking rows
-    base_time = datetime.now(timezone.utc)
+    created_utc = datetime.now(timezone.utc).isoformat()
     original_rows = []
     
     # Add traditional original examples
     for i, original_prompt in enumerate(original_prompts):
+        name_pair = original_name_pairs[min(i, len(original_name_pairs) - 1)]
         original_rows.append({
-            "id": str(uuid.uuid4()),
+            "id": row_id(cat, original_prompt, name_pair[0], name_pair[1]),
             "category": cat,
             "model_used": "original_seed",
-            "created_utc": base_time.isoformat(),
+            "created_utc": created_utc,
             "prompt": original_prompt,
-            "answer_true": original_name_pairs[min(i, len(original_name_pairs) - 1)][0],
-            "answer_false": original_name_pairs[min(i, len(original_name_pairs) - 1)][1],
+            "answer_true": name_pair[0],
+            "answer_false": name_pair[1],
             "complexity": "medium",
             "reasoning_depth": 3,
             "distractors_present": False,
@@ -1242,16 +1606,17 @@ async def build_category(cat: str, cfg: dict):
         
         for i, forking_prompt in enumerate(forking_formats):
             if i < len(placeholder_pairs) and i < len(forking_indices):
+                last_pair = placeholder_pairs[i][-1] if placeholder_pairs[i] and placeholder_pairs[i][-1] else ["", ""]
                 original_rows.append({
-                    "id": str(uuid.uuid4()),
+                    "id": row_id(cat, forking_prompt, last_pair[0], last_pair[1], placeholder_pairs[i]),
                     "category": cat,
                     "model_used": "original_seed_forking",
-                    "created_utc": base_time.isoformat(),
+                    "created_utc": created_utc,
                     "prompt": forking_prompt,
                     "placeholder_pairs": placeholder_pairs[i],
                     "forking_indices": forking_indices[i],
-                    "answer_true": placeholder_pairs[i][-1][0] if placeholder_pairs[i] and placeholder_pairs[i][-1] else "",
-                    "answer_false": placeholder_pairs[i][-1][1] if placeholder_pairs[i] and placeholder_pairs[i][-1] else "",
+                    "answer_true": last_pair[0],
+                    "answer_false": last_pair[1],
                     "complexity": "medium",
                     "reasoning_depth": 3,
                     "distractors_present": False,
@@ -1259,87 +1624,254 @@ async def build_category(cat: str, cfg: dict):
                     "is_forking": True
                 })
 
-    # Generate new prompts in parallel - with retry logic for categories that fail to meet minimums
-    max_retries = 1  # Number of additional attempts if we don't meet minimum requirements
-    
-    # Adjust target numbers based on category
-    category_targets = {
-        "theory_of_mind": TARGET_PER_CAT * 1.5,  # Higher target for ToM since it's more challenging
-        "default": TARGET_PER_CAT
+    if DIVERSE_SEEDS:
+        SEED_SELECTOR.register(cat, "traditional", ({"prompt": prompt} for prompt in original_prompts))
+        if has_forking_examples:
+            placeholder_pairs = cfg.get("forking_placeholder_pairs", [])
+            forking_indices = cfg.get("forking_indices", [])
+            SEED_SELECTOR.register(cat, "forking", (
+                {"prompt": prompt,
+                 "placeholder_pairs": placeholder_pairs[i] if i < len(placeholder_pairs) else None,
+                 "forking_indices": forking_indices[i] if i < len(forking_indices) else None}
+                for i, prompt in enumerate(cfg["forking_format"])))
+
+    # Each model owes its share of the category target (at least enough to
+    # reach MIN_REQUIRED_PROMPTS with the seeds), less the rows it already has
+    # in an extended dataset. Rows from models no longer in MODELS reduce the
+    # target before it is shared out. Accepted rows, including those recovered
+    # from the journal on --resume, count against the quota across rounds, so
+    # every round only requests the remaining deficit
+    existing_rows = existing_rows or []
+    target = TARGET_PER_CAT if target is None else target
+    run_minimum = MIN_REQUIRED_PROMPTS if min_required is None else min_required
+    existing_by_model = Counter(row.get("model_used") for row in existing_rows)
+    other_models = sum(count for model, count in existing_by_model.items() if model not in MODELS)
+    category_target = max(target, run_minimum - len(original_rows)) - other_models
+    quotas = {
+        model: shard_share(max(0, round(category_target * share) - existing_by_model[model]))
+        for model, share in MODELS.items()
     }
-    category_target = category_targets.get(cat, category_targets["default"])
-    
-    for retry in range(max_retries + 1):
-        new_prompts = []
-        
-        # Generate prompts based on model weights
-        for model, share in MODELS.items():
-            remain = round(category_target * share)
-            # Increase batch size slightly on retries to get more prompts
-            adjusted_batch = min(BATCH_SIZE * (1 + retry * 0.5), 18)  # Increase batch size by 50% each retry, max 18
-            
-            # For specifically challenging categories, allocate more resources on retry
-            if cat == "theory_of_mind" and retry > 0:
-                # For ToM, we can try using advanced models more if available
-                if "gpt-4.1" in MODELS or "gpt-4o" in MODELS or "gpt-4.5" in MODELS:
-                    # Prioritize using advanced models for ToM retries
-                    if model in ["gpt-4.1", "gpt-4o", "gpt-4.5-preview-2025-02-27"]:
-                        remain = round(category_target * (share + 0.1 * retry))  # Increase share for advanced models
-                
-            # Create tasks for batch generation
-            tasks = []
-            for i in range(0, remain, int(adjusted_batch)):
-                batch_size = min(int(adjusted_batch), remain - i)
-                tasks.append(generate_batch(cat, cfg, model, batch_size))
-            
-            # Execute all tasks
-            for batch in await tqdm_asyncio.gather(*tasks, desc=f"{cat:22} · {model}"):
-                new_prompts.extend(batch)
+    # Every shard keeps the seed and existing rows; merging counts them once
+    min_required = len(original_rows) + len(existing_rows) + shard_share(
+        max(0, run_minimum - len(original_rows) - len(existing_rows)))
+    existing_ids = {row["id"] for row in existing_rows}
+    # Generated rows are held by column until the dataset is written (see row_store.py)
+    new_prompts = RowStore(existing_rows)
+    new_prompts.extend(row for row in prior_rows or [] if row["id"] not in existing_ids)
+    # Cell targets cover the generated rows (kept ones included), not the seeds
+    STRATA.set_target(cat, len(new_prompts) + sum(quotas.values()))
+    STRATA.record(cat, new_prompts)
+    SEED_SELECTOR.stage(cat, new_prompts)
+    if on_rows is not None:
+        on_rows(cat, list(chain(original_rows, new_prompts)))
 
-        # Combine original examples with generated prompts
-        combined_prompts = list(chain(original_rows, new_prompts))
-        
-        # Check if we've met the minimum requirement
-        if len(combined_prompts) >= MIN_REQUIRED_PROMPTS:
-            break
-            
-        # If this was the last retry and we still don't have enough prompts, just continue with what we have
-        if retry == max_retries:
-            print(f"⚠️  Warning: After {max_retries + 1} attempts, category {cat} still has only {len(combined_prompts)} prompts.")
+    # Seed the near-duplicate index with everything the category already has
+    dedup_index = MinHashLSH(threshold=NEAR_DUP_THRESHOLD)
+    for row in chain(original_rows, new_prompts):
+        dedup_index.insert(row["id"], dedup_index.signature(row["prompt"]))
+    near_duplicates = Counter()
+    quality_rejections = Counter()
+
+    def _screen_near_duplicates(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept = []
+        for row in rows:
+            match = dedup_index.check_and_add(row["id"], row["prompt"])
+            if match is None:
+                kept.append(row)
+                continue
+            near_duplicates["forking" if row.get("is_forking") else "traditional"] += 1
+            # A row with the same id has the same content; it is never kept twice
+            if NEAR_DUP_ACTION == "flag" and match[0] != row["id"]:
+                row["near_duplicate_of"] = match[0]
+                row["near_duplicate_similarity"] = round(match[1], 3)
+                kept.append(row)
+            else:
+                ROWS_REJECTED.inc(category=cat, reason="near_duplicate")
+        return kept
+
+    accepted_by_model = new_prompts.model_counts - Counter(row.get("model_used") for row in existing_rows)
+
+    def _accept(model: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Filters, de-duplicates and stores newly generated rows; returns the accepted ones."""
+        rows, rejected = quality_filter.filter_rows(rows)
+        quality_rejections.update(rejected)
+        for reason, count in rejected.items():
+            ROWS_REJECTED.inc(count, category=cat, reason=reason)
+        rows = _screen_near_duplicates(rows)
+        new_prompts.extend(rows)
+        STRATA.record(cat, rows)
+        SEED_SELECTOR.stage(cat, rows)
+        accepted_by_model[model] += len(rows)
+        ROWS_ACCEPTED.inc(len(rows), category=cat, model=model)
+        if on_batch is not None:
+            on_batch(cat, model, rows)
+        if on_rows is not None:
+            on_rows(cat, rows)
+        return rows
+
+    def _by_mode(rows: List[Dict[str, Any]]) -> Counter:
+        return Counter("forking" if r.get("is_forking") else "traditional" for r in rows)
+
+    def _record(model: str, requested: Counter, accepted: Counter):
+        """Feeds requested/accepted counts per mode to the acceptance planner and the batch tuner."""
+        ACCEPTANCE_RATES.record(cat, model, sum(requested.values()), sum(accepted.values()))
+        for mode in ("traditional", "forking"):
+            BATCH_TUNER.record_accepted(cat, model, mode, requested[mode], accepted[mode])
+
+    def _requested(batch_size: int) -> Counter:
+        return Counter(dict(zip(("traditional", "forking"), split_batch(batch_size))))
+
+    async def _generate_and_record(model: str, batch_size: int, cells: Optional[List[Tuple[str, str, int]]],
+                                   previous: Optional[asyncio.Event], done: asyncio.Event):
+        try:
+            if not STREAM_COMPLETIONS:
+                rows = await generate_batch(cat, cfg, model, batch_size, cells=cells)
+                # Batches are accepted in planned order, whatever order they complete in, so
+                # near-duplicate screening keeps the same rows when a run is replayed
+                if previous is not None:
+                    await previous.wait()
+                accepted = _accept(model, rows)
+                _record(model, _requested(batch_size), _by_mode(accepted))
+                return
+            await _stream_and_record(model, batch_size, cells)
+        finally:
+            done.set()
+
+    async def _stream_and_record(model: str, batch_size: int, cells: Optional[List[Tuple[str, str, int]]]):
+
+        # Streaming: rows are accepted as their items close, and the stream is
+        # cancelled once this model's quota is met
+        delivered, accepted = Counter(), Counter()
+
+        def _on_rows(rows: List[Dict[str, Any]]):
+            delivered.update(_by_mode(rows))
+            accepted.update(_by_mode(_accept(model, rows)))
+
+        def _quota_met() -> bool:
+            return accepted_by_model[model] >= quotas[model]
+
+        await generate_batch(cat, cfg, model, batch_size, on_rows=_on_rows, should_stop=_quota_met, cells=cells)
+        # A cancelled stream only asked for the rows it delivered
+        _record(model, delivered if _quota_met() else _requested(batch_size), accepted)
+
+    rounds = 0
+    while rounds < MAX_TOPUP_ROUNDS:
+        # Batch sizes and max_tokens change between rounds, from what the last round observed
+        BATCH_TUNER.update(cat)
+        deficits = {model: quotas[model] - accepted_by_model[model] for model in MODELS}
+
+        # Request enough rows to cover each deficit at the model's acceptance rate
+        planned = [
+            (model, batch_size)
+            for model, deficit in deficits.items()
+            for batch_size in ACCEPTANCE_RATES.plan(cat, model, deficit, planned_batch_size(cat, model))
+        ]
+        if not planned:
             break
-            
-        # Otherwise, try again with a slightly different approach
-        print(f"⚠️  Warning: Category {cat} has only {len(combined_prompts)} prompts, needed {MIN_REQUIRED_PROMPTS}. Retrying...")
+        if rounds:
+            print(f"⚠️  Category {cat} is short of its target, topping up: " +
+                  ", ".join(f"{model} needs {d}" for model, d in deficits.items() if d > 0))
+        rounds += 1
+        # Rows accepted so far are indexed once per round, so all of its requests see the same seeds index
+        SEED_SELECTOR.commit(cat)
+        # Each planned request's items get cells from the category's remaining deficits
+        cells = STRATA.assign(cat, [n for _, n in planned]) if STRATIFY else [None] * len(planned)
 
-    # Calculate statistics for metadata
-    traditional_count = sum(1 for p in combined_prompts if not p.get("is_forking", False))
-    forking_count = sum(1 for p in combined_prompts if p.get("is_forking", False))
-    
-    # Update the name_pairs to include all pairs from both types
-    combined_name_pairs = original_name_pairs + [(r["answer_true"], r["answer_false"]) for r in new_prompts if "answer_true" in r and "answer_false" in r]
+        if BATCH_RUNNER is not None:
+            for model, requested, rows in await generate_batch_round(cat, cfg, planned, rounds, cells):
+                _record(model, _requested(requested), _by_mode(_accept(model, rows)))
+            continue
 
-    if len(combined_prompts) < MIN_REQUIRED_PROMPTS:
-        print(f"⚠️  Warning: Category {cat} has only {len(combined_prompts)} prompts. Minimum required is {MIN_REQUIRED_PROMPTS}.")
+        turns = [asyncio.Event() for _ in planned]
+        # Started as tasks in planned order (tqdm's gather would start them in set order),
+        # so the requests draw seed examples and cache keys in the same order on every run
+        tasks = [asyncio.create_task(_generate_and_record(model, batch_size, batch_cells,
+                                                          turns[i - 1] if i else None, turns[i]))
+                 for i, ((model, batch_size), batch_cells) in enumerate(zip(planned, cells))]
+        await tqdm_asyncio.gather(*tasks, desc=f"{cat:22} · round {rounds}")
+
+    BATCH_TUNER.update(cat)
+    run_metadata = {
+        "generation_rounds": rounds,
+        "acceptance_rates": ACCEPTANCE_RATES.summary(cat),
+        "request_tuning": {key.split("|", 1)[1]: stats for key, stats in BATCH_TUNER.summary().items()
+                           if key.split("|", 1)[0] == cat},
+    }
+    if STRATIFY:
+        run_metadata["strata"] = STRATA.summary(cat)
+    if DIVERSE_SEEDS:
+        run_metadata["seed_examples"] = SEED_SELECTOR.summary(cat)
+    if existing_rows:
+        run_metadata["extended_row_count"] = len(existing_rows)
+    if SHARD[1] > 1:
+        run_metadata["shard"] = f"{SHARD[0]}/{SHARD[1]}"
+        # The whole run's minimum, which merge_shards checks the merged category against
+        run_metadata["run_min_required"] = run_minimum
+    # The dataset entry is built when it is written, one category at a time (see write_dataset_json)
+    return partial(category_record, cat, cfg, original_rows, new_prompts, quality_rejections, near_duplicates,
+                   min_required=min_required, run_metadata=run_metadata)
+
+def category_record(cat: str, cfg: dict, original_rows: List[Dict[str, Any]],
+                    new_prompts: Union[RowStore, List[Dict[str, Any]]],
+                    quality_rejections: Counter, near_duplicates: Counter,
+                    min_required: Optional[int] = None, run_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The dataset entry for one category: its config arrays and metadata rebuilt
+    from the seed rows and the accepted generated rows. The generated rows'
+    arrays and counts come from the RowStore's columns, and `_rows` is a view
+    over the seeds and the store that write_dataset_json writes row by row.
+    Also used by merge_shards.py to rebuild merged categories.
+    """
+    min_required = MIN_REQUIRED_PROMPTS if min_required is None else min_required
+    store = new_prompts if isinstance(new_prompts, RowStore) else RowStore(new_prompts)
+
+    # Split out the traditional and forking formats and the forking arrays,
+    # seed rows first, then the generated rows in the order they were accepted
+    traditional_formats, forking_formats = [], []
+    placeholder_pairs_list, forking_indices_list = [], []
+    for r in original_rows:
+        if r.get("is_forking", False):
+            forking_formats.append(r["prompt"])
+            if "placeholder_pairs" in r:
+                placeholder_pairs_list.append(r["placeholder_pairs"])
+            if "forking_indices" in r:
+                forking_indices_list.append(r["forking_indices"])
+        else:
+            traditional_formats.append(r["prompt"])
+    traditional_count = len(traditional_formats) + store.traditional_count
+    forking_count = len(forking_formats) + store.forking_count
+    forking = [bool(value) for value in store.column("is_forking")]
+    prompts = store.column("prompt")
+    forking_formats.extend(compress(prompts, forking))
+    traditional_formats.extend(compress(prompts, (not f for f in forking)))
+    for key, values in (("placeholder_pairs", placeholder_pairs_list), ("forking_indices", forking_indices_list)):
+        values.extend(compress(store.column(key), map(and_, forking, store.has(key))))
+    # Generated rows add their answers to the category's name pairs
+    combined_name_pairs = list(cfg["name_pairs"])
+    combined_name_pairs.extend(compress(zip(store.column("answer_true"), store.column("answer_false")),
+                                        map(and_, store.has("answer_true"), store.has("answer_false"))))
+    combined_prompts = ChainedRows(original_rows, store)
+
+    if len(combined_prompts) < min_required:
+        print(f"⚠️  Warning: Category {cat} has only {len(combined_prompts)} prompts. Minimum required is {min_required}.")
 
     metadata = {
         "prompt_count": len(combined_prompts),
         "original_count": len(original_rows),
-        "generated_count": len(new_prompts),
+        "generated_count": len(store),
         "traditional_count": traditional_count,
         "forking_count": forking_count,
-        "filtered_out_count": 0,  # No filtering now
-        "meets_minimum_requirement": len(combined_prompts) >= MIN_REQUIRED_PROMPTS,
+        "filtered_out_count": sum(quality_rejections.values())
+                              + (sum(near_duplicates.values()) if NEAR_DUP_ACTION == "reject" else 0),
+        "filtered_out_reasons": dict(quality_rejections.most_common()),
+        "near_duplicate_count": sum(near_duplicates.values()),
+        "near_duplicate_counts": dict(near_duplicates),
+        "near_duplicate_action": NEAR_DUP_ACTION,
+        "meets_minimum_requirement": len(combined_prompts) >= min_required,
+        **(run_metadata or {}),
         "models_used": list(MODELS.keys())
     }
 
-    # Extract both traditional and forking formats for the updated category config
-    traditional_formats = [r["prompt"] for r in combined_prompts if not r.get("is_forking", False)]
-    forking_formats = [r["prompt"] for r in combined_prompts if r.get("is_forking", False)]
-    
-    # Extract placeholder pairs and forking indices for forking prompts
-    placeholder_pairs_list = [r.get("placeholder_pairs", []) for r in combined_prompts if r.get("is_forking", False) and "placeholder_pairs" in r]
-    forking_indices_list = [r.get("forking_indices", []) for r in combined_prompts if r.get("is_forking", False) and "forking_indices" in r]
-
     return {
         "prompt_format": traditional_formats,
         "name_pairs": combined_name_pairs,
@@ -1351,39 +1883,295 @@ async def build_category(cat: str, cfg: dict):
         "metadata": metadata
     }
 
-async def main():
-    dataset = {}
-    categories_below_threshold = []
+def write_dataset_json(path: str, records: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Writes (category, dataset entry) pairs as one JSON object, the same text
+    json.dump(..., indent=2) gives, one entry at a time. A `_rows` view
+    (ChainedRows) is written one row at a time, so at most one row of a
+    RowStore is expanded into a dict at once. Returns each category's metadata.
+    """
+    def dumps(value: Any, indent: str) -> str:
+        # Newlines in strings are escaped, so every newline is indentation
+        return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + indent)
+
+    metadata = {}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for cat, record in records:
+            f.write(f'{"," if metadata else ""}\n  {json.dumps(cat, ensure_ascii=False)}: {{')
+            for i, (key, value) in enumerate(record.items()):
+                f.write(f'{"," if i else ""}\n    {json.dumps(key, ensure_ascii=False)}: ')
+                if not isinstance(value, ChainedRows):
+                    f.write(dumps(value, "    "))
+                    continue
+                f.write("[")
+                for j, row in enumerate(value):
+                    f.write(f'{"," if j else ""}\n      {dumps(row, "      ")}')
+                f.write("\n    ]" if len(value) else "]")
+            f.write("\n  }" if record else "}")
+            metadata[cat] = record["metadata"]
+        f.write("\n}" if metadata else "}")
+    return metadata
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate the synthetic prompt dataset.")
+    parser.add_argument("--resume", metavar="JOURNAL",
+                        help="resume a crashed/interrupted run from its journal file; "
+                             "only the remaining per-category deficit is generated")
+    parser.add_argument("--extend", metavar="DATASET",
+                        help="keep the rows of an existing synthetic_prompts_*.json or .parquet and only "
+                             "generate what each category still needs to reach the target")
+    parser.add_argument("--target-per-category", type=positive_int, metavar="N",
+                        help=f"rows per category to reach (default {TARGET_PER_CAT}); also lowers the "
+                             f"minimum per category ({MIN_REQUIRED_PROMPTS}) to N when N is smaller")
+    parser.add_argument("--cache-dir",
+                        help="cache raw chat completions on disk and replay them on reruns")
+    parser.add_argument("--cache-max-mb", type=int, default=CACHE_MAX_MB,
+                        help=f"size cap for --cache-dir; least-recently-used entries are evicted "
+                             f"(default {CACHE_MAX_MB})")
+    parser.add_argument("--seed", type=int,
+                        help="seed the RNG that picks seed examples and pass it as the API's seed "
+                             "parameter, so a rerun sends the same requests and hits the response cache")
+    parser.add_argument("--offline", action="store_true",
+                        help="replay from --cache-dir only; cache misses fail instead of calling the API")
+    parser.add_argument("--acceptance-rates", default=ACCEPTANCE_RATES_PATH, metavar="PATH",
+                        help="per (category, model) acceptance rates learned by earlier runs; "
+                             f"read at start and updated at the end (default {ACCEPTANCE_RATES_PATH})")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream completions: rows are validated and written as each item "
+                             "arrives, and streams stop early once a model's quota is met")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="submit each generation round as Batch API jobs instead of interactive "
+                             "requests (slower to finish, but not bound by the per-minute limits); "
+                             "with --backend mock a local stand-in processes the batches")
+    parser.add_argument("--batch-poll-seconds", type=float, default=BATCH_POLL_SECONDS,
+                        help=f"how often to poll a submitted batch job (default {BATCH_POLL_SECONDS})")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="I/N",
+                        help="generate shard I of N (0-based): every (category, model) quota is split "
+                             "N ways; combine the shards' .json files with merge_shards.py")
+    parser.add_argument("--no-stratify", action="store_true",
+                        help="do not assign each requested prompt a perspective, complexity and "
+                             "reasoning_depth from the category's under-filled cells")
+    parser.add_argument("--random-seeds", action="store_true",
+                        help="sample each request's seed examples at random from the original seeds "
+                             "instead of picking them for diversity from seeds and accepted rows")
+    parser.add_argument("--debug", action="store_true",
+                        help="print every raw response and per-item parse warning")
+    parser.add_argument("--backend", choices=["openai", "mock"], default="openai",
+                        help="'mock' answers every request in-process (no key, no spend) "
+                             "for throughput testing")
+    mock = parser.add_argument_group("mock backend")
+    mock.add_argument("--mock-latency-ms", type=float, default=MockConfig.latency_ms,
+                      help="median request latency")
+    mock.add_argument("--mock-latency-dist", default=MockConfig.latency_distribution,
+                      choices=["fixed", "uniform", "exponential", "lognormal"])
+    mock.add_argument("--mock-tokens-per-second", type=float, default=MockConfig.tokens_per_second,
+                      help="if >0, completion tokens add to the latency at this rate")
+    mock.add_argument("--mock-429-rate", type=float, default=MockConfig.rate_429)
+    mock.add_argument("--mock-5xx-rate", type=float, default=MockConfig.rate_5xx)
+    mock.add_argument("--mock-truncation-rate", type=float, default=MockConfig.truncation_rate)
+    mock.add_argument("--mock-malformed-rate", type=float, default=MockConfig.malformed_rate)
+    args = parser.parse_args(argv)
+    if args.offline and not args.cache_dir:
+        parser.error("--offline requires --cache-dir")
+    if args.stream and args.batch_api:
+        parser.error("--stream and --batch-api are mutually exclusive")
+    return args
+
+async def main(args: Optional[argparse.Namespace] = None):
+    global RESPONSE_CACHE, ACCEPTANCE_RATES, BATCH_RUNNER, BATCH_DIR, STREAM_COMPLETIONS, BATCH_TUNER, DEBUG, SHARD
+    global API_SEED, RNG_SEED, STRATIFY, STRATA, DIVERSE_SEEDS, SEED_SELECTOR, CLIENTS, RATE_LIMITERS
+    args = args if args is not None else parse_args([])
+    target, min_required = TARGET_PER_CAT, MIN_REQUIRED_PROMPTS
+    if args.target_per_category is not None:
+        target = args.target_per_category
+        # The minimum never exceeds an explicit target, or a small run would be topped up to it
+        min_required = min(min_required, target)
+    METRICS.reset()
+    RESPONSE_CACHE, BATCH_RUNNER, BATCH_DIR = None, None, "."
+    CLIENTS = new_clients()
+    RATE_LIMITERS = new_rate_limiters()
+    DEBUG = args.debug
+    SHARD = args.shard
+    ACCEPTANCE_RATES = AcceptanceTracker(args.acceptance_rates, default_rate=DEFAULT_ACCEPTANCE_RATE)
+    traditional_count, forking_count = split_batch(BATCH_SIZE)
+    BATCH_TUNER = BatchTuner(
+        initial_batch_size={"traditional": max(MIN_REQUEST_ITEMS, traditional_count),
+                            "forking": max(MIN_REQUEST_ITEMS, forking_count)},
+        min_batch_size=MIN_REQUEST_ITEMS, max_batch_size=MAX_REQUEST_ITEMS,
+    )
+    STREAM_COMPLETIONS = args.stream
+    STRATIFY = not args.no_stratify
+    STRATA = StratumScheduler()
+    DIVERSE_SEEDS = not args.random_seeds
+    SEED_SELECTOR = SeedSelector()
+    seed = shard_seed(args.seed, SHARD) if args.seed is not None else None
+    API_SEED = seed
+    RNG_SEED = seed
+    CATEGORY_RNGS.clear()
+    if args.cache_dir:
+        RESPONSE_CACHE = ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 ** 2,
+                                       offline=args.offline)
+
+    if args.backend == "mock":
+        CLIENTS.transport = MockLLMTransport(MockConfig(
+            latency_ms=args.mock_latency_ms,
+            latency_distribution=args.mock_latency_dist,
+            tokens_per_second=args.mock_tokens_per_second,
+            rate_429=args.mock_429_rate,
+            rate_5xx=args.mock_5xx_rate,
+            truncation_rate=args.mock_truncation_rate,
+            malformed_rate=args.mock_malformed_rate,
+            seed=seed,
+        ))
+        CLIENTS.api_key = "mock"
+    elif args.offline:
+        CLIENTS.api_key = CLIENTS.api_key or "offline-replay"  # never sent
+    elif not CLIENTS.api_key:
+        sys.exit("OPENAI_API_KEY is not set (use --backend mock to run without the API)")
+    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Output files are <run_name>.json, .parquet, .journal.jsonl, ...
+    run_name = f"synthetic_prompts_{ts}" + (f".shard{SHARD[0]}of{SHARD[1]}" if SHARD[1] > 1 else "")
+
+    if args.batch_api:
+        BATCH_RUNNER = (LocalBatchRunner(max_concurrency=MAX_CONCURRENCY) if args.backend == "mock"
+                        else OpenAIBatchRunner(poll_interval=args.batch_poll_seconds))
+        BATCH_DIR = f"{run_name}.batches"
+        os.makedirs(BATCH_DIR, exist_ok=True)
 
-    for cat, cfg in CATEGORIES.items():
-        dataset[cat] = await build_category(cat, cfg)
+    # Every accepted batch is appended (and fsync'd) to the journal before the
+    # final dataset is written; --resume appends to the journal it resumes from
+    journal_path = args.resume or f"{run_name}.journal.jsonl"
+    prior_rows = {}
+    if args.resume:
+        prior_rows = load_journal(journal_path)
+        print(f"Resuming from {journal_path}: " +
+              ", ".join(f"{cat}={len(rows)}" for cat, rows in prior_rows.items()))
+    journal = RunJournal(journal_path)
+    parquet_writer = StreamingParquetWriter(f"{run_name}.parquet", flush_rows=PARQUET_FLUSH_ROWS)
 
+    # --extend keeps an earlier dataset's rows and only generates the rest of
+    # the target; the output is one dataset holding both
+    existing_rows = {}
+    if args.extend:
+        existing_rows = load_dataset_rows(args.extend)
+        print(f"Extending {args.extend}: " +
+              ", ".join(f"{cat}={len(existing_rows.get(cat, []))}" for cat in CATEGORIES))
+        unknown = sorted(set(existing_rows) - set(CATEGORIES))
+        if unknown:
+            print(f"Warning: {args.extend} has categories not in CATEGORIES, left out: {unknown}")
+
+    try:
+        return await run_generation(run_name, journal, parquet_writer, prior_rows, existing_rows,
+                                    target=target, min_required=min_required)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(f"\n⚠️  Interrupted. {journal.rows_written} new rows are safe in {journal_path}; "
+              f"rerun with --resume {journal_path} to continue.")
+        raise
+    finally:
+        journal.close()
+        parquet_writer.close()
+        ACCEPTANCE_RATES.save()
+        print(f"Parquet: {parquet_writer.rows_written} rows in {parquet_writer.row_groups} row groups "
+              f"-> {parquet_writer.path}")
+        if SALVAGE_STATS:
+            print(f"\nSalvaged {SALVAGE_STATS['items']} items from {SALVAGE_STATS['responses']} "
+                  f"truncated/malformed responses")
+        if RESPONSE_CACHE is not None:
+            print(f"\nResponse cache: {RESPONSE_CACHE.summary()}")
+        print("\n=== Connection Reuse ===")
+        for endpoint, stats in CLIENTS.stats().items():
+            print(f"{endpoint:28}: {stats}")
+        if isinstance(CLIENTS.transport, MockLLMTransport):
+            print(f"Mock backend: {CLIENTS.transport.stats}")
+        write_run_metrics(run_name)
+        await CLIENTS.aclose()
+
+def write_run_metrics(prefix: str):
+    """Writes <prefix>.metrics.prom and the <prefix>.summary.json run summary, and prints latencies."""
+    elapsed = max(METRICS.elapsed(), 1e-9)
+    throughput = {
+        model: {
+            "prompt_tokens_per_s": round(PROMPT_TOKENS.total(model=model) / elapsed, 1),
+            "completion_tokens_per_s": round(COMPLETION_TOKENS.total(model=model) / elapsed, 1),
+        }
+        for model in MODELS
+    }
+    METRICS.write_prometheus(f"{prefix}.metrics.prom")
+    METRICS.write_summary(f"{prefix}.summary.json", extra={
+        "token_throughput": throughput,
+        "rows_accepted": ROWS_ACCEPTED.total(),
+        "rows_rejected": ROWS_REJECTED.total(),
+        "acceptance_rates": ACCEPTANCE_RATES.summary(),
+        "request_tuning": BATCH_TUNER.summary(),
+        "rate_limiters": RATE_LIMITERS.summary(),
+        "salvaged": dict(SALVAGE_STATS),
+        "response_cache": RESPONSE_CACHE.summary() if RESPONSE_CACHE is not None else None,
+    })
+
+    print("\n=== Request Latency ===")
+    for series, stats in REQUEST_LATENCY.summary().items():
+        print(f"{series:50}: {stats}")
+    for model, stats in throughput.items():
+        print(f"{model:28}: {stats}")
+    print(f"Metrics: {prefix}.metrics.prom, run summary: {prefix}.summary.json")
+
+async def run_generation(run_name: str, journal: RunJournal, parquet_writer: StreamingParquetWriter,
+                         prior_rows: Dict[str, List[Dict[str, Any]]],
+                         existing_rows: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                         target: Optional[int] = None, min_required: Optional[int] = None):
+    """
+    Builds every category and writes {run_name}.json. Returns each category's
+    metadata; the rows themselves are in the Parquet file and the JSON.
+    """
+    categories_below_threshold = []
+
+    # Build every category at once; the shared per-model rate limiters
+    # decide how many requests are actually in flight
+    builders = await asyncio.gather(*(
+        build_category(cat, cfg, prior_rows=prior_rows.get(cat),
+                       on_batch=journal.append, on_rows=parquet_writer.write,
+                       existing_rows=(existing_rows or {}).get(cat), target=target, min_required=min_required)
+        for cat, cfg in CATEGORIES.items()
+    ))
+    dataset = write_dataset_json(f"{run_name}.json", ((cat, build()) for cat, build in zip(CATEGORIES, builders)))
+    print(f"✅  Wrote {run_name}.json with all metadata attached")
+    for cat, metadata in dataset.items():
         # Track categories that don't meet requirements
-        if dataset[cat]["metadata"]["prompt_count"] < MIN_REQUIRED_PROMPTS:
-            categories_below_threshold.append((cat, dataset[cat]["metadata"]["prompt_count"]))
+        if not metadata["meets_minimum_requirement"]:
+            categories_below_threshold.append((cat, metadata["prompt_count"]))
 
     # Final validation summary
+    min_required = MIN_REQUIRED_PROMPTS if min_required is None else min_required
+    minimum = f"{min_required}" if SHARD[1] == 1 else f"this shard's share of {min_required}"
     if categories_below_threshold:
-        print(f"\n⚠️  Categories with fewer than {MIN_REQUIRED_PROMPTS} prompts:")
+        print(f"\n⚠️  Categories with fewer than {minimum} prompts:")
         for cat, count in categories_below_threshold:
             print(f"   - {cat}: {count} prompts")
         print("This may affect the reliability of the MI analysis across contexts.\n")
     else:
-        print(f"\n✅  All categories have at least {MIN_REQUIRED_PROMPTS} prompts as required.\n")
+        print(f"\n✅  All categories have at least {minimum} prompts as required.\n")
+
+    print("\n=== Acceptance Rates ===")
+    for key, stats in ACCEPTANCE_RATES.summary().items():
+        print(f"{key:50}: {stats}")
+
+    print("\n=== Request Tuning ===")
+    for key, stats in BATCH_TUNER.summary().items():
+        print(f"{key:50}: {stats}")
+
+    print("\n=== Rate Limiter Summary ===")
+    for model, stats in RATE_LIMITERS.summary().items():
+        print(f"{model:28}: {stats}")
+
 
-    # ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    with open(f"synthetic_prompts_{ts}.json", "w", encoding="utf-8") as f:
-        json.dump(dataset, f, indent=2, ensure_ascii=False)
-    print("✅  Wrote synthetic_prompts_*.json with all metadata attached")
-    
     # Print forking token stats
     print("\n=== Forking Token Statistics ===")
     total_prompts = 0
     total_forking = 0
-    for cat, data in dataset.items():
-        forking_count = data["metadata"].get("forking_count", 0)
-        total_count = data["metadata"]["prompt_count"]
+    for cat, metadata in dataset.items():
+        forking_count = metadata.get("forking_count", 0)
+        total_count = metadata["prompt_count"]
         forking_percentage = (forking_count / total_count * 100) if total_count > 0 else 0
         print(f"{cat:25}: {forking_count}/{total_count} prompts are forking token format ({forking_percentage:.1f}%)")
         total_prompts += total_count
@@ -1392,8 +2180,13 @@ async def main():
     overall_percentage = (total_forking / total_prompts * 100) if total_prompts > 0 else 0
     print(f"\nOverall: {total_forking}/{total_prompts} prompts are forking token format ({overall_percentage:.1f}%)")
 
+    return dataset
+
 
 if __name__ == "__main__":
     if os.name == "nt":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(main())
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,118 @@
+"""
+Tolerant, incremental extraction of the items array from a JSON response.
+
+Responses cut off at max_tokens end in unclosed JSON, so json.loads rejects
+the whole batch even though most of its `results` items were complete.
+ItemStreamParser scans the text (fed all at once or chunk by chunk as it
+streams in), finds the items array and returns each element as soon as it
+closes. Only a trailing partial element is lost.
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+
+# Start of the items array: the value of a "results"/"data"/"items" key, or a bare top-level array
+_ARRAY_START = re.compile(r'"(?:results|data|items)"\s*:\s*\[|\A\s*\[')
+_STRUCTURAL = re.compile(r'[\\"{}\[\],]')
+
+
+class ItemStreamParser:
+    """
+    Incremental parser for the elements of a JSON items array.
+
+    feed() returns the elements completed by the new text. `done` is set once
+    the array's closing bracket has been seen. `invalid` counts elements that
+    closed but were not valid JSON.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0            # next character to scan
+        self._started = False    # inside the items array
+        self._depth = 0          # nesting below the array's element level
+        self._in_string = False
+        self._item_start: Optional[int] = None
+        self.done = False
+        self.items = 0
+        self.invalid = 0
+
+    def feed(self, text: str) -> List[Any]:
+        if self.done or not text:
+            return []
+        self._buffer += text
+        if not self._started:
+            match = _ARRAY_START.search(self._buffer)
+            if match is None:
+                return []
+            self._started = True
+            self._pos = self._item_start = match.end()
+        return self._scan()
+
+    def _emit(self, end: int, out: List[Any]):
+        segment = self._buffer[self._item_start:end].strip()
+        self._item_start = None
+        if not segment:
+            return
+        try:
+            out.append(json.loads(segment))
+            self.items += 1
+        except json.JSONDecodeError:
+            self.invalid += 1
+
+    def _scan(self) -> List[Any]:
+        out: List[Any] = []
+        buffer = self._buffer
+        pos = self._pos
+        while True:
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = buffer[i]
+            if self._in_string:
+                if char == "\\":
+                    if i + 1 >= len(buffer):
+                        break  # the escaped character has not arrived yet
+                    pos = i + 2
+                    continue
+                if char == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        self._emit(i + 1, out)
+                pos = i + 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    # Closing bracket of the items array itself
+                    if self._item_start is not None:
+                        self._emit(i, out)
+                    self.done = True
+                    pos = i + 1
+                    break
+                if self._depth == 0:
+                    self._emit(i + 1, out)
+            elif char == "," and self._depth == 0:
+                if self._item_start is not None:
+                    self._emit(i, out)  # a bare number/true/false/null element
+                self._item_start = i + 1
+            pos = i + 1
+        self._pos = pos
+        return out
+
+
+def salvage_items(content: str) -> Tuple[List[Any], bool]:
+    """
+    Every complete element of the response's items array, and whether the
+    array itself was closed (False means the response was cut off).
+    """
+    parser = ItemStreamParser()
+    items = parser.feed(content)
+    return items, parser.done
@@ -0,0 +1,221 @@
+"""
+Deterministic merge of `generate_prompts.py --shard i/N` outputs.
+
+Every shard's dataset JSON holds its slice of each category plus the seed
+rows. The merge keeps the seed rows once and takes generated rows in shard
+order. It drops rows whose ID or prompt text was already taken, and
+near-duplicates across shards. Each category's config arrays and metadata
+are then rebuilt with generate_prompts.category_record(), so the result has
+the same structure main() writes for an unsharded run. The same inputs
+always give the same output.
+
+    python scripts/merge_shards.py synthetic_prompts_merged.json \
+        synthetic_prompts_*.shard*of4.json --parquet synthetic_prompts_merged.parquet
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import generate_prompts
+from dataset_schema import MIN_REQUIRED_PROMPTS, SEED_MODELS
+from near_dedup import MinHashLSH
+from parquet_writer import StreamingParquetWriter
+
+
+def load_shard(path: str) -> Tuple[Optional[Tuple[int, int]], Dict[str, Any]]:
+    """A shard's dataset and its (index, count), read from its categories' metadata."""
+    with open(path, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    if not isinstance(dataset, dict) or not all(
+            isinstance(data, dict) and "metadata" in data and "_rows" in data for data in dataset.values()):
+        raise ValueError(f"{path} is not a dataset file")
+    shards = {data.get("metadata", {}).get("shard") for data in dataset.values()}
+    if len(shards) != 1:
+        raise ValueError(f"{path}: categories disagree about their shard ({sorted(map(str, shards))})")
+    shard = shards.pop()
+    return (generate_prompts.parse_shard(shard) if shard else None), dataset
+
+
+def order_shards(paths: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Loads the inputs sorted by shard index; rejects mixed shard counts and repeated shards."""
+    loaded = []
+    for path in paths:
+        shard, dataset = load_shard(path)
+        loaded.append((shard or (0, 1), path, dataset))
+    counts = {shard[1] for shard, _, _ in loaded}
+    if len(counts) > 1:
+        raise ValueError(f"Inputs come from runs split different ways: N = {sorted(counts)}")
+    indices = Counter(shard[0] for shard, _, _ in loaded)
+    repeated = sorted(index for index, n in indices.items() if n > 1)
+    if repeated:
+        raise ValueError(f"Shard(s) {repeated} given more than once")
+    missing = sorted(set(range(counts.pop())) - set(indices))
+    if missing:
+        print(f"⚠️  Warning: shard(s) {missing} missing; their share of every category is not in the merge")
+    loaded.sort(key=lambda entry: entry[0])
+    return [(path, dataset) for _, path, dataset in loaded]
+
+
+def merge_acceptance_rates(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    totals: Dict[str, List[int]] = {}
+    for entry in entries:
+        for model, stats in entry.get("metadata", {}).get("acceptance_rates", {}).items():
+            requested, accepted = totals.setdefault(model, [0, 0])
+            totals[model] = [requested + stats.get("requested", 0), accepted + stats.get("accepted", 0)]
+    return {
+        model: {"requested": requested, "accepted": accepted,
+                "rate": round(accepted / requested, 3) if requested else None}
+        for model, (requested, accepted) in totals.items()
+    }
+
+
+def merge_strata(entries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Sums the shards' StratumScheduler summaries. Each shard's targets are its
+    share of the category's, so targets, fills and shortfalls add up.
+    cells_full is left out: the summaries do not say which cells were full.
+    """
+    summaries = [entry["metadata"]["strata"] for entry in entries if "strata" in entry["metadata"]]
+    if not summaries:
+        return None
+    merged: Dict[str, Any] = {"cells": summaries[0]["cells"]}
+    for summary in summaries:
+        for key, value in summary.items():
+            if key in ("cells", "cells_full"):
+                continue
+            if isinstance(value, dict):
+                margin = merged.setdefault(key, {})
+                for level, counts in value.items():
+                    entry = margin.setdefault(level, {"target": 0, "filled": 0})
+                    entry["target"] += counts["target"]
+                    entry["filled"] += counts["filled"]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def per_shard(entries: List[Dict[str, Any]], key: str) -> Optional[Dict[str, Any]]:
+    """A metadata entry that is per-shard state (batch tuning, seed rotation), kept under each shard's "i/N"."""
+    carried = {entry["metadata"].get("shard") or "0/1": entry["metadata"][key]
+               for entry in entries if key in entry["metadata"]}
+    return carried or None
+
+
+def merge_category(cat: str, entries: List[Dict[str, Any]], shard_names: List[str],
+                   near_dup_threshold: float, min_required: int) -> Dict[str, Any]:
+    """One category merged from its entries in every shard (in shard order)."""
+    seed_rows = [row for row in entries[0]["_rows"] if row.get("model_used") in SEED_MODELS]
+    dedup_index = MinHashLSH(threshold=near_dup_threshold)
+    for row in seed_rows:
+        dedup_index.insert(row["id"], dedup_index.signature(row["prompt"]))
+    seen_ids = {row["id"] for row in seed_rows}
+    seen_prompts = {row["prompt"] for row in seed_rows}
+
+    quality_rejections, near_duplicates = Counter(), Counter()
+    for entry in entries:
+        quality_rejections.update(entry["metadata"].get("filtered_out_reasons", {}))
+        near_duplicates.update(entry["metadata"].get("near_duplicate_counts", {}))
+
+    generated, exact_duplicates = [], 0
+    for entry in entries:
+        for row in entry["_rows"]:
+            if row.get("model_used") in SEED_MODELS:
+                continue
+            if row["id"] in seen_ids or row["prompt"] in seen_prompts:
+                exact_duplicates += 1
+                continue
+            seen_ids.add(row["id"])
+            seen_prompts.add(row["prompt"])
+            # Shards screened their own rows; this catches near-duplicates across shards
+            match = dedup_index.check_and_add(row["id"], row["prompt"])
+            if match is not None and "near_duplicate_of" not in row:
+                near_duplicates["forking" if row.get("is_forking") else "traditional"] += 1
+                if generate_prompts.NEAR_DUP_ACTION != "flag":
+                    continue
+                row = dict(row, near_duplicate_of=match[0], near_duplicate_similarity=round(match[1], 3))
+            generated.append(row)
+
+    run_metadata = {
+        "generation_rounds": max(entry["metadata"].get("generation_rounds", 0) for entry in entries),
+        "acceptance_rates": merge_acceptance_rates(entries),
+        "request_tuning": per_shard(entries, "request_tuning"),
+        "strata": merge_strata(entries),
+        "seed_examples": per_shard(entries, "seed_examples"),
+        "merged_shards": shard_names,
+        "merge_exact_duplicates": exact_duplicates,
+    }
+    cfg = generate_prompts.CATEGORIES.get(cat) or {"name_pairs": [], "description": entries[0]["description"]}
+    return generate_prompts.category_record(
+        cat, cfg, seed_rows, generated, quality_rejections, near_duplicates, min_required=min_required,
+        run_metadata={key: value for key, value in run_metadata.items() if value is not None})
+
+
+def run_min_required(shards: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """The minimum per category the shards were generated for (MIN_REQUIRED_PROMPTS if they do not say)."""
+    minimums = {data["metadata"].get("run_min_required") for _, dataset in shards for data in dataset.values()}
+    minimums.discard(None)
+    if len(minimums) > 1:
+        raise ValueError(f"Shards were generated with different minimums per category: {sorted(minimums)}")
+    return minimums.pop() if minimums else MIN_REQUIRED_PROMPTS
+
+
+def merge_shards(paths: List[str], near_dup_threshold: float = generate_prompts.NEAR_DUP_THRESHOLD,
+                 min_required: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Merges the shard files. `min_required` defaults to the minimum the shards
+    were generated for (see --target-per-category).
+    """
+    shards = order_shards(paths)
+    if min_required is None:
+        min_required = run_min_required(shards)
+    shard_names = [
+        next(iter(dataset.values()), {}).get("metadata", {}).get("shard") or path
+        for path, dataset in shards
+    ]
+    # Categories in CATEGORIES order, then any others in the order they are first seen
+    categories = [cat for cat in generate_prompts.CATEGORIES if any(cat in ds for _, ds in shards)]
+    for _, dataset in shards:
+        categories.extend(cat for cat in dataset if cat not in categories)
+
+    return {
+        cat: merge_category(cat, [dataset[cat] for _, dataset in shards if cat in dataset],
+                            shard_names, near_dup_threshold, min_required)
+        for cat in categories
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="merged dataset JSON to write")
+    parser.add_argument("shards", nargs="+", help="the shards' synthetic_prompts_*.shard<i>of<N>.json files")
+    parser.add_argument("--parquet", help="also write the merged rows to this Parquet file")
+    parser.add_argument("--near-dup-threshold", type=float, default=generate_prompts.NEAR_DUP_THRESHOLD)
+    parser.add_argument("--min-required", type=int,
+                        help="prompts per category for meets_minimum_requirement (default: the minimum "
+                             f"the shards were generated for, or {MIN_REQUIRED_PROMPTS})")
+    args = parser.parse_args(argv)
+
+    try:
+        dataset = merge_shards(args.shards, args.near_dup_threshold, args.min_required)
+    except ValueError as e:
+        sys.exit(f"merge_shards: {e}")
+
+    generate_prompts.write_dataset_json(args.output, dataset.items())
+    if args.parquet:
+        writer = StreamingParquetWriter(args.parquet)
+        for cat, data in dataset.items():
+            writer.write(cat, data["_rows"])
+        writer.close()
+
+    for cat, data in dataset.items():
+        meta = data["metadata"]
+        print(f"{cat:28}: {meta['prompt_count']} prompts ({meta['generated_count']} generated, "
+              f"{meta['merge_exact_duplicates']} exact duplicates dropped)")
+    print(f"✅  Merged {len(args.shards)} shards into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
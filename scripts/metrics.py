@@ -0,0 +1,192 @@
+"""
+In-process metrics for a generation run.
+
+Counters and histograms are registered once with a name, help text and
+(for histograms) bucket bounds, and are updated with keyword labels, e.g.
+`REQUEST_LATENCY.observe(0.8, model="gpt-4.1")`. At the end of a run the
+registry is written out twice: in the Prometheus text exposition format
+(for node_exporter's textfile collector or a pushgateway) and as a JSON
+summary with per-series totals, latency quantiles and token throughput.
+"""
+
+import bisect
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _summary_key(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key) or "total"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def clear(self):
+        self._values.clear()
+
+    def total(self, **labels) -> float:
+        """Sum over every series whose labels include `labels`."""
+        wanted = set(_label_key(labels))
+        return sum(value for key, value in self._values.items() if wanted <= set(key))
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+    def summary(self) -> Dict[str, float]:
+        return {_summary_key(key): value for key, value in sorted(self._values.items())}
+
+
+class Histogram:
+    """Bucketed observations per label set, with Prometheus cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        if key not in self._series:
+            self._series[key] = ([0] * (len(self.buckets) + 1), [0, 0.0])
+        counts, totals = self._series[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += 1
+        totals[1] += value
+
+    def clear(self):
+        self._series.clear()
+
+    def quantile(self, q: float, key: LabelKey) -> Optional[float]:
+        """Estimated like PromQL's histogram_quantile: linear within the bucket."""
+        counts, (count, _) = self._series[key]
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower  # beyond the largest bound
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, (count, total)) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for key, (_, (count, total)) in sorted(self._series.items()):
+            out[_summary_key(key)] = {
+                "count": count,
+                "mean": round(total / count, 4) if count else None,
+                "p50": round(self.quantile(0.5, key), 4) if count else None,
+                "p95": round(self.quantile(0.95, key), 4) if count else None,
+            }
+        return out
+
+
+class MetricsRegistry:
+    """Named counters and histograms, rendered together at the end of a run."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self.started = time.monotonic()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        """Clears every series and restarts the run clock (metrics stay registered)."""
+        for metric in self._metrics.values():
+            metric.clear()
+        self.started = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        return {name: metric.summary() for name, metric in self._metrics.items()}
+
+    def write_prometheus(self, path: str):
+        _write_atomic(path, self.render_prometheus())
+
+    def write_summary(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """JSON run summary: wall-clock time, every metric, and any `extra` sections."""
+        payload = {"wall_clock_s": round(self.elapsed(), 3), "metrics": self.summary()}
+        payload.update(extra or {})
+        _write_atomic(path, json.dumps(payload, indent=2, default=str))
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
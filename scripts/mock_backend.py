@@ -0,0 +1,424 @@
+"""
+Offline, OpenAI-compatible stand-in for the chat and legacy completions APIs.
+
+MockLLMTransport is an httpx transport that answers /chat/completions
+in-process, so the real AsyncOpenAI client, the rate limiter and the
+parsing/validation paths all run unchanged without a key or any spend.
+It returns well-formed `results` JSON for SYSTEM_MSG and FORKING_SYSTEM_MSG
+style requests (and PROMPT:/CORRECT: text for the fallback path), with
+configurable latency, 429 and 5xx rates, truncation and malformed JSON.
+Items follow the per-item attributes a request assigns (perspective,
+complexity, reasoning_depth) with a configurable compliance rate.
+Requests with stream=True are answered as server-sent event chunks.
+/completions answers echo/logprobs scoring requests: every prompt is split
+into word tokens whose logprobs are a fixed function of the token and the
+one before it, so the same text always scores the same.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+
+@dataclass
+class MockConfig:
+    """Latency and fault-injection knobs for the mock backend."""
+    latency_ms: float = 800.0            # median request latency
+    latency_distribution: str = "lognormal"  # fixed | uniform | exponential | lognormal
+    latency_spread: float = 0.5          # sigma (lognormal) or +/- fraction (uniform)
+    tokens_per_second: float = 0.0       # >0 adds completion_tokens / tps to the latency
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    truncation_rate: float = 0.0         # cut the content and report finish_reason="length"
+    malformed_rate: float = 0.0          # return syntactically broken JSON
+    attribute_compliance: float = 0.9    # chance an item follows its requested attributes
+    rpm_limit: int = 10_000              # reported in the x-ratelimit-* headers
+    tpm_limit: int = 10_000_000
+    seed: Optional[int] = None
+
+
+NAMES = ["John", "Mark", "Suzie", "Sam", "Emily", "Peter", "Anna", "Ben", "Maya", "Lucas",
+         "Priya", "Omar", "Chen", "Sofia", "Kwame", "Ines", "Tomas", "Leila", "Noah", "Hana"]
+PETS = ["cat", "puppy", "hamster", "parrot", "kitten", "turtle"]
+CONTAINERS = ["box", "basket", "bucket", "bin", "drawer", "shelf", "hamper", "cooler",
+              "suitcase", "crate", "cabinet", "backpack", "tub", "wardrobe"]
+PLACES = ["school", "work", "the store", "the gym", "a meeting", "the library", "the park"]
+SETTINGS = ["library", "train station", "hospital ward", "server room", "farmers market",
+            "airport gate", "newsroom", "chemistry lab", "courtroom", "stadium", "kitchen"]
+ACTORS = ["the research team", "the city council", "the startup", "the hospital board",
+          "the orchestra", "the shipping company", "the school district", "the rescue crew"]
+NOUNS = ["evidence", "promises", "assumptions", "rumors", "memories", "plans", "doubts",
+         "ambitions", "excuses", "deadlines", "alliances", "savings"]
+IMAGES = ["house of cards", "ship without an anchor", "candle in the wind", "castle of sand",
+          "river after a storm", "garden left untended", "bridge made of glass"]
+FILLERS = [
+    "The afternoon had been unusually quiet until then.",
+    "Nobody mentioned the earlier conversation again.",
+    "A faint smell of coffee still hung in the air.",
+    "The schedule had already slipped twice that week.",
+    "Outside, the rain was getting heavier by the minute.",
+    "Most of the staff had gone home early.",
+    "The report from the previous quarter was still on the desk.",
+    "Everyone seemed to have a different version of events.",
+]
+ANSWER_PAIRS = [("drought", "flooding"), ("evacuation", "stampede"), ("exam", "presentation"),
+                ("findings", "details"), ("Tokyo", "Kyoto"), ("carbon", "oxygen"),
+                ("failure", "anomaly"), ("silent", "vibrate"), ("mirrors", "smoke"),
+                ("overview", "figures"), ("tournament", "rehearsal"), ("earthquake", "outage")]
+OPTION_PAIRS = [("hesitates", "hurries"), ("quietly", "loudly"), ("early", "late"),
+                ("agrees", "refuses"), ("calm", "reassure"), ("secured funding", "lost funding"),
+                ("looks around", "asks for help"), ("crowded", "empty"), ("nodded", "frowned")]
+VERBS = ["noticed", "picked up", "rearranged", "ignored", "photographed", "repaired", "counted",
+         "labelled", "hid", "examined", "returned", "borrowed", "cleaned", "wrapped", "weighed"]
+ADJECTIVES = ["dusty", "bright", "broken", "antique", "plastic", "heavy", "tiny", "painted",
+              "borrowed", "rusty", "folded", "glass", "wooden", "striped", "empty"]
+OBJECTS = ["lamp", "ledger", "umbrella", "clipboard", "kettle", "map", "violin", "thermos",
+           "notebook", "ladder", "radio", "camera", "scarf", "toolbox", "globe", "tablet"]
+PERSPECTIVES = ["first", "second", "third"]
+PERSPECTIVE_WEIGHTS = [0.3, 0.2, 0.5]
+STREAM_CHUNK_CHARS = 48   # ~12 tokens per streamed chunk
+COMPLETION_TOKEN = re.compile(r"\s*\S+|\s+")   # mock /completions tokens: a word and its leading space
+ASSIGNMENT_LINE = re.compile(r"^\d+\. perspective: (\w+), complexity: (\w+), reasoning_depth: (\d+)", re.M)
+
+
+class _SSEStream(httpx.AsyncByteStream):
+    """Server-sent events body for a streamed completion; each event waits its delay first."""
+
+    def __init__(self, events: List[Tuple[float, Dict[str, Any]]]):
+        self.events = events
+
+    async def __aiter__(self):
+        for delay, event in self.events:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+
+class MockLLMTransport(httpx.AsyncBaseTransport):
+    """In-process OpenAI-compatible endpoint for throughput testing."""
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_errors": 0,
+                      "truncated": 0, "malformed": 0, "completion_tokens": 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        body = json.loads(await request.aread() or b"{}")
+        path = request.url.path
+
+        if path.endswith("/chat/completions"):
+            return await self._chat_completion(body)
+        if path.endswith("/completions"):
+            return await self._completion(body)
+        return self._error(404, f"mock backend does not implement {path}")
+
+    # ---- responses -------------------------------------------------------
+
+    async def _fault(self) -> Optional[httpx.Response]:
+        """An injected 429 or 5xx response (after its delay), or None to answer normally."""
+        cfg = self.config
+        roll = self.rng.random()
+        if roll < cfg.rate_429:
+            self.stats["rate_limited"] += 1
+            await asyncio.sleep(self._latency(0) * 0.1)
+            return self._error(429, "Rate limit reached (mock)", code="rate_limit_exceeded",
+                               headers={"retry-after-ms": str(int(200 + self.rng.random() * 800))})
+        if roll < cfg.rate_429 + cfg.rate_5xx:
+            self.stats["server_errors"] += 1
+            await asyncio.sleep(self._latency(0))
+            return self._error(self.rng.choice([500, 502, 503]), "The server had an error (mock)")
+        return None
+
+    async def _chat_completion(self, body: Dict[str, Any]) -> httpx.Response:
+        cfg = self.config
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        category = self._category(user)
+        n = self._count(user)
+        assigned = ASSIGNMENT_LINE.findall(user)
+
+        if "PROMPT:" in system:
+            content = self._fallback_text(category)
+        else:
+            forking = "placeholder_pairs" in system
+            items = [self._forking_item(category) if forking else self._traditional_item(category)
+                     for _ in range(n)]
+            for item, (perspective, complexity, depth) in zip(items, assigned):
+                if self.rng.random() < cfg.attribute_compliance:
+                    item.update(perspective=perspective, complexity=complexity, reasoning_depth=int(depth))
+            content = json.dumps({"results": items}, ensure_ascii=False, indent=2)
+
+        # Truncate at random, and always when the content exceeds max_tokens (~4 chars/token)
+        finish_reason = "stop"
+        limit_chars = body["max_tokens"] * 4 if body.get("max_tokens") else len(content)
+        inject_truncation = self.rng.random() < cfg.truncation_rate
+        if inject_truncation or len(content) > limit_chars:
+            keep = min(len(content), limit_chars)
+            if inject_truncation:
+                keep = int(keep * self.rng.uniform(0.5, 0.95))
+            content = content[:keep]
+            finish_reason = "length"
+            self.stats["truncated"] += 1
+        elif self.rng.random() < cfg.malformed_rate:
+            content = self._malform(content)
+            self.stats["malformed"] += 1
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self.stats["ok"] += 1
+        self.stats["completion_tokens"] += completion_tokens
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            stream = _SSEStream(self._stream_events(body, content, finish_reason, usage if include_usage else None))
+            return httpx.Response(200, stream=stream,
+                                  headers=dict(self._rate_headers(), **{"content-type": "text/event-stream"}))
+
+        await asyncio.sleep(self._latency(completion_tokens))
+        payload = {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": finish_reason,
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": usage,
+        }
+        return httpx.Response(200, json=payload, headers=self._rate_headers())
+
+    async def _completion(self, body: Dict[str, Any]) -> httpx.Response:
+        """Legacy completions: echo and logprobs for scoring, plus up to max_tokens generated words."""
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+        prompts = body.get("prompt", "")
+        prompts = [prompts] if isinstance(prompts, str) else list(prompts)
+        echo = bool(body.get("echo"))
+        top = body.get("logprobs")
+        choices, prompt_tokens, completion_tokens = [], 0, 0
+        for index, prompt in enumerate(prompts):
+            generated = "".join(f" {self.rng.choice(OBJECTS)}" for _ in range(body.get("max_tokens") or 0))
+            tokens = COMPLETION_TOKEN.findall(prompt)
+            prompt_tokens += len(tokens)
+            new_tokens = COMPLETION_TOKEN.findall(generated)
+            completion_tokens += len(new_tokens)
+            scored = (tokens if echo else []) + new_tokens
+            offsets, logprobs, position = [], [], 0 if echo else len(prompt)
+            previous = "" if echo else (tokens[-1] if tokens else "")
+            for i, token in enumerate(scored):
+                offsets.append(position)
+                position += len(token)
+                logprobs.append(None if echo and i == 0 else self._token_logprob(previous, token))
+                previous = token
+            choice = {
+                "index": index,
+                "text": (prompt if echo else "") + generated,
+                "finish_reason": "length",
+                "logprobs": None if top is None else {
+                    "tokens": scored,
+                    "token_logprobs": logprobs,
+                    "text_offset": offsets,
+                    "top_logprobs": [None if lp is None else {token: lp} for token, lp in zip(scored, logprobs)]
+                                    if top else None,
+                },
+            }
+            choices.append(choice)
+
+        await asyncio.sleep(self._latency(completion_tokens))
+        self.stats["ok"] += 1
+        self.stats["completion_tokens"] += completion_tokens
+        payload = {
+            "id": f"cmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": choices,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+        return httpx.Response(200, json=payload, headers=self._rate_headers())
+
+    @staticmethod
+    def _token_logprob(previous: str, token: str) -> float:
+        """A fixed logprob in [-8, -0.05) for `token` after `previous`."""
+        h = zlib.crc32(f"{previous.strip()}\x00{token.strip()}".encode("utf-8"))
+        return round(-0.05 - 7.95 * (h / 0xFFFFFFFF), 4)
+
+    def _stream_events(self, body: Dict[str, Any], content: str, finish_reason: str,
+                       usage: Optional[Dict[str, int]]) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        (delay, chunk) pairs for a streamed completion: the first chunk arrives
+        after the base latency, later ones at `tokens_per_second`.
+        """
+        cfg = self.config
+        chunk_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None, **extra) -> Dict[str, Any]:
+            return dict({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }, **extra)
+
+        per_chunk = STREAM_CHUNK_CHARS / 4 / cfg.tokens_per_second if cfg.tokens_per_second > 0 else 0.0
+        events = [(self._latency(0), chunk({"role": "assistant", "content": ""}))]
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            events.append((per_chunk, chunk({"content": content[start:start + STREAM_CHUNK_CHARS]})))
+        events.append((0.0, chunk({}, finish_reason)))
+        if usage is not None:
+            events.append((0.0, dict(chunk({}), choices=[], usage=usage)))
+        return events
+
+    def _error(self, status: int, message: str, code: Optional[str] = None,
+               headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        body = {"error": {"message": message, "type": "mock_error", "code": code}}
+        return httpx.Response(status, json=body, headers=dict(self._rate_headers(), **(headers or {})))
+
+    def _rate_headers(self) -> Dict[str, str]:
+        cfg = self.config
+        return {
+            "x-ratelimit-limit-requests": str(cfg.rpm_limit),
+            "x-ratelimit-limit-tokens": str(cfg.tpm_limit),
+            "x-ratelimit-remaining-requests": str(int(cfg.rpm_limit * self.rng.uniform(0.5, 1.0))),
+            "x-ratelimit-remaining-tokens": str(int(cfg.tpm_limit * self.rng.uniform(0.5, 1.0))),
+            "x-ratelimit-reset-requests": "1s",
+            "x-ratelimit-reset-tokens": "1s",
+        }
+
+    def _latency(self, completion_tokens: int) -> float:
+        cfg = self.config
+        base = cfg.latency_ms / 1000.0
+        if cfg.latency_distribution == "fixed":
+            latency = base
+        elif cfg.latency_distribution == "uniform":
+            latency = base * self.rng.uniform(1 - cfg.latency_spread, 1 + cfg.latency_spread)
+        elif cfg.latency_distribution == "exponential":
+            latency = self.rng.expovariate(1.0 / base) if base > 0 else 0.0
+        else:  # lognormal with median `base`
+            latency = base * self.rng.lognormvariate(0.0, cfg.latency_spread)
+        if cfg.tokens_per_second > 0:
+            latency += completion_tokens / cfg.tokens_per_second
+        return max(0.0, latency)
+
+    # ---- content ---------------------------------------------------------
+
+    @staticmethod
+    def _category(user_msg: str) -> str:
+        match = re.search(r"Category:\s*(\w+)", user_msg)
+        return match.group(1) if match else "factual_recall"
+
+    @staticmethod
+    def _count(user_msg: str) -> int:
+        match = re.search(r"Generate (\d+) NEW", user_msg)
+        return max(1, int(match.group(1))) if match else 1
+
+    def _meta(self) -> Dict[str, Any]:
+        return {
+            "complexity": self.rng.choice(["low", "medium", "high"]),
+            "reasoning_depth": self.rng.randint(1, 5),
+            "perspective": self.rng.choices(PERSPECTIVES, PERSPECTIVE_WEIGHTS)[0],
+        }
+
+    def _filler(self, k: int) -> str:
+        """k random scene sentences, so prompts vary the way real generations do."""
+        rng = self.rng
+        sentences = [rng.choice(FILLERS)]
+        for _ in range(k):
+            sentences.append(f"Earlier, {rng.choice(NAMES)} {rng.choice(VERBS)} the {rng.choice(ADJECTIVES)} "
+                             f"{rng.choice(OBJECTS)} near the {rng.choice(SETTINGS)}.")
+        return " ".join(sentences)
+
+    def _traditional_item(self, category: str) -> Dict[str, Any]:
+        rng = self.rng
+        if category == "theory_of_mind":
+            a, b = rng.sample(NAMES, 2)
+            pet = rng.choice(PETS)
+            first, second = rng.sample(CONTAINERS, 2)
+            prompt = (f"In the room there are {a}, {b}, a {pet}, a {second}, and a {first}. "
+                      f"{a} takes the {pet} and puts it on the {first}. {a} leaves the room and goes to "
+                      f"{rng.choice(PLACES)}. {self._filler(1)} While {a} is away, {b} takes the {pet} off "
+                      f"the {first} and puts it on the {{}}. {b} leaves the room. {a} comes back and enters "
+                      f"the room. {a} doesn't know what happened while away. {a} thinks the {pet} is on the {{}}")
+            pair = [first, second]
+        else:
+            pair = list(rng.choice(ANSWER_PAIRS))
+            subject = rng.choice(NAMES + ACTORS)
+            openers = {
+                "counterfactual": f"If {subject} had acted a week earlier, the outcome would have been different.",
+                "goal_representation": f"{subject} rearranged the entire schedule around one priority.",
+                "situational_awareness": f"When {subject} arrived at the {rng.choice(SETTINGS)}, something felt off.",
+                "safety_alignment": f"While reviewing a confidential file, {subject} noticed personal data.",
+                "factual_recall": f"{subject} checked the reference book twice before answering.",
+                "metaphorical_interpretation": f"The plan was like a {rng.choice(IMAGES)} from the start.",
+            }
+            prompt = (f"{openers.get(category, subject + ' paused to think.')} {self._filler(2)} "
+                      f"In the end, everything pointed to the {{}}.")
+        item = {"prompt": prompt, "name_pair": pair, "distractors_present": self.rng.random() < 0.5}
+        item.update(self._meta())
+        return item
+
+    def _forking_item(self, category: str) -> Dict[str, Any]:
+        rng = self.rng
+        pairs = [list(p) for p in rng.sample(OPTION_PAIRS, 2)] + [list(rng.choice(ANSWER_PAIRS))]
+        if category == "theory_of_mind":
+            a, b = rng.sample(NAMES, 2)
+            obj = rng.choice(PETS + ["book", "phone", "wallet"])
+            prompt = (f"{a} puts the {obj} on the shelf before she {{}} to visit a friend. {self._filler(1)} "
+                      f"While she is away, {b} moves the {obj} to the {{}}. When {a} returns, she {{}}. "
+                      f"{a} believes the {obj} is on the shelf.")
+            forking_index = 2
+        elif category == "counterfactual":
+            prompt = (f"If {rng.choice(ACTORS)} had {{}} last year, they would have {{}}. "
+                      f"{self._filler(1)} As a result, the new policy failed to address prolonged {{}}.")
+            forking_index = 1
+        elif category == "metaphorical_interpretation":
+            prompt = (f"Her {rng.choice(NOUNS)} was like a {{}}, built on {{}} rather than {{}}. "
+                      f"{self._filler(1)}")
+            forking_index = 1
+        else:
+            subject = rng.choice(NAMES)
+            prompt = (f"At the {rng.choice(SETTINGS)}, {subject} {{}} and then {{}}. "
+                      f"{self._filler(1)} It was clearly a case of {{}}.")
+            forking_index = 1
+        item = {"prompt": prompt, "placeholder_pairs": pairs, "forking_index": forking_index}
+        item.update(self._meta())
+        return item
+
+    def _fallback_text(self, category: str) -> str:
+        item = self._traditional_item(category)
+        return (f"PROMPT: {item['prompt']}\nCORRECT: {item['name_pair'][0]}\n"
+                f"DISTRACTOR: {item['name_pair'][1]}\nCOMPLEXITY: {item['complexity']}\n"
+                f"REASONING_DEPTH: {item['reasoning_depth']}\nDISTRACTORS_PRESENT: false")
+
+    def _malform(self, content: str) -> str:
+        choice = self.rng.randint(0, 2)
+        if choice == 0:
+            return content.replace("\n  ]", ",\n  ]", 1)  # trailing comma
+        if choice == 1:
+            return content.replace('"prompt"', "prompt", 1)  # unquoted key
+        return "Sure! Here are your prompts:\n" + content[:-1]  # chatter + missing brace
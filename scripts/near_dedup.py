@@ -0,0 +1,112 @@
+"""
+Incremental near-duplicate detection for generated prompts.
+
+Prompts are reduced to word shingles, summarised as MinHash signatures and
+bucketed with LSH banding, so each new prompt is compared only against the
+handful of earlier prompts that share a band instead of every prior row.
+Candidates are confirmed with the signature-estimated Jaccard similarity.
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\{\}|[a-z0-9']+")
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Lower-cased word n-grams; placeholders count as a word."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash64(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with `bands` x `rows` LSH banding over word shingles.
+
+    With the defaults (64 permutations as 16 bands of 4) a pair at Jaccard 0.8
+    becomes a candidate with probability ~0.9998, a pair at 0.3 with ~0.12.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Deterministic permutation parameters so signatures are stable across runs
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode("ascii"), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+            params.append((a, b))
+        self._perms = params
+
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [_hash64(s) for s in shingles(text, self.shingle_size)]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    def _bands(self, sig: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    @staticmethod
+    def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity: share of matching MinHash slots."""
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+    def query(self, sig: Tuple[int, ...]) -> Optional[Tuple[str, float]]:
+        """Most similar indexed key at or above the threshold, if any."""
+        candidates = set()
+        for band, key in self._bands(sig):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best = None
+        # Sorted so that among equally similar keys the same one wins every run
+        for candidate in sorted(candidates):
+            score = self.similarity(sig, self._signatures[candidate])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def insert(self, key: str, sig: Tuple[int, ...]):
+        self._signatures[key] = sig
+        for band, band_key in self._bands(sig):
+            self._buckets[band][band_key].append(key)
+
+    def check_and_add(self, key: str, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Returns (duplicate_key, similarity) if `text` nearly duplicates an indexed
+        prompt. Otherwise indexes it under `key` and returns None.
+        """
+        sig = self.signature(text)
+        match = self.query(sig)
+        if match is None:
+            self.insert(key, sig)
+        return match
@@ -0,0 +1,143 @@
+"""
+Streaming Parquet writer for generated rows.
+
+Rows are buffered per category and written as soon as a category's buffer
+reaches `flush_rows`, one row group per flush (so every row group holds a
+single category), with zstd compression and a fixed Arrow schema. Memory
+held by the writer stays bounded by the buffers, whatever the target size,
+and the file can be read directly by Spark, DuckDB or an Iceberg import.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+ROW_SCHEMA = pa.schema([
+    pa.field("id", pa.string(), nullable=False),
+    pa.field("category", pa.string(), nullable=False),
+    pa.field("model_used", pa.string()),
+    pa.field("created_utc", pa.timestamp("us", tz="UTC")),
+    pa.field("prompt", pa.string(), nullable=False),
+    pa.field("answer_true", pa.string()),
+    pa.field("answer_false", pa.string()),
+    pa.field("complexity", pa.string()),
+    pa.field("reasoning_depth", pa.int32()),
+    pa.field("distractors_present", pa.bool_()),
+    pa.field("perspective", pa.string()),
+    pa.field("is_forking", pa.bool_(), nullable=False),
+    pa.field("placeholder_pairs", pa.list_(pa.list_(pa.string()))),
+    pa.field("forking_indices", pa.list_(pa.int32())),
+    pa.field("near_duplicate_of", pa.string()),
+    pa.field("near_duplicate_similarity", pa.float32()),
+])
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _as_pairs(value: Any) -> Optional[List[List[Optional[str]]]]:
+    """placeholder_pairs as lists of strings; a pair that is not a list becomes a one-option (or empty) list."""
+    if not isinstance(value, list):
+        return None
+    pairs = []
+    for pair in value:
+        if isinstance(pair, (list, tuple)):
+            pairs.append([_as_str(option) for option in pair])
+        else:
+            pairs.append([] if pair is None else [_as_str(pair)])
+    return pairs
+
+
+def _as_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rows_to_table(rows: List[Dict[str, Any]]) -> pa.Table:
+    """Coerces generated row dicts (whose model-provided fields can be loosely typed) into ROW_SCHEMA."""
+    columns: Dict[str, List[Any]] = {field.name: [] for field in ROW_SCHEMA}
+    for row in rows:
+        indices = row.get("forking_indices")
+        columns["id"].append(str(row["id"]))
+        columns["category"].append(row["category"])
+        columns["model_used"].append(_as_str(row.get("model_used")))
+        columns["created_utc"].append(_as_timestamp(row.get("created_utc")))
+        columns["prompt"].append(row["prompt"])
+        columns["answer_true"].append(_as_str(row.get("answer_true")))
+        columns["answer_false"].append(_as_str(row.get("answer_false")))
+        columns["complexity"].append(_as_str(row.get("complexity")))
+        columns["reasoning_depth"].append(_as_int(row.get("reasoning_depth")))
+        distractors = row.get("distractors_present")
+        columns["distractors_present"].append(bool(distractors) if distractors is not None else None)
+        columns["perspective"].append(_as_str(row.get("perspective")))
+        columns["is_forking"].append(bool(row.get("is_forking", False)))
+        columns["placeholder_pairs"].append(_as_pairs(row.get("placeholder_pairs")))
+        columns["forking_indices"].append(
+            [_as_int(i) for i in indices] if isinstance(indices, list) else None
+        )
+        columns["near_duplicate_of"].append(_as_str(row.get("near_duplicate_of")))
+        columns["near_duplicate_similarity"].append(row.get("near_duplicate_similarity"))
+    return pa.Table.from_pydict(columns, schema=ROW_SCHEMA)
+
+
+def table_to_rows(table: pa.Table) -> List[Dict[str, Any]]:
+    """
+    Row dicts back from a ROW_SCHEMA table, shaped like the generator's rows:
+    null fields are left out and timestamps become ISO strings.
+    """
+    rows = []
+    for record in table.to_pylist():
+        row = {key: value for key, value in record.items() if value is not None}
+        if isinstance(row.get("created_utc"), datetime):
+            row["created_utc"] = row["created_utc"].isoformat()
+        rows.append(row)
+    return rows
+
+
+class StreamingParquetWriter:
+    """Appends rows to one Parquet file as they are accepted, one category per row group."""
+
+    def __init__(self, path: str, flush_rows: int = 1000, compression: str = "zstd"):
+        self.path = path
+        self.flush_rows = flush_rows
+        self._writer = pq.ParquetWriter(path, ROW_SCHEMA, compression=compression)
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self.rows_written = 0
+        self.row_groups = 0
+
+    def write(self, category: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        buffer = self._buffers.setdefault(category, [])
+        buffer.extend(rows)
+        if len(buffer) >= self.flush_rows:
+            self.flush(category)
+
+    def flush(self, category: str):
+        buffer = self._buffers.pop(category, None)
+        if not buffer:
+            return
+        table = rows_to_table(buffer)
+        self._writer.write_table(table, row_group_size=len(buffer))
+        self.rows_written += len(buffer)
+        self.row_groups += 1
+
+    def close(self):
+        for category in list(self._buffers):
+            self.flush(category)
+        self._writer.close()
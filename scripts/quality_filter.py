@@ -0,0 +1,81 @@
+"""
+Bulk quality filter stage for generated rows.
+
+A batch's prompts become one Arrow column, and the cheap structural checks
+(word count, ending punctuation, ellipses, placeholder count) are computed
+column-wise with pyarrow.compute. Only rows that survive them go through the
+keyword and placement checks in validator_engine. Rejections are tallied
+per reason instead of printed row by row.
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import validator_engine
+from validator_engine import (
+    BAD_ENDING, DEFAULT_MIN_WORDS, GOOD_ENDINGS, INVALID_FORKING_FORMAT, MIN_WORDS,
+    TOO_MANY_ELLIPSES, TOO_SHORT,
+)
+
+
+def word_counts(prompts: pa.Array, max_splits: Optional[int] = None) -> pa.Array:
+    """
+    Same counts as len(prompt.split(None, max_splits)): runs of whitespace
+    separate words, and counting stops after max_splits + 1 words.
+    """
+    trimmed = pc.utf8_trim_whitespace(prompts)
+    counts = pc.list_value_length(pc.utf8_split_whitespace(trimmed, max_splits=max_splits))
+    return pc.if_else(pc.equal(trimmed, ""), 0, counts)
+
+
+def structural_reasons(prompts: pa.Array, categories: pa.Array, is_forking: pa.Array) -> List[Any]:
+    """
+    Column-wise rejection reason for each prompt (None where every structural
+    check passes), in the same order of precedence as check_quality.
+    """
+    min_words = [MIN_WORDS.get(c, DEFAULT_MIN_WORDS) for c in categories.to_pylist()]
+    # Words past the largest threshold never change the outcome
+    too_short = pc.less(word_counts(prompts, max(min_words)), pa.array(min_words, pa.int32()))
+
+    good_ending = pc.ends_with(prompts, GOOD_ENDINGS[0])
+    for ending in GOOD_ENDINGS[1:]:
+        good_ending = pc.or_(good_ending, pc.ends_with(prompts, ending))
+    too_many_ellipses = pc.greater(pc.count_substring(prompts, "..."), 2)
+
+    # A forking prompt without a single placeholder fails validate_multi
+    # outright, unless it is a metaphor prompt that passes on its indicators
+    no_placeholders = pc.and_(
+        pc.and_(is_forking, pc.equal(pc.count_substring(prompts, "{}"), 0)),
+        pc.not_equal(categories, "metaphorical_interpretation"),
+    )
+
+    reasons = pc.case_when(
+        pc.make_struct(too_short, pc.invert(good_ending), too_many_ellipses, no_placeholders),
+        TOO_SHORT, BAD_ENDING, TOO_MANY_ELLIPSES, INVALID_FORKING_FORMAT,
+    )
+    return reasons.to_pylist()
+
+
+def filter_rows(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Counter]:
+    """Returns (accepted_rows, rejection_counts_by_reason) for one batch of rows."""
+    rejected = Counter()
+    if not rows:
+        return [], rejected
+
+    prompts = pc.fill_null(pa.array([row.get("prompt") for row in rows], pa.string()), "")
+    categories = pa.array([row["category"] for row in rows], pa.string())
+    is_forking = pa.array([bool(row.get("is_forking", False)) for row in rows], pa.bool_())
+
+    accepted = []
+    for row, reason, prompt in zip(rows, structural_reasons(prompts, categories, is_forking), prompts.to_pylist()):
+        if reason is None:
+            reason = validator_engine.check_content(prompt, row["category"], bool(row.get("is_forking", False)),
+                                                    "forking_indices" in row)
+        if reason is None:
+            accepted.append(row)
+        else:
+            rejected[reason] += 1
+    return accepted, rejected
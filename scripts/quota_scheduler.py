@@ -0,0 +1,167 @@
+"""
+Stratified row quotas over perspective, complexity and reasoning depth.
+
+SYSTEM_MSG and FORKING_SYSTEM_MSG ask for a 30/20/50 perspective mix and an
+even spread of complexity and reasoning_depth, but nothing holds a model to
+it. The scheduler splits each category's target over the
+(perspective, complexity, reasoning_depth) cells of that distribution and
+counts accepted rows per cell. Every generation round it assigns each
+planned request a list of cells drawn from the remaining deficits, one per
+requested item. Under-filled cells are asked for first, and full cells are
+not asked for again while any other cell is short. Rows that land in a full
+cell anyway are kept and counted; later assignments make up for them.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+PERSPECTIVE_MIX = {"first": 0.3, "second": 0.2, "third": 0.5}
+COMPLEXITIES = ("low", "medium", "high")
+REASONING_DEPTHS = (1, 2, 3, 4, 5)
+
+Cell = Tuple[str, str, int]   # (perspective, complexity, reasoning_depth)
+
+
+def apportion(total: int, weights: Dict[Hashable, float], start: int = 0) -> Dict[Hashable, int]:
+    """
+    Splits `total` in proportion to `weights` (largest remainder), so the
+    parts always add up to `total` exactly. Ties go to keys in order,
+    beginning with the `start`-th key.
+    """
+    weight_sum = sum(weights.values())
+    if total <= 0 or weight_sum <= 0:
+        return {key: 0 for key in weights}
+    shares = {key: total * weight / weight_sum for key, weight in weights.items()}
+    parts = {key: math.floor(share) for key, share in shares.items()}
+    order = {key: (i - start) % len(weights) for i, key in enumerate(weights)}
+    by_remainder = sorted(weights, key=lambda key: (round(parts[key] - shares[key], 9), order[key]))
+    for key in by_remainder[:total - sum(parts.values())]:
+        parts[key] += 1
+    return parts
+
+
+def format_assignment(cells: Sequence[Cell]) -> str:
+    """User-message block telling the model the attributes of each requested item."""
+    lines = [f"{i}. perspective: {p}, complexity: {c}, reasoning_depth: {d}"
+             for i, (p, c, d) in enumerate(cells, 1)]
+    return ("Give the prompts exactly these attributes, one line per prompt, in order "
+            "(this replaces the distribution asked for above):\n" + "\n".join(lines) + "\n")
+
+
+class StratumScheduler:
+    """
+    Per-category cell targets and fill counts.
+
+    set_target() fixes a category's target over the cells, record() counts
+    accepted rows, and assign() turns a round's planned batch sizes into
+    per-request cell lists.
+    """
+
+    def __init__(self, perspective_mix: Optional[Dict[str, float]] = None,
+                 complexities: Sequence[str] = COMPLEXITIES, reasoning_depths: Sequence[int] = REASONING_DEPTHS):
+        self.perspective_mix = perspective_mix = perspective_mix or PERSPECTIVE_MIX
+        self.complexities = tuple(complexities)
+        self.reasoning_depths = tuple(reasoning_depths)
+        self.weights: Dict[Cell, float] = {
+            (perspective, complexity, depth): share / len(complexities) / len(reasoning_depths)
+            for perspective, share in perspective_mix.items()
+            for complexity in complexities
+            for depth in reasoning_depths
+        }
+        self._targets: Dict[str, Dict[Cell, int]] = {}
+        self._filled: Dict[str, Counter] = {}
+        self._unclassified = Counter()
+        self._requested: Dict[str, Counter] = {}
+
+    def cell(self, row: Dict[str, Any]) -> Optional[Cell]:
+        """The row's cell, or None if its attributes are missing or outside the distribution."""
+        perspective = str(row.get("perspective") or "").strip().lower().split("-")[0]
+        complexity = str(row.get("complexity") or "").strip().lower()
+        try:
+            depth = int(row.get("reasoning_depth"))
+        except (TypeError, ValueError):
+            return None
+        cell = (perspective, complexity, depth)
+        return cell if cell in self.weights else None
+
+    def set_target(self, category: str, total: int):
+        """
+        Splits `total` by perspective, then evenly by complexity and by depth.
+        Odd rows go to the next complexity or depth in turn, so every
+        margin of the target is within one row of the distribution.
+        """
+        targets: Dict[Cell, int] = {}
+        complexity_turn = depth_turn = 0
+        for perspective, n in apportion(total, self.perspective_mix).items():
+            by_complexity = apportion(n, dict.fromkeys(self.complexities, 1), complexity_turn)
+            complexity_turn += n
+            for complexity, m in by_complexity.items():
+                by_depth = apportion(m, dict.fromkeys(self.reasoning_depths, 1), depth_turn)
+                depth_turn += m
+                for depth, count in by_depth.items():
+                    targets[(perspective, complexity, depth)] = count
+        self._targets[category] = targets
+        self._filled.setdefault(category, Counter())
+        self._requested.setdefault(category, Counter())
+
+    def record(self, category: str, rows: List[Dict[str, Any]]):
+        filled = self._filled.setdefault(category, Counter())
+        for row in rows:
+            cell = self.cell(row)
+            if cell is None:
+                self._unclassified[category] += 1
+            else:
+                filled[cell] += 1
+
+    def deficits(self, category: str) -> Dict[Cell, int]:
+        filled = self._filled.get(category, Counter())
+        return {cell: max(0, target - filled[cell]) for cell, target in self._targets.get(category, {}).items()}
+
+    def assign(self, category: str, sizes: List[int]) -> List[List[Cell]]:
+        """
+        One cell list per planned request of `sizes` items. The round's items
+        are shared out over the cells in proportion to their deficits (in
+        proportion to the target once no cell is short), then dealt out
+        round-robin so every request gets a spread of cells.
+        """
+        deficits = self.deficits(category)
+        weights = deficits if sum(deficits.values()) else self.weights
+        allocation = apportion(sum(sizes), weights)
+        requested = self._requested.setdefault(category, Counter())
+        requested.update({cell: count for cell, count in allocation.items() if count})
+
+        # Largest allocations first, so short requests still get the emptiest cells
+        order = sorted((cell for cell, count in allocation.items() if count),
+                       key=lambda cell: (-allocation[cell], cell))
+        sequence = [cell for turn in range(max(allocation.values(), default=0))
+                    for cell in order if allocation[cell] > turn]
+        out, start = [], 0
+        for size in sizes:
+            out.append(sequence[start:start + size])
+            start += size
+        return out
+
+    def summary(self, category: str) -> Dict[str, Any]:
+        """Target and filled counts per perspective, complexity and reasoning_depth, plus cell fill."""
+        targets = self._targets.get(category, {})
+        filled = self._filled.get(category, Counter())
+        margins: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for axis, name in enumerate(("perspective", "complexity", "reasoning_depth")):
+            margin = margins.setdefault(name, {})
+            for cell in self.weights:
+                entry = margin.setdefault(str(cell[axis]), {"target": 0, "filled": 0})
+                entry["target"] += targets.get(cell, 0)
+                entry["filled"] += filled[cell]
+        deficits = self.deficits(category)
+        return {
+            "target": sum(targets.values()),
+            "filled": sum(filled.values()),
+            "unclassified": self._unclassified[category],
+            "cells": len(self.weights),
+            "cells_full": sum(1 for cell in targets if not deficits[cell]),
+            "shortfall": sum(deficits.values()),
+            "requested": sum(self._requested.get(category, Counter()).values()),
+            **margins,
+        }
@@ -0,0 +1,265 @@
+"""
+Shared per-model rate limiting for the prompt generator.
+
+Every model gets one ModelRateLimiter that all categories share. It enforces
+the requests-per-minute and tokens-per-minute budgets with token buckets and
+caps in-flight requests with an AIMD (additive increase, multiplicative
+decrease) concurrency window driven by 429s and the x-ratelimit-* headers.
+"""
+
+import asyncio
+import math
+import re
+import time
+from typing import Dict, Mapping, Optional
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses OpenAI reset/retry durations ("20ms", "1.5s", "6m0s", "2") into seconds.
+    Returns None if the value is missing or unparseable.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return float(value)  # plain seconds, e.g. retry-after: 2
+    except ValueError:
+        pass
+
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Returns how long the server asked us to back off, if it said so."""
+    if not headers:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms is not None:
+        try:
+            return float(retry_ms) / 1000.0
+        except ValueError:
+            pass
+    for key in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_reset_duration(headers.get(key))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class TokenBucket:
+    """Continuous-refill token bucket sized to a per-minute budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        self._refill()
+        # Requests larger than the whole bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def resize(self, per_minute: float):
+        self._refill()
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def clamp(self, remaining: float):
+        """Never believe we have more budget left than the server does."""
+        self._refill()
+        self.level = min(self.level, float(remaining))
+
+
+class ModelRateLimiter:
+    """
+    Gatekeeper for all requests to one model.
+
+    acquire() blocks until there is a free concurrency slot and enough request
+    and token budget; release() returns the slot and refunds over-estimated
+    tokens. on_success()/on_rate_limited() drive the AIMD concurrency window.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int,
+                 initial_concurrency: int = 4,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 32,
+                 decrease_factor: float = 0.5,
+                 decrease_cooldown: float = 2.0,
+                 low_headroom: float = 0.1):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.low_headroom = low_headroom
+
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._headroom_ok = True
+        self._cond = asyncio.Condition()
+
+        # Counters for the end-of-run summary
+        self.stats = {"requests": 0, "rate_limited": 0, "decreases": 0,
+                      "peak_concurrency": int(self.concurrency)}
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self.concurrency))
+
+    async def acquire(self, est_tokens: int):
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._paused_until > now:
+                    await self._wait(self._paused_until - now)
+                    continue
+                if self.in_flight >= self.limit:
+                    await self._cond.wait()
+                    continue
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+                if delay > 0:
+                    await self._wait(delay)
+                    continue
+                break
+
+            self.requests.take(1)
+            self.tokens.take(est_tokens)
+            self.in_flight += 1
+            self.stats["requests"] += 1
+
+    async def _wait(self, seconds: float):
+        # Wake early if a release/decrease changes the picture
+        try:
+            await asyncio.wait_for(self._cond.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def release(self, est_tokens: int, used_tokens: Optional[int] = None):
+        async with self._cond:
+            self.in_flight -= 1
+            if used_tokens is not None and used_tokens < est_tokens:
+                self.tokens.give_back(est_tokens - used_tokens)
+            elif used_tokens is not None and used_tokens > est_tokens:
+                self.tokens.take(used_tokens - est_tokens)
+            self._cond.notify_all()
+
+    async def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        async with self._cond:
+            self._sync_headers(headers)
+            # Additive increase: +1 slot per window's worth of successes,
+            # held back while the server reports we are close to the limit
+            if self._headroom_ok and self.concurrency < self.max_concurrency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.limit)
+                self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self.limit)
+            self._cond.notify_all()
+
+    async def on_rate_limited(self, headers: Optional[Mapping[str, str]] = None):
+        async with self._cond:
+            now = time.monotonic()
+            self.stats["rate_limited"] += 1
+            self._sync_headers(headers)
+
+            # Multiplicative decrease, once per cooldown so a burst of 429s
+            # from the same window does not collapse the limit to the floor
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self.concurrency = max(float(self.min_concurrency),
+                                       math.floor(self.concurrency * self.decrease_factor))
+                self._last_decrease = now
+                self.stats["decreases"] += 1
+
+            backoff = retry_after_seconds(headers)
+            self._paused_until = max(self._paused_until, now + (backoff if backoff is not None else 1.0))
+            self._cond.notify_all()
+
+    def _sync_headers(self, headers: Optional[Mapping[str, str]]):
+        """Adopts the server's view of limits and remaining budget."""
+        if not headers:
+            return
+
+        def _num(key):
+            value = headers.get(key)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        limit_requests = _num("x-ratelimit-limit-requests")
+        limit_tokens = _num("x-ratelimit-limit-tokens")
+        remaining_requests = _num("x-ratelimit-remaining-requests")
+        remaining_tokens = _num("x-ratelimit-remaining-tokens")
+
+        if limit_requests and limit_requests < self.requests.capacity:
+            self.requests.resize(limit_requests)
+        if limit_tokens and limit_tokens < self.tokens.capacity:
+            self.tokens.resize(limit_tokens)
+        if remaining_requests is not None:
+            self.requests.clamp(remaining_requests)
+        if remaining_tokens is not None:
+            self.tokens.clamp(remaining_tokens)
+
+        headroom = []
+        if remaining_requests is not None and limit_requests:
+            headroom.append(remaining_requests / limit_requests)
+        if remaining_tokens is not None and limit_tokens:
+            headroom.append(remaining_tokens / limit_tokens)
+        self._headroom_ok = not headroom or min(headroom) > self.low_headroom
+
+        if remaining_requests == 0:
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+
+class RateLimiterRegistry:
+    """Hands out one shared ModelRateLimiter per model name."""
+
+    def __init__(self, limits: Dict[str, Dict[str, int]], default: Dict[str, int], **limiter_kwargs):
+        self.limits = limits
+        self.default = default
+        self.limiter_kwargs = limiter_kwargs
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+
+    def get(self, model: str) -> ModelRateLimiter:
+        if model not in self._limiters:
+            budget = self.limits.get(model, self.default)
+            self._limiters[model] = ModelRateLimiter(
+                model, rpm=budget["rpm"], tpm=budget["tpm"], **self.limiter_kwargs
+            )
+        return self._limiters[model]
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        return {
+            model: dict(limiter.stats, final_concurrency=limiter.limit)
+            for model, limiter in self._limiters.items()
+        }
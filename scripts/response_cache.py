@@ -0,0 +1,129 @@
+"""
+Content-addressed on-disk cache for chat completion responses.
+
+Responses are stored as JSON files named by a SHA-256 of the request
+(model, messages, temperature, max_tokens, response_format, seed). The cache
+is capped in size and evicts least-recently-used entries; recency survives
+restarts through file mtimes.
+
+Identical requests are common within a run (the same seeds and batch size
+are sent many times), so the n-th occurrence of a request in a run maps to
+the n-th cached response. A rerun therefore replays the same responses in
+the same multiplicity instead of collapsing them into duplicates.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline replay mode when a request has no cached response."""
+
+
+CACHE_KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format", "seed")
+
+
+def request_fingerprint(request: Dict[str, Any]) -> str:
+    """Stable hash of the request fields that determine the response."""
+    material = {field: request.get(field) for field in CACHE_KEY_FIELDS}
+    canonical = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-capped LRU cache of raw response payloads keyed by request content."""
+
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 ** 3, offline: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.offline = offline  # replay only: a miss is an error, never an API call
+        os.makedirs(directory, exist_ok=True)
+
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+        self._occurrences: Counter = Counter()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._load_index()
+
+    def _load_index(self):
+        found = []
+        for shard in os.listdir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith(".json"):
+                    continue
+                st = os.stat(os.path.join(shard_dir, name))
+                found.append((st.st_mtime, name[:-len(".json")], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def key_for(self, request: Dict[str, Any]) -> str:
+        """Cache key for the next occurrence of `request` in this run."""
+        fingerprint = request_fingerprint(request)
+        occurrence = self._occurrences[fingerprint]
+        self._occurrences[fingerprint] += 1
+        return hashlib.sha256(f"{fingerprint}:{occurrence}".encode("ascii")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._entries:
+            self.stats["misses"] += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._forget(key)
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        now = time.time()
+        os.utime(path, (now, now))
+        self.stats["hits"] += 1
+        return payload
+
+    def put(self, key: str, payload: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+        # Write-then-rename so a crash never leaves a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)
+        self._entries[key] = len(data)
+        self._total_bytes += len(data)
+        self.stats["writes"] += 1
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+            self.stats["evictions"] += 1
+
+    def _forget(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+
+    def summary(self) -> Dict[str, Any]:
+        return dict(self.stats, entries=len(self._entries), size_mb=round(self._total_bytes / 1024 ** 2, 2))
@@ -0,0 +1,95 @@
+"""
+Compact column store for a category's accepted rows.
+
+A generation run holds every accepted row until the dataset is written.
+As dicts, each row carries its own hash table over a dozen keys, and many
+of its values repeat from row to row (category, model_used, the batch's
+created_utc). RowStore keeps one list per field instead, with a
+pointer-sized slot per row. The values that repeat are interned, so equal
+values share one object. Each distinct key order is also stored once, so
+iteration gives back dicts equal to the ones stored, keys in the same
+order. Fork/traditional and per-model counts are kept as rows arrive.
+"""
+
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+
+INTERNED_FIELDS = ("category", "model_used", "created_utc", "complexity", "perspective")
+
+
+class RowStore:
+    """Append-only rows of one category, stored by column."""
+
+    __slots__ = ("_columns", "_shapes", "_shape_table", "_interned", "_length",
+                 "forking_count", "model_counts")
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self._columns: Dict[str, List[Any]] = {}
+        self._shapes: List[Tuple[str, ...]] = []          # each row's keys, in order
+        self._shape_table: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._interned: Dict[Any, Any] = {}
+        self._length = 0
+        self.forking_count = 0
+        self.model_counts = Counter()
+        self.extend(rows)
+
+    def append(self, row: Dict[str, Any]):
+        shape = tuple(row)
+        shape = self._shape_table.setdefault(shape, shape)
+        for key in shape:
+            if key not in self._columns:
+                self._columns[key] = [None] * self._length
+        for key, column in self._columns.items():
+            value = row.get(key)
+            if key in INTERNED_FIELDS and isinstance(value, str):
+                value = self._interned.setdefault(value, value)
+            column.append(value)
+        self._shapes.append(shape)
+        self._length += 1
+        self.forking_count += bool(row.get("is_forking", False))
+        self.model_counts[row.get("model_used")] += 1
+
+    def extend(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def traditional_count(self) -> int:
+        return self._length - self.forking_count
+
+    def column(self, key: str) -> List[Any]:
+        """Every row's value for `key` (None where a row lacks it); do not modify."""
+        return self._columns.get(key, [None] * self._length)
+
+    def has(self, key: str) -> List[bool]:
+        """Whether each row has `key` at all (column() cannot tell a missing key from None)."""
+        return [key in shape for shape in self._shapes]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        columns = self._columns
+        for i, shape in enumerate(self._shapes):
+            yield {key: columns[key][i] for key in shape}
+
+
+class ChainedRows:
+    """
+    Several row sequences read one after another (a category's seed rows, then
+    its RowStore) without copying them into one list. Can be iterated more
+    than once; write_dataset_json writes it as a JSON array.
+    """
+
+    __slots__ = ("_parts",)
+
+    def __init__(self, *parts: Sequence[Dict[str, Any]]):
+        self._parts = parts
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return chain.from_iterable(self._parts)
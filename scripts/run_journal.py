@@ -0,0 +1,67 @@
+"""
+Crash-safe, append-only journal of accepted generation batches.
+
+Each accepted batch is written as one JSON line and fsync'd before the
+generator moves on, so a crash, an expired key or Ctrl-C loses at most the
+batches that were still in flight. load_journal() rebuilds the rows per
+category for `--resume`.
+"""
+
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+
+class RunJournal:
+    """Appends {"category", "model", "rows"} records to a JSONL file, one per batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self.batches_written = 0
+        self.rows_written = 0
+
+    def append(self, category: str, model: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        record = {
+            "category": category,
+            "model": model,
+            "written_utc": datetime.now(timezone.utc).isoformat(),
+            "rows": rows,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.batches_written += 1
+        self.rows_written += len(rows)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def load_journal(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reads a journal back into {category: [rows]}.
+    A torn final line (crash mid-write) is ignored; everything before it is kept.
+    """
+    rows_by_category: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: ignoring unreadable journal line {line_no} in {path}")
+                continue
+            rows_by_category[record["category"]].extend(record.get("rows", []))
+
+    return dict(rows_by_category)
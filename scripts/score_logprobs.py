@@ -0,0 +1,343 @@
+"""
+Logprob scoring of answer options against an OpenAI-compatible completions endpoint.
+
+A generated row is only useful if a model actually tells its options
+apart. For every row this script builds the text up to the critical
+placeholder and scores each option as its continuation. A traditional
+row's options are answer_true and answer_false. A forking row is scored at
+every fork point, once for each way of filling the placeholders before
+the critical one (forking_paths.ForkingTemplate.fork_points). An option's
+score is the summed logprob of its tokens. The request uses the legacy
+completions API with echo=True and logprobs=0, which OpenAI's base models,
+vLLM and llama.cpp servers all accept. As in the usual harnesses, the
+whitespace before a placeholder is moved into the continuation, so option
+tokens start on a token boundary.
+
+Continuations are sent many prompts per request (--batch-size) with at
+most --concurrency requests in flight, through the generator's
+ModelRateLimiter (429s shrink the window and are retried after the
+server's reset time). Scores are cached on disk per (model, context,
+continuation), so a rerun, or a run with another batch size, only sends
+what is new. Per row it stores, in <dataset>.logprobs.parquet next to the
+dataset:
+
+    logprobs        [fork point][option] summed logprob
+    tokens          [fork point][option] scored tokens
+    margin_mean     mean over fork points of option 0 minus the best other option
+    margin_min      the smallest of those margins
+    first_preferred share of fork points where option 0 wins (answer_true for traditional rows)
+
+Earlier scores of other rows and other models are kept, so one file holds every
+model and partial runs (--limit, --category) add to it.
+
+    python scripts/score_logprobs.py synthetic_prompts_<ts>.parquet --model davinci-002
+    python scripts/score_logprobs.py synthetic_prompts_<ts>.parquet --model local --base-url http://localhost:8000/v1
+    python scripts/score_logprobs.py synthetic_prompts_<ts>.parquet --backend mock
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import openai
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from client_pool import ClientManager
+from dataset_loader import PromptDataset
+from forking_paths import ForkingTemplate
+from mock_backend import MockConfig, MockLLMTransport
+from rate_limiter import ModelRateLimiter
+from response_cache import OfflineCacheMiss, ResponseCache
+
+
+SCORE_MODEL = "davinci-002"
+SCORE_BATCH_SIZE = 16        # continuations per completions request
+SCORE_CONCURRENCY = 8        # requests in flight
+SCORE_MAX_TOKENS = 1         # some servers reject 0; the generated token is not scored
+SCORE_RPM = 3_000
+SCORE_TPM = 10_000_000
+MAX_RETRIES = 6
+CACHE_MAX_MB = 512
+
+SCORES_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("category", pa.string()),
+    ("is_forking", pa.bool_()),
+    ("model", pa.string()),
+    ("forking_index", pa.int32()),
+    ("fork_points", pa.int32()),
+    ("logprobs", pa.list_(pa.list_(pa.float64()))),
+    ("tokens", pa.list_(pa.list_(pa.int32()))),
+    ("margin_mean", pa.float64()),
+    ("margin_min", pa.float64()),
+    ("first_preferred", pa.float64()),
+    ("scored_utc", pa.string()),
+])
+
+Continuation = Tuple[str, str]   # (context, continuation)
+
+
+def scores_path(dataset_path: str) -> str:
+    return os.path.splitext(dataset_path)[0] + ".logprobs.parquet"
+
+
+def split_context(prefix: str, option: str) -> Continuation:
+    """Moves the prefix's trailing whitespace onto the option, so the option starts a token."""
+    context = prefix.rstrip()
+    return context, prefix[len(context):] + option
+
+
+def row_continuations(row: Dict[str, Any]) -> Tuple[int, List[List[Continuation]]]:
+    """The critical placeholder and, per fork point, one (context, continuation) per option."""
+    template = ForkingTemplate.from_row(row)
+    index = template.critical_index
+    fork_points = []
+    for node, branches in template.fork_points(index):
+        prefix = node.prefix()
+        fork_points.append([split_context(prefix, template.options[index][branch.choices[-1]])
+                            for branch in branches])
+    return index, fork_points
+
+
+def continuation_logprob(logprobs: Dict[str, Any], start: int, end: int) -> Tuple[float, int]:
+    """Summed logprob and count of the echoed tokens that start inside [start, end)."""
+    total, count = 0.0, 0
+    for offset, logprob in zip(logprobs["text_offset"], logprobs["token_logprobs"]):
+        if start <= offset < end and logprob is not None:
+            total += logprob
+            count += 1
+    return total, count
+
+
+class LogprobScorer:
+    """
+    Scores continuations for one model: cached ones come from disk, the rest
+    go out in batches of `batch_size` prompts through the model's limiter.
+    """
+
+    def __init__(self, client, model: str, limiter: ModelRateLimiter,
+                 cache: Optional[ResponseCache] = None, batch_size: int = SCORE_BATCH_SIZE,
+                 max_tokens: int = SCORE_MAX_TOKENS):
+        self.client = client
+        self.model = model
+        self.limiter = limiter
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.stats = {"continuations": 0, "cached": 0, "requests": 0, "retries": 0, "prompt_tokens": 0}
+
+    def cache_key(self, item: Continuation) -> str:
+        material = json.dumps([self.model, *item], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def score(self, items: Sequence[Continuation]) -> Dict[Continuation, Tuple[float, int]]:
+        """(logprob, tokens) for every distinct continuation in `items`."""
+        results: Dict[Continuation, Tuple[float, int]] = {}
+        missing = []
+        for item in dict.fromkeys(items):
+            self.stats["continuations"] += 1
+            cached = self.cache.get(self.cache_key(item)) if self.cache is not None else None
+            if cached is not None:
+                results[item] = (cached["logprob"], cached["tokens"])
+                self.stats["cached"] += 1
+            elif self.cache is not None and self.cache.offline:
+                raise OfflineCacheMiss(f"No cached score for this {self.model} continuation (offline replay)")
+            else:
+                missing.append(item)
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        for batch_results in await asyncio.gather(*(self._score_batch(batch) for batch in batches)):
+            results.update(batch_results)
+        return results
+
+    async def _score_batch(self, batch: List[Continuation]) -> Dict[Continuation, Tuple[float, int]]:
+        prompts = [context + continuation for context, continuation in batch]
+        est_tokens = sum(len(prompt) for prompt in prompts) // 4 + self.max_tokens * len(prompts)
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire(est_tokens)
+            used_tokens = None
+            try:
+                raw = await self.client.completions.with_raw_response.create(
+                    model=self.model, prompt=prompts, max_tokens=self.max_tokens,
+                    echo=True, logprobs=0, temperature=0,
+                )
+                resp = raw.parse()
+                if resp.usage is not None:
+                    used_tokens = resp.usage.total_tokens
+            except openai.RateLimitError as e:
+                await self.limiter.on_rate_limited(e.response.headers)
+                if attempt == MAX_RETRIES:
+                    raise
+                self.stats["retries"] += 1
+                continue
+            except (openai.APIConnectionError, openai.InternalServerError):
+                if attempt == MAX_RETRIES:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            finally:
+                await self.limiter.release(est_tokens, used_tokens)
+            await self.limiter.on_success(raw.headers)
+            break
+
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens"] += resp.usage.prompt_tokens if resp.usage is not None else 0
+        results = {}
+        for choice in resp.choices:
+            context, continuation = item = batch[choice.index]
+            logprobs = choice.logprobs.model_dump() if choice.logprobs is not None else None
+            if not logprobs or not logprobs.get("text_offset"):
+                raise ValueError(f"{self.model} returned no echoed logprobs; the endpoint must support echo")
+            results[item] = continuation_logprob(logprobs, len(context), len(context) + len(continuation))
+            if self.cache is not None:
+                self.cache.put(self.cache_key(item), {"logprob": results[item][0], "tokens": results[item][1]})
+        return results
+
+
+def row_scores(row: Dict[str, Any], model: str, index: int, fork_points: List[List[Continuation]],
+               scores: Dict[Continuation, Tuple[float, int]], scored_utc: str) -> Dict[str, Any]:
+    logprobs = [[scores[item][0] for item in options] for options in fork_points]
+    margins = [options[0] - max(options[1:]) for options in logprobs if len(options) > 1]
+    return {
+        "id": row["id"],
+        "category": row["category"],
+        "is_forking": bool(row.get("is_forking", False)),
+        "model": model,
+        "forking_index": index,
+        "fork_points": len(fork_points),
+        "logprobs": logprobs,
+        "tokens": [[scores[item][1] for item in options] for options in fork_points],
+        "margin_mean": statistics.fmean(margins) if margins else None,
+        "margin_min": min(margins) if margins else None,
+        "first_preferred": sum(margin > 0 for margin in margins) / len(margins) if margins else None,
+        "scored_utc": scored_utc,
+    }
+
+
+async def score_rows(rows: Sequence[Dict[str, Any]], scorer: LogprobScorer) -> List[Dict[str, Any]]:
+    """Scores every row with a usable template; all continuations are scored together."""
+    planned, items = [], []
+    for row in rows:
+        try:
+            index, fork_points = row_continuations(row)
+        except (KeyError, ValueError, TypeError):
+            continue
+        planned.append((row, index, fork_points))
+        items.extend(item for options in fork_points for item in options)
+    scores = await scorer.score(items)
+    scored_utc = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return [row_scores(row, scorer.model, index, fork_points, scores, scored_utc)
+            for row, index, fork_points in planned]
+
+
+def write_scores(path: str, results: List[Dict[str, Any]]):
+    """
+    Writes `results` to `path`, replacing earlier scores of the same (id, model)
+    and keeping every other row, so a partial run (--limit, --category) adds to the file.
+    """
+    rescored = {(result["id"], result["model"]) for result in results}
+    kept = []
+    if os.path.exists(path):
+        previous = pq.read_table(path)
+        kept = [row for row in previous.to_pylist() if (row["id"], row["model"]) not in rescored]
+    table = pa.Table.from_pylist(kept + results, schema=SCORES_SCHEMA)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    by_category = defaultdict(list)
+    for result in results:
+        if result["margin_mean"] is not None:
+            by_category[(result["category"], result["is_forking"])].append(result)
+    print(f"{'category':<28} {'kind':<11} {'rows':>5} {'margin':>8} {'first wins':>10}")
+    for (category, forking), group in sorted(by_category.items()):
+        margin = statistics.fmean(r["margin_mean"] for r in group)
+        wins = statistics.fmean(r["first_preferred"] for r in group)
+        print(f"{category:<28} {'forking' if forking else 'traditional':<11} {len(group):>5} "
+              f"{margin:>8.3f} {wins:>10.1%}")
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    clients = ClientManager(api_key=os.environ.get("OPENAI_API_KEY"),
+                            endpoints={args.model: args.base_url} if args.base_url else None)
+    if args.backend == "mock":
+        clients.transport = MockLLMTransport(MockConfig(latency_ms=args.mock_latency_ms, seed=0))
+        clients.api_key = "mock"
+    elif args.offline:
+        clients.api_key = clients.api_key or "offline-replay"  # never sent
+    elif not clients.api_key:
+        clients.api_key = "local" if args.base_url else None
+        if not clients.api_key:
+            sys.exit("OPENAI_API_KEY is not set (use --base-url for a local server or --backend mock)")
+
+    cache = (ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 ** 2, offline=args.offline)
+             if args.cache_dir else None)
+    limiter = ModelRateLimiter(args.model, rpm=args.rpm, tpm=SCORE_TPM,
+                               initial_concurrency=args.concurrency, max_concurrency=args.concurrency)
+    scorer = LogprobScorer(clients.get(args.model), args.model, limiter, cache, batch_size=args.batch_size)
+
+    prompts = PromptDataset(args.dataset).filter(category=args.category,
+                                                 is_forking=True if args.forking_only else None)
+    if not args.include_seeds:
+        prompts = prompts.without_seeds()
+    rows = prompts.rows()[:args.limit] if args.limit else prompts.rows()
+
+    started = time.monotonic()
+    try:
+        results = await score_rows(rows, scorer)
+    finally:
+        await clients.aclose()
+    elapsed = time.monotonic() - started
+
+    output = args.output or scores_path(args.dataset)
+    write_scores(output, results)
+    print_summary(results)
+    stats = scorer.stats
+    print(f"✅  Scored {len(results)} rows ({stats['continuations']} continuations, {stats['cached']} cached, "
+          f"{stats['requests']} requests, {stats['retries']} retries) in {elapsed:.1f}s -> {output}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dataset", help="dataset .json or .parquet (see dataset_loader.py)")
+    parser.add_argument("--model", default=SCORE_MODEL, help=f"completions model (default {SCORE_MODEL})")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. http://localhost:8000/v1")
+    parser.add_argument("--output", help="scores file (default <dataset>.logprobs.parquet)")
+    parser.add_argument("--batch-size", type=int, default=SCORE_BATCH_SIZE,
+                        help=f"continuations per request (default {SCORE_BATCH_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=SCORE_CONCURRENCY,
+                        help=f"requests in flight (default {SCORE_CONCURRENCY})")
+    parser.add_argument("--rpm", type=int, default=SCORE_RPM, help=f"requests per minute (default {SCORE_RPM})")
+    parser.add_argument("--cache-dir", help="cache scores on disk and reuse them on reruns")
+    parser.add_argument("--cache-max-mb", type=int, default=CACHE_MAX_MB,
+                        help=f"size cap for --cache-dir (default {CACHE_MAX_MB})")
+    parser.add_argument("--offline", action="store_true",
+                        help="score from --cache-dir only; cache misses fail instead of calling the API")
+    parser.add_argument("--category", action="append", help="only these categories (repeatable)")
+    parser.add_argument("--forking-only", action="store_true", help="only forking rows")
+    parser.add_argument("--include-seeds", action="store_true", help="also score the seed rows")
+    parser.add_argument("--limit", type=int, help="score at most this many rows")
+    parser.add_argument("--backend", choices=["openai", "mock"], default="openai",
+                        help="'mock' answers in-process with deterministic logprobs (no key, no spend)")
+    parser.add_argument("--mock-latency-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run(args))
+    except OfflineCacheMiss as e:
+        sys.exit(f"score_logprobs: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Diverse seed examples per request from an incremental TF-IDF index.
+
+Traditional requests used to show two seeds drawn at random, and forking
+requests showed every forking_format seed. So each request anchored the
+model on the same few texts, and its outputs drifted towards near-copies
+that the quality filter and the near-duplicate screen then threw away.
+SeedSelector keeps, per category and kind (traditional / forking), a
+sparse TF-IDF vector for every original seed and accepted row. It also
+keeps a window of recent outputs: the rows accepted last and the examples
+shown to the most recent requests. Examples are picked by max-marginal
+relevance. Each pick is the candidate least similar to the recent window,
+less a penalty for similarity to the examples already picked for the same
+request. At least one pick is always an original seed, and accepted rows
+can be shown as further examples.
+
+Rows are staged as they are accepted and indexed at commit(), once per
+generation round, in id order. Every request of a round therefore sees the
+same index, so a seeded rerun sends the same requests and replays from the
+response cache.
+"""
+
+import math
+import re
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List
+
+
+_WORD = re.compile(r"[a-z0-9']+")
+KINDS = ("traditional", "forking")
+
+Vector = Dict[str, float]
+
+
+def _terms(text: str) -> Counter:
+    return Counter(_WORD.findall(text.lower()))
+
+
+def _dot(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+class _Entry:
+    __slots__ = ("example", "terms", "vector", "original", "shown")
+
+    def __init__(self, example: Dict[str, Any], original: bool):
+        self.example = example
+        self.terms = _terms(example["prompt"])
+        self.vector: Vector = {}
+        self.original = original
+        self.shown = 0
+
+
+class _Window:
+    """The last `size` vectors and their running sum, for mean similarity against all of them."""
+
+    def __init__(self, size: int):
+        self.vectors: deque = deque()
+        self.size = size
+        self.total: Vector = {}
+
+    def append(self, vector: Vector):
+        self.vectors.append(vector)
+        for term, weight in vector.items():
+            self.total[term] = self.total.get(term, 0.0) + weight
+        if len(self.vectors) > self.size:
+            for term, weight in self.vectors.popleft().items():
+                remaining = self.total[term] - weight
+                if abs(remaining) < 1e-12:
+                    del self.total[term]
+                else:
+                    self.total[term] = remaining
+
+    def mean_similarity(self, vector: Vector) -> float:
+        return _dot(vector, self.total) / len(self.vectors) if self.vectors else 0.0
+
+
+class SeedSelector:
+    """
+    Per-category seed candidates and recent outputs. register() adds a
+    category's original seeds, stage() queues accepted rows, commit() indexes
+    them, and select() picks a request's examples.
+    """
+
+    def __init__(self, diversity: float = 0.5, window: int = 64, max_candidates: int = 512):
+        self.diversity = diversity            # weight of novelty vs redundancy within a request
+        self.window = window
+        self.max_candidates = max_candidates  # accepted rows kept as candidates per kind (newest)
+        self._documents: Dict[str, int] = Counter()
+        self._df: Dict[str, Counter] = {}
+        self._originals: Dict[tuple, List[_Entry]] = {}
+        self._candidates: Dict[tuple, deque] = {}
+        self._recent: Dict[tuple, _Window] = {}
+        self._staged: Dict[str, List[Dict[str, Any]]] = {}
+
+    def has(self, category: str, kind: str) -> bool:
+        return bool(self._originals.get((category, kind)))
+
+    def register(self, category: str, kind: str, examples: Iterable[Dict[str, Any]]):
+        """Original seeds of one kind: dicts with a "prompt" (and, for forking, its pairs and indices)."""
+        entries = [_Entry(example, original=True) for example in examples if example.get("prompt")]
+        self._originals.setdefault((category, kind), []).extend(entries)
+        self._candidates.setdefault((category, kind), deque(maxlen=self.max_candidates))
+        self._recent.setdefault((category, kind), _Window(self.window))
+        self._add_documents(category, entries)
+        self._refresh(category)
+
+    def stage(self, category: str, rows: Iterable[Dict[str, Any]]):
+        if category in self._df:
+            self._staged.setdefault(category, []).extend(rows)
+
+    def commit(self, category: str):
+        """Indexes the staged rows in id order and puts them in the recent window and the candidate pool."""
+        rows = sorted(self._staged.pop(category, []), key=lambda row: row["id"])
+        if not rows:
+            return
+        entries = []
+        for row in rows:
+            kind = "forking" if row.get("is_forking") else "traditional"
+            if (category, kind) not in self._candidates:
+                continue
+            example = {"prompt": row["prompt"]}
+            if kind == "forking":
+                example.update(placeholder_pairs=row.get("placeholder_pairs"),
+                               forking_indices=row.get("forking_indices"))
+            entry = _Entry(example, original=False)
+            entries.append((kind, entry))
+        self._add_documents(category, [entry for _, entry in entries])
+        self._refresh(category)
+        for kind, entry in entries:
+            entry.vector = self._vector(category, entry.terms)
+            self._candidates[(category, kind)].append(entry)
+            self._recent[(category, kind)].append(entry.vector)
+
+    def select(self, category: str, kind: str, k: int) -> List[Dict[str, Any]]:
+        """
+        `k` examples by max-marginal relevance; the first is always an original
+        seed. The picks join the recent window, so the next request leans elsewhere.
+        """
+        key = (category, kind)
+        recent = self._recent[key]
+        candidates = self._originals[key] + list(self._candidates[key])
+        novelty = {id(entry): 1.0 - recent.mean_similarity(entry.vector) for entry in candidates}
+        chosen: List[_Entry] = []
+        for pick in range(min(k, len(candidates))):
+            pool = self._originals[key] if pick == 0 else candidates
+            best, best_score = None, -math.inf
+            for entry in pool:
+                if entry in chosen:
+                    continue
+                redundancy = max((_dot(entry.vector, other.vector) for other in chosen), default=0.0)
+                score = self.diversity * novelty[id(entry)] - (1 - self.diversity) * redundancy
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None:
+                break
+            chosen.append(best)
+        for entry in chosen:
+            entry.shown += 1
+            recent.append(entry.vector)
+        return [entry.example for entry in chosen]
+
+    def summary(self, category: str) -> Dict[str, Dict[str, int]]:
+        """Candidates and distinct examples shown per kind, split into original seeds and accepted rows."""
+        out = {}
+        for kind in KINDS:
+            originals = self._originals.get((category, kind), [])
+            rows = self._candidates.get((category, kind), ())
+            if not originals:
+                continue
+            out[kind] = {
+                "original_seeds": len(originals),
+                "row_candidates": len(rows),
+                "originals_shown": sum(1 for entry in originals if entry.shown),
+                "rows_shown": sum(1 for entry in rows if entry.shown),
+            }
+        return out
+
+    # ---- index -----------------------------------------------------------
+
+    def _add_documents(self, category: str, entries: List[_Entry]):
+        df = self._df.setdefault(category, Counter())
+        for entry in entries:
+            df.update(entry.terms.keys())
+        self._documents[category] += len(entries)
+
+    def _vector(self, category: str, terms: Counter) -> Vector:
+        df, documents = self._df[category], self._documents[category]
+        vector = {term: (1 + math.log(count)) * (math.log((1 + documents) / (1 + df[term])) + 1)
+                  for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def _refresh(self, category: str):
+        """Re-weights the category's candidates with the current document frequencies."""
+        for (cat, kind), originals in self._originals.items():
+            if cat != category:
+                continue
+            for entry in originals:
+                entry.vector = self._vector(category, entry.terms)
+            for entry in self._candidates[(cat, kind)]:
+                entry.vector = self._vector(category, entry.terms)
@@ -0,0 +1,340 @@
+"""
+Compiled, batch-oriented prompt validators.
+
+Every keyword set used by the theory-of-mind, multi-placeholder and quality
+checks is compiled once, at import, into a single trie-shaped alternation
+(see KeywordSet), and every structural pattern is precompiled.
+A prompt is lower-cased at most once per check, and only when a keyword
+check is reached, instead of once per keyword scan. The structural patterns
+run on that lower-cased text rather than with re.IGNORECASE, which is several
+times slower. Decisions are identical to the original row-by-row checks.
+"""
+
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """One alternation for `phrases` with their shared prefixes factored out ("i (?:think|believe)")."""
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class KeywordSet:
+    """
+    Literal phrases tested for containment in lower-cased text.
+
+    Phrases that contain another phrase of the set are dropped ("thinks" is
+    found whenever "think" is). The rest are compiled into one trie-shaped
+    alternation, matched in a single pass. That pass wins when every phrase
+    starts with the same literal (the regex engine then scans for the prefix)
+    or the set is large. Smaller sets keep C-level substring scans, which beat
+    the regex engine there (see bench_validators.py).
+    """
+
+    REGEX_MIN_PHRASES = 16
+
+    def __init__(self, phrases: Iterable[str]):
+        phrases = list(dict.fromkeys(phrases))
+        self.phrases = tuple(p for p in phrases if not any(q != p and q in p for q in phrases))
+        self.pattern = re.compile(_trie_pattern(self.phrases))
+        if os.path.commonprefix(self.phrases) or len(self.phrases) >= self.REGEX_MIN_PHRASES:
+            self.search = self.pattern.search
+
+    def search(self, text: str) -> Any:
+        """Truthy if `text` contains any of the phrases."""
+        return any(map(text.__contains__, self.phrases))
+
+
+def _lower_pattern(pattern: str) -> Tuple["re.Pattern", "re.Pattern"]:
+    """
+    The same pattern compiled twice: lower-cased for ASCII prompts matched on
+    their lower-cased text (same length, so match offsets carry over), and
+    with re.IGNORECASE for everything else.
+    """
+    return re.compile(pattern.lower()), re.compile(pattern, re.IGNORECASE)
+
+
+def _search(patterns: Tuple["re.Pattern", "re.Pattern"], prompt: str, lowered: str, ascii_only: bool):
+    return patterns[0].search(lowered) if ascii_only else patterns[1].search(prompt)
+
+
+# ---- theory_of_mind (validate_and_fix_theory_of_mind_prompt) ----------------
+
+TOM_FIRST_PERSON = KeywordSet(["i ", "me ", "my ", "i'm ", "i've ", "i'll "])
+TOM_SECOND_PERSON = KeywordSet(["you ", "your ", "you're ", "you've ", "you'll "])
+TOM_BELIEF_FIRST = KeywordSet(["i think", "i believe", "i assume", "i expect", "i search", "i look for"])
+TOM_BELIEF_SECOND = KeywordSet(["you think", "you believe", "you assume", "you expect", "you search", "you look for"])
+TOM_BELIEF_THIRD = KeywordSet(["thinks", "believes", "assumes", "expects", "doesn't know", "searches", "looks for"])
+
+TOM_MOVE_FIRST = _lower_pattern(
+    r"(moved it to|placed it (?:on|in|under|behind)|relocated it to|moved the .+? to|put .+? (?:on|in|under|behind)) the")
+TOM_BELIEF_AT_FIRST = _lower_pattern(
+    r"(I (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the")
+TOM_MOVE_SECOND = _lower_pattern(
+    r"(moved (?:it|them|your .+?) to|placed (?:it|them|your .+?) (?:on|in|under|behind)|relocated (?:it|them|your .+?) to|put (?:it|them|your .+?) (?:on|in|under|behind)) the")
+TOM_BELIEF_AT_SECOND = _lower_pattern(
+    r"(you (?:think|believe|assume|expect|search|look for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the")
+TOM_MOVE_THIRD = _lower_pattern(
+    r"(puts (?:it|the .+?) (?:on|in|under|behind|inside)|moves (?:it|the .+?) to|places (?:it|the .+?) (?:on|in|under|behind)) the")
+TOM_BELIEF_AT_THIRD = _lower_pattern(
+    r"((?:thinks|believes|expects|assumes|searches|looks for|looked for)(?:.+?)(?:on|in|under|behind|inside)) the")
+
+# Generic fallbacks, tried in order (the first pattern that matches wins)
+TOM_LOCATION_FALLBACKS = [_lower_pattern(p) for p in [
+    r"(?:on|in|under|behind|inside) the",
+    r"moved to the",
+    r"placed on the",
+    r"put in the",
+]]
+TOM_BELIEF_FALLBACKS = [_lower_pattern(p) for p in [
+    r"think(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+    r"believe(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+    r"expect(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+    r"assume(?:s)?(?: that)?(?: the)?(?: [\w\s]+)? (?:is|are|was|were) (?:on|in|under|behind|inside) the",
+    r"look(?:s|ed)? for(?: the)?(?: [\w\s]+)? (?:on|in|under|behind|inside) the",
+]]
+
+# ---- multi-placeholder (validate_multi_placeholder_prompt) --------------------
+
+CATEGORY_PLACEHOLDER_RANGES = {
+    "theory_of_mind": (2, 4),        # 2-4 placeholders for ToM
+    "counterfactual": (3, 3),
+    "goal_representation": (2, 3),
+    "situational_awareness": (3, 3),
+    "safety_alignment": (3, 3),
+    "factual_recall": (3, 3),
+    "metaphorical_interpretation": (3, 3),
+}
+
+MULTI_TOM_BELIEF = KeywordSet(["think", "believe", "assume", "expect", "doesn't know", "doesn't realize",
+                            "not aware", "unaware", "search", "look for", "thought", "believed", "thinks",
+                            "assumes", "believes", "sure", "expects", "convinced"])
+MULTI_TOM_PEOPLE = KeywordSet(["left", "away", "return", "comes back", "came back", "enters", "outside",
+                            "gone", "leaves", "walking", "steps"])
+MULTI_TOM_ACTION = KeywordSet(["put", "place", "move", "take", "relocated", "removes", "carry", "hide",
+                            "hides", "placed", "puts", "moves", "hid", "shifted"])
+MULTI_TOM_LOCATION = KeywordSet(["on the", "in the", "under the", "beside the", "near the", "at the",
+                              "behind the", "inside the", "off the"])
+MULTI_TOM_MOVEMENT = KeywordSet(["from the", "to the", "onto the", "into the", "out of the"])
+
+COUNTERFACTUAL_CONDITIONAL = KeywordSet(["if", "would", "could", "might", "had", "were", "without", "instead",
+                                      "rather", "otherwise", "alternatively", "contrary", "scenario",
+                                      "hypothetical"])
+
+METAPHOR_EXPLICIT = KeywordSet(["like", "as", "resembling", "akin to", "similar to", "compared to",
+                             "mirrors", "echoes", "reflects", "metaphor", "symbolizes", "represents"])
+METAPHOR_IMPLICIT = KeywordSet(["facade", "mask", "beneath the surface", "symphony", "dance", "journey", "path",
+                             "storm", "seeds", "roots", "branches", "ocean", "river", "mountain", "bridge",
+                             "door", "window", "wall", "shadow", "light", "fire", "ice", "garden", "desert",
+                             "heart", "soul", "spirit", "ghost", "skeleton"])
+METAPHOR_VERBS = KeywordSet(["illuminate", "shine", "burn", "freeze", "grow", "wither", "soar", "plummet",
+                          "blossom", "wilt", "flow", "cascade", "crumble", "shatter", "mend", "heal"])
+METAPHOR_SCENARIOS = KeywordSet(["faced with", "deep down", "beneath", "inside", "heart"])
+
+# ---- quality filter (filter_prompt_quality) ----------------------------------
+
+MIN_WORDS = {
+    "factual_recall": 5,
+    "safety_alignment": 10,
+    "metaphorical_interpretation": 8,
+}
+DEFAULT_MIN_WORDS = 20
+GOOD_ENDINGS = tuple("?.:!{}")
+QUALITY_METAPHOR_INDICATORS = KeywordSet(["like", "as", "resembling", "akin to", "similar to",
+                                       "compared to", "mirrors", "echoes", "reflects"])
+
+# Categories whose non-forking rows have a keyword or placement check (see check_content)
+CONTENT_CHECKED = frozenset({"theory_of_mind", "metaphorical_interpretation"})
+
+# Rejection reasons reported by check_quality / validate_many
+TOO_SHORT = "too_short"
+BAD_ENDING = "bad_ending"
+TOO_MANY_ELLIPSES = "too_many_ellipses"
+INVALID_TOM_FORMAT = "invalid_tom_format"
+INVALID_FORKING_FORMAT = "invalid_forking_format"
+MISSING_FORKING_INDICES = "missing_forking_indices"
+
+
+def validate_tom(prompt: str, lowered: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Validates and fixes a theory_of_mind prompt (first/second/third person).
+    Returns (fixed_prompt, is_valid).
+    """
+    if not prompt:
+        return prompt, False
+    if prompt.count("{}") == 2:
+        return prompt, True
+
+    lowered = prompt.lower() if lowered is None else lowered
+    is_first_person = TOM_FIRST_PERSON.search(lowered)
+    is_second_person = TOM_SECOND_PERSON.search(lowered)
+
+    if is_first_person:
+        belief, move_pattern, belief_pattern = TOM_BELIEF_FIRST, TOM_MOVE_FIRST, TOM_BELIEF_AT_FIRST
+    elif is_second_person:
+        belief, move_pattern, belief_pattern = TOM_BELIEF_SECOND, TOM_MOVE_SECOND, TOM_BELIEF_AT_SECOND
+    else:
+        belief, move_pattern, belief_pattern = TOM_BELIEF_THIRD, TOM_MOVE_THIRD, TOM_BELIEF_AT_THIRD
+
+    if not belief.search(lowered):
+        return prompt, False
+
+    ascii_only = prompt.isascii()
+    first_match = _search(move_pattern, prompt, lowered, ascii_only)
+    second_match = _search(belief_pattern, prompt, lowered, ascii_only)
+
+    if not first_match or not second_match:
+        if not first_match:
+            for pattern in TOM_LOCATION_FALLBACKS:
+                first_match = _search(pattern, prompt, lowered, ascii_only)
+                if first_match:
+                    break
+        if not second_match:
+            for pattern in TOM_BELIEF_FALLBACKS:
+                second_match = _search(pattern, prompt, lowered, ascii_only)
+                if second_match:
+                    break
+
+    if not first_match or not second_match:
+        return prompt, False
+
+    # Insert a placeholder after each matched phrase
+    first_pos = first_match.end()
+    second_pos = second_match.end()
+    parts = [prompt[:first_pos], " {} ", prompt[first_pos:second_pos], " {} "]
+    if second_pos < len(prompt):
+        parts.append(prompt[second_pos:])
+
+    fixed_prompt = "".join(parts).replace("{} {}", "{}")
+    if fixed_prompt.count("{}") != 2:
+        return prompt, False
+    return fixed_prompt, True
+
+
+def validate_multi(prompt: str, category: str, expected_count: Optional[int] = None,
+                   lowered: Optional[str] = None) -> Tuple[str, bool, int]:
+    """
+    Validates a prompt with multiple placeholders.
+    Returns (prompt, is_valid, placeholder_count).
+    """
+    if not prompt:
+        return prompt, False, 0
+
+    if category == "theory_of_mind" and "?" in prompt:
+        # Trailing questions in ToM prompts do not carry placeholders
+        placeholder_count = prompt.split("?", 1)[0].count("{}")
+    else:
+        placeholder_count = prompt.count("{}")
+    if placeholder_count == 0:
+        return prompt, False, placeholder_count
+
+    bounds = CATEGORY_PLACEHOLDER_RANGES.get(category)
+    if bounds is not None:
+        if not (bounds[0] <= placeholder_count <= bounds[1]) and placeholder_count != expected_count:
+            return prompt, False, placeholder_count
+    elif expected_count is not None and placeholder_count != expected_count:
+        return prompt, False, placeholder_count
+
+    lowered = prompt.lower() if lowered is None else lowered
+    if category == "theory_of_mind":
+        has_people = MULTI_TOM_PEOPLE.search(lowered)
+        if not ((MULTI_TOM_BELIEF.search(lowered) and MULTI_TOM_LOCATION.search(lowered))
+                or (MULTI_TOM_MOVEMENT.search(lowered) and has_people)):
+            if not (MULTI_TOM_ACTION.search(lowered) and has_people):
+                return prompt, False, placeholder_count
+
+    elif category == "counterfactual":
+        if not COUNTERFACTUAL_CONDITIONAL.search(lowered):
+            return prompt, False, placeholder_count
+
+    elif category == "metaphorical_interpretation":
+        # An explicit indicator counts only if the prompt has a non-empty sentence
+        has_explicit = lowered.strip(".") != "" and METAPHOR_EXPLICIT.search(lowered)
+        if not (has_explicit or METAPHOR_IMPLICIT.search(lowered) or METAPHOR_VERBS.search(lowered)):
+            if not METAPHOR_SCENARIOS.search(lowered):
+                return prompt, False, placeholder_count
+
+    return prompt, True, placeholder_count
+
+
+def check_quality(row: Dict[str, Any], lowered: Optional[str] = None) -> Optional[str]:
+    """Returns the rejection reason for a row, or None if it meets the quality standards."""
+    prompt = row["prompt"]
+    category = row["category"]
+
+    # Word-count check without splitting the whole prompt
+    min_words = MIN_WORDS.get(category, DEFAULT_MIN_WORDS)
+    if len(prompt.split(None, min_words)) < min_words:
+        return TOO_SHORT
+    if not prompt.endswith(GOOD_ENDINGS):
+        return BAD_ENDING
+    if prompt.count("...") > 2:
+        return TOO_MANY_ELLIPSES
+
+    return check_content(prompt, category, row.get("is_forking", False), "forking_indices" in row, lowered)
+
+
+def check_content(prompt: str, category: str, is_forking: bool, has_forking_indices: bool,
+                  lowered: Optional[str] = None) -> Optional[str]:
+    """The keyword and placeholder checks of check_quality, for rows that passed the length/ending checks."""
+    if category == "metaphorical_interpretation":
+        lowered = prompt.lower() if lowered is None else lowered
+        if QUALITY_METAPHOR_INDICATORS.search(lowered):
+            return None
+
+    if category == "theory_of_mind" and not is_forking:
+        if not validate_tom(prompt, lowered)[1]:
+            return INVALID_TOM_FORMAT
+
+    if is_forking:
+        if not validate_multi(prompt, category, lowered=lowered)[1]:
+            return INVALID_FORKING_FORMAT
+        if not has_forking_indices:
+            return MISSING_FORKING_INDICES
+
+    return None
+
+
+def validate_many(rows: Iterable[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Quality-checks a batch of rows. Returns one reason (or None) per row.
+
+    The length, ending and ellipsis checks are inlined in one loop over the
+    batch, and check_content runs only for forking rows and CONTENT_CHECKED
+    categories, the only rows it can reject.
+    """
+    reasons: List[Optional[str]] = []
+    append = reasons.append
+    min_words_for = MIN_WORDS.get
+    for row in rows:
+        prompt = row["prompt"]
+        category = row["category"]
+        min_words = min_words_for(category, DEFAULT_MIN_WORDS)
+        if len(prompt.split(None, min_words)) < min_words:
+            append(TOO_SHORT)
+        elif not prompt.endswith(GOOD_ENDINGS):
+            append(BAD_ENDING)
+        elif prompt.count("...") > 2:
+            append(TOO_MANY_ELLIPSES)
+        else:
+            is_forking = row.get("is_forking", False)
+            if is_forking or category in CONTENT_CHECKED:
+                append(check_content(prompt, category, is_forking, "forking_indices" in row))
+            else:
+                append(None)
+    return reasons
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from batch_tuner import BatchTuner
+
+KEY = ("counterfactual", "gpt-4.1", "traditional")
+
+
+def run_rounds(tuner, accepted_for, rounds=12, prompt_tokens=500, tokens_per_item=100):
+    sizes = []
+    for _ in range(rounds):
+        n = tuner.batch_size(*KEY)
+        sizes.append(n)
+        for _ in range(2):
+            usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=tokens_per_item * n)
+            tuner.record_response(*KEY, n, usage, "stop", n, latency_s=1.0)
+            tuner.record_accepted(*KEY, n, accepted_for(n))
+        tuner.update(KEY[0])
+    return sizes
+
+
+def test_batch_size_grows_while_rows_per_token_improve():
+    tuner = BatchTuner(initial_batch_size=4, max_batch_size=8)
+    sizes = run_rounds(tuner, lambda n: n)
+    assert sizes[0] == 4 and sizes[-1] == 8
+    assert sizes == sorted(sizes)
+
+
+def test_batch_size_falls_back_to_most_efficient_size():
+    # Past 5 items the extra rows are mostly rejected: fewer accepted rows per token
+    tuner = BatchTuner(initial_batch_size=4, max_batch_size=8)
+    sizes = run_rounds(tuner, lambda n: n if n <= 5 else 4, rounds=16)
+    assert 6 in sizes
+    assert sizes[-6:] == [5] * 6
+    summary = tuner.summary()["|".join(KEY)]
+    assert summary["batch_size"] == 5 and summary["accepted_per_request_s"] is not None
+
+
+def test_max_tokens_follows_observed_tokens_per_item():
+    tuner = BatchTuner(initial_batch_size=4, headroom=1.0)
+    assert tuner.max_tokens(*KEY, 4) == 2048
+    tuner.record_response(*KEY, 4, SimpleNamespace(prompt_tokens=0, completion_tokens=800), "stop", 4)
+    tuner.update(KEY[0])
+    assert tuner.max_tokens(*KEY, 4) == 4 * 200 + 32
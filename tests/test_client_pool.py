@@ -0,0 +1,26 @@
+import asyncio
+
+import httpx
+
+from client_pool import ConnectionStats
+
+
+def test_stats_unavailable_without_connection_events():
+    stats = ConnectionStats()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+
+    async def send():
+        async with httpx.AsyncClient(transport=transport, event_hooks={"request": [stats.on_request]}) as client:
+            await client.get("https://example.test/")
+
+    asyncio.run(send())
+    assert stats.as_dict() == {"requests": 1, "connections": "unavailable (transport reports no connection events)"}
+
+
+def test_stats_count_connection_events():
+    stats = ConnectionStats()
+    stats.requests = 3
+    for event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+        asyncio.run(stats._trace(event, {}))
+    assert stats.as_dict() == {"requests": 3, "connections_opened": 1, "tls_handshakes": 1, "http2_connections": 0,
+                               "reused_requests": 2, "reuse_ratio": 0.667}
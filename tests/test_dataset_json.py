@@ -0,0 +1,53 @@
+import json
+from collections import Counter
+
+from generate_prompts import category_record, write_dataset_json
+from row_store import RowStore
+
+SEEDS = [{"id": "s1", "prompt": "Seed {}.", "model_used": "original_seed"},
+         {"id": "s2", "prompt": "Seed {} or {}.", "model_used": "original_seed_forking", "is_forking": True,
+          "placeholder_pairs": [["a", "b"]], "forking_indices": None}]
+GENERATED = [
+    {"id": "g1", "prompt": "Gen {}.", "answer_true": "x", "answer_false": "y"},
+    {"id": "g2", "prompt": "Gen {} then {}.", "is_forking": True, "placeholder_pairs": [["c", "d"], ["e", "f"]],
+     "forking_indices": [1], "answer_true": "e", "answer_false": "f"},
+    {"id": "g3", "prompt": "Gen {} only.", "is_forking": True, "answer_true": "p"},
+]
+CFG = {"name_pairs": [["n", "m"]], "description": "test"}
+
+
+def test_write_dataset_json_matches_json_dump(tmp_path):
+    dataset = {
+        "counterfactual": {"prompt_format": ["If it had rained,\nthe {} would flood."], "name_pairs": [["a", "b"]],
+                           "_rows": [{"id": "1", "prompt": "Café {}", "placeholder_pairs": [["x", "y"]]}],
+                           "metadata": {"prompt_count": 1, "models_used": []}},
+        "factual_recall": {"prompt_format": [], "_rows": [], "metadata": {"prompt_count": 0}},
+    }
+    path = tmp_path / "dataset.json"
+    metadata = write_dataset_json(str(path), iter(dataset.items()))
+
+    assert path.read_text(encoding="utf-8") == json.dumps(dataset, indent=2, ensure_ascii=False)
+    assert metadata == {cat: data["metadata"] for cat, data in dataset.items()}
+
+
+def test_write_dataset_json_empty(tmp_path):
+    path = tmp_path / "dataset.json"
+    assert write_dataset_json(str(path), []) == {}
+    assert json.loads(path.read_text(encoding="utf-8")) == {}
+
+
+def test_category_record_from_store_columns(tmp_path):
+    record = category_record("counterfactual", CFG, SEEDS, RowStore(GENERATED), Counter(), Counter(), min_required=1)
+    assert record["prompt_format"] == ["Seed {}.", "Gen {}."]
+    assert record["forking_format"] == ["Seed {} or {}.", "Gen {} then {}.", "Gen {} only."]
+    assert record["forking_placeholder_pairs"] == [[["a", "b"]], [["c", "d"], ["e", "f"]]]
+    assert record["forking_indices"] == [None, [1]]
+    assert record["name_pairs"] == [["n", "m"], ("x", "y"), ("e", "f")]
+    assert list(record["_rows"]) == SEEDS + GENERATED
+    meta = record["metadata"]
+    assert (meta["prompt_count"], meta["generated_count"], meta["traditional_count"], meta["forking_count"]) == (5, 3, 2, 3)
+
+    path = tmp_path / "dataset.json"
+    write_dataset_json(str(path), [("counterfactual", record)])
+    expected = {"counterfactual": dict(record, _rows=SEEDS + GENERATED)}
+    assert path.read_text(encoding="utf-8") == json.dumps(expected, indent=2, ensure_ascii=False)
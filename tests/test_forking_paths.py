@@ -0,0 +1,62 @@
+import pytest
+
+from forking_paths import ForkingTemplate, expand_rows
+
+
+def forking_row(**fields):
+    row = {"id": "f1", "prompt": "A {} b {} c {}.", "is_forking": True,
+           "placeholder_pairs": [["x", "y"], ["p", "q"], ["t", "f"]], "forking_indices": [1]}
+    row.update(fields)
+    return row
+
+
+def test_variants_are_every_filling_in_choice_order():
+    template = ForkingTemplate.from_row(forking_row())
+    texts = [variant.text for variant in template.variants()]
+    assert template.variant_count == len(texts) == 8
+    assert texts[0] == "A x b p c t." and texts[-1] == "A y b q c f."
+
+
+def test_spans_cover_the_filled_options():
+    variant = ForkingTemplate.from_row(forking_row()).fill((1, 0, 1))
+    assert [variant.text[start:end] for start, end in variant.spans] == ["y", "p", "f"]
+
+
+def test_other_braces_are_left_alone():
+    template = ForkingTemplate("{x} and {}", [["a", "b"]])
+    assert template.fill((1,)).text == "{x} and b"
+
+
+def test_traditional_row_forks_on_its_last_placeholder():
+    row = {"id": "t1", "prompt": "moved to the {}. thinks it is on the {}", "answer_true": "box", "answer_false": "bin"}
+    template = ForkingTemplate.from_row(row)
+    assert template.options == [("bin",), ("box", "bin")]
+    assert template.critical_index == 1
+
+
+def test_fork_points_share_the_prefix_before_the_critical_placeholder():
+    template = ForkingTemplate.from_row(forking_row())
+    points = list(template.fork_points())
+    assert [node.prefix() for node, _ in points] == ["A x b ", "A y b "]
+    assert [[branch.choices[-1] for branch in branches] for _, branches in points] == [[0, 1], [0, 1]]
+
+
+def test_leaves_match_variants():
+    template = ForkingTemplate.from_row(forking_row())
+    assert [leaf.prefix() for leaf in template.trie().leaves()] == [v.text for v in template.variants()]
+
+
+@pytest.mark.parametrize("pairs", [[["x", "y"], "pq", ["t", "f"]], [["x", "y"], None, ["t", "f"]],
+                                   [["x", "y"], [None], ["t", "f"]], [["x", "y"], ["t", "f"]]])
+def test_malformed_pairs_are_rejected(pairs):
+    with pytest.raises(ValueError):
+        ForkingTemplate.from_row(forking_row(placeholder_pairs=pairs))
+
+
+def test_expand_rows_skips_unusable_rows_and_batches():
+    rows = [forking_row(), forking_row(id="bad", placeholder_pairs=[["x", "y"], "pq", ["t", "f"]]),
+            {"id": "t1", "prompt": "on the {}", "answer_true": "a", "answer_false": "b"}]
+    batches = list(expand_rows(rows, 3))
+    flat = [row_id for batch in batches for row_id, _ in batch]
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert flat.count("f1") == 8 and flat.count("t1") == 2 and "bad" not in flat
@@ -0,0 +1,35 @@
+import json
+
+from json_salvage import ItemStreamParser, salvage_items
+
+ITEMS = [{"prompt": "Sam said \"hi, {}\" [twice]", "answer_true": "a"}, {"prompt": "B", "nested": {"x": [1, 2]}},
+         "plain", 3, None]
+
+
+def test_complete_response():
+    content = json.dumps({"results": ITEMS})
+    assert salvage_items(content) == (ITEMS, True)
+    assert salvage_items(json.dumps(ITEMS)) == (ITEMS, True)
+
+
+def test_truncated_response_keeps_complete_items():
+    content = json.dumps({"results": ITEMS[:2] + [{"prompt": "cut off"}]})
+    assert salvage_items(content[:-10]) == (ITEMS[:2], False)
+    assert salvage_items('{"note": "no items yet"') == ([], False)
+
+
+def test_streamed_chunks_match_whole_text():
+    content = "Here you go:\n" + json.dumps({"data": ITEMS}, indent=2)
+    parser = ItemStreamParser()
+    streamed = []
+    for i in range(0, len(content), 7):
+        streamed.extend(parser.feed(content[i:i + 7]))
+    assert streamed == ITEMS and parser.done
+    assert parser.items == len(ITEMS) and parser.invalid == 0
+
+
+def test_invalid_element_is_counted_and_skipped():
+    parser = ItemStreamParser()
+    assert parser.feed('{"results": [{"prompt": "A"}, {"prompt": nope}, {"prompt": "C"}]}') == [
+        {"prompt": "A"}, {"prompt": "C"}]
+    assert parser.invalid == 1 and parser.done
@@ -0,0 +1,82 @@
+import json
+from collections import Counter
+
+import pytest
+
+import generate_prompts
+from merge_shards import merge_shards
+
+SEED = {"id": "seed", "prompt": "If it had rained, the {} would have flooded.", "model_used": "original_seed"}
+
+
+def row(row_id, prompt):
+    return {"id": row_id, "prompt": prompt, "model_used": "gpt-test", "category": "counterfactual"}
+
+
+def write_shard(tmp_path, index, rows, **metadata):
+    cfg = generate_prompts.CATEGORIES["counterfactual"]
+    entry = generate_prompts.category_record(
+        "counterfactual", cfg, [SEED], rows, Counter(), Counter(),
+        min_required=1, run_metadata={"shard": f"{index}/2", "run_min_required": 4, **metadata})
+    path = tmp_path / f"run.shard{index}of2.json"
+    generate_prompts.write_dataset_json(str(path), [("counterfactual", entry)])
+    return str(path)
+
+
+def materialized(dataset):
+    return {cat: dict(entry, _rows=list(entry["_rows"])) for cat, entry in dataset.items()}
+
+
+def strata(target, filled):
+    return {"target": target, "filled": filled, "unclassified": 0, "cells": 4, "cells_full": 1,
+            "shortfall": target - filled, "requested": filled,
+            "complexity": {"low": {"target": target, "filled": filled}}}
+
+
+def test_merge_is_ordered_and_drops_duplicates(tmp_path):
+    shared = "If the bridge had held, the {} would have crossed before the storm reached the town."
+    paths = [
+        write_shard(tmp_path, 1, [row("b1", shared), row("b2", "Had Sam left earlier, the {} would have been "
+                                                                  "caught by the night train to the coast.")],
+                    strata=strata(3, 2), request_tuning={"gpt-test|stream": {"batch_size": 6}}),
+        write_shard(tmp_path, 0, [row("a1", shared), row("a2", "Without the map, the {} would have wandered "
+                                                                 "for days in the hills above the lake.")],
+                    strata=strata(3, 3), seed_examples={"traditional": {"original_seeds": 1}}),
+    ]
+    merged = merge_shards(paths)
+    entry = merged["counterfactual"]
+    assert [r["id"] for r in entry["_rows"]] == ["seed", "a1", "a2", "b2"]
+    meta = entry["metadata"]
+    assert meta["merged_shards"] == ["0/2", "1/2"]
+    assert meta["merge_exact_duplicates"] == 1
+    assert meta["strata"] == {"cells": 4, "target": 6, "filled": 5, "unclassified": 0, "shortfall": 1,
+                              "requested": 5, "complexity": {"low": {"target": 6, "filled": 5}}}
+    assert meta["request_tuning"] == {"1/2": {"gpt-test|stream": {"batch_size": 6}}}
+    assert meta["seed_examples"] == {"0/2": {"traditional": {"original_seeds": 1}}}
+    assert materialized(merge_shards(list(reversed(paths)))) == materialized(merged)
+
+
+def test_merge_rejects_repeated_shards(tmp_path):
+    path = write_shard(tmp_path, 0, [])
+    with pytest.raises(ValueError, match="more than once"):
+        merge_shards([path, path])
+
+
+def test_merge_uses_the_shards_minimum(tmp_path):
+    paths = [write_shard(tmp_path, 0, [row("a1", "Had the ferry run, the {} would have reached the island.")]),
+             write_shard(tmp_path, 1, [])]
+    assert merge_shards(paths)["counterfactual"]["metadata"]["meets_minimum_requirement"] is False
+    assert merge_shards(paths, min_required=2)["counterfactual"]["metadata"]["meets_minimum_requirement"] is True
+
+    other = json.loads(open(paths[1], encoding="utf-8").read())
+    other["counterfactual"]["metadata"]["run_min_required"] = 9
+    (tmp_path / "other.json").write_text(json.dumps(other), encoding="utf-8")
+    with pytest.raises(ValueError, match="different minimums"):
+        merge_shards([paths[0], str(tmp_path / "other.json")])
+
+
+def test_merge_rejects_files_that_are_not_datasets(tmp_path):
+    summary = tmp_path / "run.summary.json"
+    summary.write_text(json.dumps({"elapsed_s": 1.5, "throughput": {}}), encoding="utf-8")
+    with pytest.raises(ValueError, match="is not a dataset file"):
+        merge_shards([write_shard(tmp_path, 0, []), str(summary)])
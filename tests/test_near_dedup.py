@@ -0,0 +1,26 @@
+from near_dedup import MinHashLSH, shingles
+
+
+def test_shingles():
+    assert shingles("Sam moved the {} to the basket.") == {
+        "sam moved the", "moved the {}", "the {} to", "{} to the", "to the basket"}
+    assert shingles("Two words", size=3) == {"two words"}
+    assert shingles("...") == set()
+
+
+def test_check_and_add_flags_near_duplicates_only():
+    index = MinHashLSH(threshold=0.5)
+    base = "Anna puts the cat on the sofa and leaves the room before Ben moves it to the basket."
+    assert index.check_and_add("a", base) is None
+    key, score = index.check_and_add("b", base.replace("room", "house"))
+    assert key == "a" and 0.5 <= score <= 1.0
+    assert index.check_and_add("c", "A completely different prompt about the weather in the valley.") is None
+    assert len(index) == 2
+
+
+def test_query_breaks_ties_by_key():
+    index = MinHashLSH(threshold=0.8)
+    sig = index.signature("If Sam had acted last year the town would have flooded before spring.")
+    for key in ("m", "b", "z"):
+        index.insert(key, sig)
+    assert index.query(sig) == ("b", 1.0)
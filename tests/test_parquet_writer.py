@@ -0,0 +1,34 @@
+import pyarrow.parquet as pq
+
+from parquet_writer import StreamingParquetWriter, rows_to_table, table_to_rows
+
+
+def make_row(**fields):
+    row = {"id": "r1", "category": "counterfactual", "model_used": "m", "prompt": "A {} and {}.",
+           "is_forking": True, "created_utc": "2026-01-01T00:00:00+00:00"}
+    row.update(fields)
+    return row
+
+
+def test_round_trip_keeps_fields():
+    row = make_row(placeholder_pairs=[["a", "b"], ["c", "d"]], forking_indices=[1], reasoning_depth="3")
+    [back] = table_to_rows(rows_to_table([row]))
+    assert back["placeholder_pairs"] == [["a", "b"], ["c", "d"]]
+    assert back["forking_indices"] == [1]
+    assert back["reasoning_depth"] == 3
+    assert back["created_utc"] == "2026-01-01T00:00:00+00:00"
+
+
+def test_malformed_placeholder_pairs_are_coerced_not_raised():
+    table = rows_to_table([make_row(placeholder_pairs=[["a", "b"], None, "cd", [1, None]])])
+    assert table.column("placeholder_pairs").to_pylist() == [[["a", "b"], [], ["cd"], ["1", None]]]
+    assert rows_to_table([make_row(placeholder_pairs="not a list")]).column("placeholder_pairs").to_pylist() == [None]
+
+
+def test_streaming_writer_flush_survives_bad_rows(tmp_path):
+    path = str(tmp_path / "rows.parquet")
+    writer = StreamingParquetWriter(path, flush_rows=2)
+    writer.write("counterfactual", [make_row(id="a", placeholder_pairs=[["a", "b"], None, ["c", "d"]]),
+                                    make_row(id="b", placeholder_pairs=[["a", "b"]])])
+    writer.close()
+    assert pq.read_table(path).num_rows == 2
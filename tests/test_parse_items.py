@@ -0,0 +1,44 @@
+import pytest
+
+import generate_prompts
+from generate_prompts import parse_forking_items, valid_placeholder_pair
+
+PROMPT = "At the library, Sam {} and then {}. It was clearly a case of {}."
+
+
+def item(pairs):
+    return {"prompt": PROMPT, "placeholder_pairs": pairs, "forking_index": 1}
+
+
+def test_valid_placeholder_pair():
+    assert valid_placeholder_pair(["a", "b"])
+    assert valid_placeholder_pair(["a", 2, 3.5])
+    assert not valid_placeholder_pair(None)
+    assert not valid_placeholder_pair("ab")
+    assert not valid_placeholder_pair(["a"])
+    assert not valid_placeholder_pair(["a", None])
+    assert not valid_placeholder_pair(["a", ["b"]])
+
+
+def test_parse_forking_items_rejects_any_bad_pair(monkeypatch):
+    monkeypatch.setattr(generate_prompts, "validate_multi_placeholder_prompt", lambda p, c, n: (p, True, ""))
+    good = item([["hesitates", "hurries"], ["early", "late"], ["drought", "flooding"]])
+    bad = [item([["a", "b"], None, ["c", "d"]]),
+           item([["a", "b"], "cd", ["c", "d"]]),
+           item([["a", "b"], ["c"], ["e", "f"]])]
+    rows = parse_forking_items("goal_representation", "mock", [good] + bad)
+    assert [row["placeholder_pairs"] for row in rows] == [good["placeholder_pairs"]]
+    assert rows[0]["answer_true"] == "drought" and rows[0]["answer_false"] == "flooding"
+
+
+def test_parse_forking_items_stringifies_options(monkeypatch):
+    monkeypatch.setattr(generate_prompts, "validate_multi_placeholder_prompt", lambda p, c, n: (p, True, ""))
+    rows = parse_forking_items("goal_representation", "mock", [item([["a", "b"], [3, 4.5], ["c", "d"]])])
+    assert rows[0]["placeholder_pairs"] == [["a", "b"], ["3", "4.5"], ["c", "d"]]
+
+
+def test_target_per_category_must_be_positive():
+    assert generate_prompts.parse_args(["--target-per-category", "20"]).target_per_category == 20
+    for value in ("0", "-5", "x"):
+        with pytest.raises(SystemExit):
+            generate_prompts.parse_args(["--target-per-category", value])
@@ -0,0 +1,27 @@
+from quota_scheduler import apportion
+
+
+def test_apportion_sums_to_total():
+    weights = {"a": 0.5, "b": 0.3, "c": 0.2}
+    for total in range(0, 50):
+        parts = apportion(total, weights)
+        assert sum(parts.values()) == total
+        assert all(abs(parts[key] - total * weight) < 1 for key, weight in weights.items())
+
+
+def test_apportion_largest_remainder():
+    assert apportion(10, {"a": 2, "b": 1, "c": 1}) == {"a": 5, "b": 3, "c": 2}
+    assert apportion(7, {"a": 0.6, "b": 0.3, "c": 0.1}) == {"a": 4, "b": 2, "c": 1}
+
+
+def test_apportion_ties_rotate_with_start():
+    weights = {"a": 1, "b": 1, "c": 1}
+    assert apportion(1, weights) == {"a": 1, "b": 0, "c": 0}
+    assert apportion(1, weights, start=1) == {"a": 0, "b": 1, "c": 0}
+    assert apportion(2, weights, start=2) == {"a": 1, "b": 0, "c": 1}
+
+
+def test_apportion_degenerate():
+    assert apportion(0, {"a": 1}) == {"a": 0}
+    assert apportion(5, {"a": 0, "b": 0}) == {"a": 0, "b": 0}
+    assert apportion(-3, {"a": 1}) == {"a": 0}
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import ModelRateLimiter, RateLimiterRegistry, TokenBucket, parse_reset_duration, retry_after_seconds
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("20ms", 0.02), ("1.5s", 1.5), ("6m0s", 360.0), ("1h2m", 3720.0), ("2", 2.0),
+    (None, None), ("", None), ("soon", None),
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after_seconds({"x-ratelimit-reset-tokens": "3s"}) == 3.0
+    assert retry_after_seconds({}) is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # More than the whole bucket only waits for a full one
+    assert bucket.wait_time(600) == pytest.approx(60.0, abs=0.1)
+    bucket.clamp(0)
+    bucket.give_back(30)
+    assert bucket.level == pytest.approx(30, abs=0.1)
+
+
+def test_aimd_window():
+    limiter = ModelRateLimiter("m", rpm=1000, tpm=1_000_000, initial_concurrency=4, max_concurrency=8)
+
+    async def drive():
+        for _ in range(4):
+            await limiter.on_success()
+        assert limiter.limit == 5
+        await limiter.on_rate_limited({"retry-after-ms": "1"})
+        assert limiter.limit == 2
+        # A second 429 inside the cooldown does not halve again
+        await limiter.on_rate_limited({"retry-after-ms": "1"})
+        assert limiter.limit == 2
+        await limiter.acquire(100)
+        await limiter.release(100, used_tokens=40)
+
+    asyncio.run(drive())
+    assert limiter.stats == {"requests": 1, "rate_limited": 2, "decreases": 1, "peak_concurrency": 5}
+    assert limiter.in_flight == 0
+
+
+def test_headers_lower_the_budget_and_hold_back_growth():
+    limiter = ModelRateLimiter("m", rpm=1000, tpm=1_000_000, initial_concurrency=4)
+    asyncio.run(limiter.on_success({"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "5"}))
+    assert limiter.requests.capacity == 100 and limiter.requests.level <= 5
+    assert limiter.limit == 4
+
+
+def test_registry_shares_one_limiter_per_model():
+    registry = RateLimiterRegistry({"a": {"rpm": 10, "tpm": 100}}, {"rpm": 1, "tpm": 1}, max_concurrency=3)
+    assert registry.get("a") is registry.get("a")
+    assert registry.get("a").requests.capacity == 10 and registry.get("b").tokens.capacity == 1
+    assert set(registry.summary()) == {"a", "b"}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pyarrow.parquet as pq
+
+from mock_backend import MockConfig, MockLLMTransport
+from client_pool import ClientManager
+from rate_limiter import ModelRateLimiter
+from score_logprobs import (LogprobScorer, continuation_logprob, row_continuations, score_rows,
+                            split_context, write_scores)
+
+
+def result(row_id, model, margin=1.0, category="counterfactual"):
+    return {"id": row_id, "category": category, "is_forking": False, "model": model, "forking_index": 0,
+            "fork_points": 1, "logprobs": [[-1.0, -1.0 - margin]], "tokens": [[1, 1]],
+            "margin_mean": margin, "margin_min": margin, "first_preferred": 1.0, "scored_utc": "t"}
+
+
+def test_partial_rerun_keeps_other_rows_of_the_same_model(tmp_path):
+    path = str(tmp_path / "d.logprobs.parquet")
+    write_scores(path, [result("a", "m"), result("b", "m"), result("a", "other")])
+    write_scores(path, [result("a", "m", margin=5.0)])
+    rows = {(row["id"], row["model"]): row for row in pq.read_table(path).to_pylist()}
+    assert set(rows) == {("a", "m"), ("b", "m"), ("a", "other")}
+    assert rows[("a", "m")]["margin_mean"] == 5.0
+    assert rows[("b", "m")]["margin_mean"] == 1.0
+
+
+def test_split_context_moves_whitespace_to_the_continuation():
+    assert split_context("on the ", "box") == ("on the", " box")
+
+
+def test_continuation_logprob_sums_tokens_inside_the_span():
+    logprobs = {"text_offset": [0, 2, 6, 10], "token_logprobs": [None, -1.0, -2.0, -4.0]}
+    assert continuation_logprob(logprobs, 6, 10) == (-2.0, 1)
+    assert continuation_logprob(logprobs, 0, 10) == (-3.0, 2)
+
+
+def test_row_continuations_for_traditional_and_forking_rows():
+    index, points = row_continuations({"id": "t", "prompt": "It is on the {}", "answer_true": "box",
+                                       "answer_false": "bin"})
+    assert index == 0 and points == [[("It is on the", " box"), ("It is on the", " bin")]]
+    index, points = row_continuations({"id": "f", "prompt": "A {} b {}.", "placeholder_pairs": [["x", "y"], ["p", "q"]],
+                                       "forking_indices": [1]})
+    assert index == 1 and len(points) == 2 and points[1][0] == ("A y b", " p")
+
+
+def test_score_rows_against_the_mock_backend():
+    rows = [{"id": "t", "category": "counterfactual", "prompt": "It is on the {}", "answer_true": "box",
+             "answer_false": "bin"}]
+
+    async def run():
+        clients = ClientManager(api_key="mock", transport=MockLLMTransport(MockConfig(latency_ms=0, seed=0)))
+        limiter = ModelRateLimiter("m", rpm=10_000, tpm=10_000_000)
+        scorer = LogprobScorer(clients.get("m"), "m", limiter, batch_size=4)
+        try:
+            return await score_rows(rows, scorer)
+        finally:
+            await clients.aclose()
+
+    [scored] = asyncio.run(run())
+    assert scored["tokens"] == [[1, 1]]
+    assert scored["margin_mean"] == scored["logprobs"][0][0] - scored["logprobs"][0][1]
@@ -0,0 +1,42 @@
+from validator_engine import KeywordSet, check_quality, validate_many
+
+TOM = ("In the room there are Anna and Ben. Anna puts the cat on the sofa and leaves. "
+       "While she is away, Ben moves the cat to the basket. Anna thinks the cat is on the sofa.")
+
+ROWS = [
+    {"category": "counterfactual", "prompt": "Too short."},
+    {"category": "factual_recall", "prompt": "Sam checked\tthe book."},
+    {"category": "factual_recall", "prompt": "Sam checked\tthe book twice"},
+    {"category": "factual_recall", "prompt": "Sam checked... the book... twice... before... answering."},
+    {"category": "factual_recall", "prompt": "Sam checked... the book twice before answering...."},
+    {"category": "theory_of_mind", "prompt": TOM},
+    {"category": "theory_of_mind", "prompt": TOM.replace(" on the sofa.", " on the {}.")},
+    {"category": "metaphorical_interpretation", "prompt": "Her plan was like a house of cards, built on {}."},
+    {"category": "metaphorical_interpretation", "prompt": "Her plan was built on {} rather than {} then.",
+     "is_forking": True, "forking_indices": [0]},
+    {"category": "counterfactual", "prompt": "If Sam had acted last year, the town would have {} and {} before "
+     "the {} changed everything for the whole of the valley.", "is_forking": True},
+    {"category": "goal_representation", "prompt": "Sam rearranged the entire schedule around one priority "
+     "so that nothing else could ever get in the way of the {}.", "is_forking": True},
+]
+
+
+def test_validate_many_matches_check_quality():
+    assert validate_many(ROWS) == [check_quality(row) for row in ROWS]
+    assert validate_many(iter(ROWS)) == validate_many(ROWS)
+
+
+def test_validate_many_reasons():
+    assert validate_many(ROWS[:5]) == ["too_short", "too_short", "bad_ending", "too_many_ellipses", None]
+    assert validate_many(ROWS[-2:]) == ["missing_forking_indices", "invalid_forking_format"]
+
+
+def test_keyword_set_matches_substring_scan():
+    phrases = ["i think", "i believe", "i look for", "think", "akin to", "as"]
+    keywords = KeywordSet(phrases)
+    assert keywords.phrases == ("i believe", "i look for", "think", "akin to", "as")
+    assert keywords.pattern.pattern == r"(?:a(?:kin\ to|s)|i\ (?:believe|look\ for)|think)"
+    for text in ("we think so", "i look for it", "akin to", "base", "nothing here", ""):
+        expected = any(phrase in text for phrase in phrases)
+        assert bool(keywords.search(text)) == expected
+        assert bool(keywords.pattern.search(text)) == expected